@@ -1,9 +1,89 @@
 from django.contrib.admin.options import ModelAdmin as DjangoModelAdmin
 from django.contrib.admin.options import StackedInline as DjangoStackedInline, \
                                          TabularInline as DjangoTabularInline
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import InvalidPage
+from django.db import models
+
+
+class ROAChangeList(ChangeList):
+    """
+    Changelist requesting a page of rows and the number of rows matching
+    the filters at once (see ``RemoteQuerySet.with_count``), counts are
+    only requested separately if the service does not return them.
+
+    Related objects of foreign keys in ``list_display`` are expanded by the
+    service, nullable ones included, instead of being fetched row by row.
+    """
+    def get_query_set(self, request):
+        qs = super(ROAChangeList, self).get_query_set(request)
+        if qs.query.select_related is True and not self.list_select_related:
+            related = []
+            for field_name in self.list_display:
+                try:
+                    field = self.lookup_opts.get_field(field_name)
+                except models.FieldDoesNotExist:
+                    continue
+                if isinstance(field.rel, models.ManyToOneRel):
+                    related.append(field_name)
+            qs = qs.select_related(*related)
+        return qs
+
+    def get_results(self, request):
+        paginator = self.model_admin.get_paginator(request, self.query_set, self.list_per_page)
+        queryset = self.query_set.with_count(self.model_admin.approximate_count)
+        offset = self.page_num * self.list_per_page
+
+        result_list = None
+        if self.show_all:
+            # All rows fit in one request if there are few enough of them,
+            # otherwise the page is taken from the rows already fetched.
+            fetched = queryset[:self.list_max_show_all + 1]
+            rows = list(fetched)
+            if len(rows) <= self.list_max_show_all:
+                result_list, result_count = fetched, len(rows)
+            elif offset + self.list_per_page <= len(rows):
+                result_list = queryset[offset:offset + self.list_per_page]
+                result_list._result_cache = rows[offset:offset + self.list_per_page]
+                result_count = fetched.remote_count
+        if result_list is None:
+            result_list = queryset[offset:offset + self.list_per_page]
+            # Evaluated now for the number of rows coming with the page.
+            list(result_list)
+            result_count = result_list.remote_count
+        if result_count is None:
+            result_count = self.query_set.count()
+        paginator._count = result_count
+        try:
+            paginator.validate_number(self.page_num + 1)
+        except InvalidPage:
+            raise IncorrectLookupParameters
+
+        # Filters are conditions of the query, ``where`` is always empty.
+        query = self.query_set.query
+        if not (query.condition_parameters or query.local_conditions) \
+           or not self.model_admin.show_full_result_count:
+            full_result_count = result_count
+        else:
+            full_result_count = self.root_query_set.count()
+
+        self.result_count = result_count
+        self.full_result_count = full_result_count
+        self.result_list = result_list
+        self.can_show_all = result_count <= self.list_max_show_all
+        self.multi_page = result_count > self.list_per_page
+        self.paginator = paginator
+
 
 class ROAModelAdmin(DjangoModelAdmin):
-    pass
+    # Let the service return an estimated number of rows, for huge resources
+    approximate_count = False
+    # Request the number of rows ignoring filters to display it
+    show_full_result_count = True
+
+    def get_changelist(self, request, **kwargs):
+        return ROAChangeList
 
 class ROAStackedInline(DjangoStackedInline):
     pass
@@ -0,0 +1,153 @@
+"""
+Encoding of aggregations sent to the aggregate URL of a resource
+(``get_resource_url_aggregate``).
+
+Each aggregate is a ``aggregate_<alias>=<function>:<lookup>`` parameter,
+the function being ``count``, ``count_distinct``, ``sum``, ``avg``, ``min``,
+``max``, ``stddev`` or ``variance`` (``_sample`` suffixed for sample
+variants), and ``group_by=<field>,<field>`` groups rows like
+``values(...).annotate(...)``. Names are configurable through
+``ROA_ARGS_NAMES_MAPPING`` (``AGGREGATE_`` and ``GROUP_BY`` keys) and
+filters are sent as usual.
+
+Whatever ``ROA_FORMAT`` is, the service responds with a JSON object
+mapping aliases to values or, when grouped, a list of JSON objects holding
+grouping fields and aliases.
+"""
+import operator
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import aggregates as models_aggregates
+# Django >= 1.5
+try:
+    from django.db.models.constants import LOOKUP_SEP
+#Django < 1.4
+except:
+    from django.db.models.sql.constants import LOOKUP_SEP
+from django.utils.datastructures import SortedDict
+
+from django_roa.db.exceptions import ROANotImplementedYetException
+
+
+def aggregate_function(aggregate):
+    function = aggregate.name.lower()
+    if aggregate.extra.get('distinct'):
+        function += '_distinct'
+    if aggregate.extra.get('sample'):
+        function += '_sample'
+    return function
+
+
+def encode_aggregates(aggregates, group_by, names):
+    """
+    Returns parameters of aggregates keyed by alias, grouped by a list of
+    fields if any.
+    """
+    parameters = dict((names.aggregate(alias), u'%s:%s' % (aggregate_function(aggregate),
+                                                           aggregate.lookup))
+                      for alias, aggregate in aggregates.iteritems())
+    if group_by:
+        parameters[names.group_by] = u','.join(group_by)
+    return parameters
+
+
+def decode_aggregates(parameters, names):
+    """
+    Returns aggregates encoded in parameters by ``encode_aggregates`` as
+    Django aggregates keyed by alias and the list of grouping fields.
+    """
+    aggregates = SortedDict()
+    for key, value in sorted(parameters.items()):
+        if not key.startswith(names.aggregate_prefix):
+            continue
+        function, lookup = value.split(':', 1)
+        extra = {}
+        if function.endswith('_sample'):
+            function, extra['sample'] = function[:-len('_sample')], True
+        if function.endswith('_distinct'):
+            function, extra['distinct'] = function[:-len('_distinct')], True
+        aggregate = dict((name.lower(), getattr(models_aggregates, name))
+                         for name in ('Avg', 'Count', 'Max', 'Min', 'StdDev',
+                                      'Sum', 'Variance')).get(function)
+        if aggregate is None:
+            raise ValueError("Unknown aggregate function %s." % function)
+        aggregates[str(key[len(names.aggregate_prefix):])] = aggregate(str(lookup), **extra)
+    group_by = parameters.get(names.group_by)
+    return aggregates, group_by and [str(name) for name in group_by.split(',')] or []
+
+
+def _count(values, distinct=False):
+    values = [value for value in values if value is not None]
+    return len(distinct and set(values) or values)
+
+
+def _non_null(function):
+    def aggregate(values):
+        values = [value for value in values if value is not None]
+        if not values:
+            return None
+        return function(values)
+    return aggregate
+
+LOCAL_FUNCTIONS = {
+    'count': _count,
+    'count_distinct': lambda values: _count(values, distinct=True),
+    'sum': _non_null(sum),
+    'avg': _non_null(lambda values: float(sum(values)) / len(values)),
+    'min': _non_null(min),
+    'max': _non_null(max),
+}
+
+
+def value_getter(model, lookup):
+    """
+    Returns a function getting the value of a field, following foreign
+    keys, from an instance.
+    """
+    if lookup == '*':
+        return lambda obj: True
+    path, opts = [], model._meta
+    parts = lookup.split(LOOKUP_SEP)
+    for index, name in enumerate(parts):
+        field = name == 'pk' and opts.pk or opts.get_field(name)
+        if field.rel and index < len(parts) - 1:
+            path.append(field.name)
+            opts = field.rel.to._meta
+        else:
+            path.append(field.attname)
+    getter = operator.attrgetter('.'.join(path))
+
+    def get(obj):
+        try:
+            return getter(obj)
+        except (AttributeError, ObjectDoesNotExist):
+            return None
+    return get
+
+
+def aggregate_locally(model, objects, aggregates, group_by=None):
+    """
+    Aggregates fetched instances like the remote service would, for
+    queries filtered locally.
+    """
+    functions = []
+    for alias, aggregate in aggregates.iteritems():
+        function = LOCAL_FUNCTIONS.get(aggregate_function(aggregate))
+        if function is None:
+            raise ROANotImplementedYetException("%s can't be computed locally." % aggregate.name)
+        functions.append((alias, function, value_getter(model, aggregate.lookup)))
+    if not group_by:
+        return dict((alias, function([get(obj) for obj in objects]))
+                    for alias, function, get in functions)
+    getters = [(name, value_getter(model, name)) for name in group_by]
+    groups = SortedDict()
+    for obj in objects:
+        key = tuple(get(obj) for name, get in getters)
+        groups.setdefault(key, []).append(obj)
+    rows = []
+    for key, members in groups.iteritems():
+        row = dict(zip(group_by, key))
+        row.update((alias, function([get(obj) for obj in members]))
+                   for alias, function, get in functions)
+        rows.append(row)
+    return rows
@@ -0,0 +1,268 @@
+"""
+Circuit breakers failing fast on unhealthy remote services, enabled by
+``ROA_CIRCUIT_BREAKER``.
+
+Outcomes of the last ``ROA_CIRCUIT_WINDOW`` calls are kept per host, or
+per resource (model) if ``ROA_CIRCUIT_SCOPE`` is ``'resource'``. Network
+errors, 5xx responses and calls waiting more than ``ROA_CIRCUIT_SLOW_CALL``
+seconds for a response are failures, 4xx responses are not. Once at least
+``ROA_CIRCUIT_MIN_CALLS`` calls were made and the rate of failures reaches
+``ROA_CIRCUIT_ERROR_RATE``, the circuit opens: calls raise
+``ROACircuitOpen`` at once for ``ROA_CIRCUIT_OPEN_SECONDS``. It then turns
+half-open, letting ``ROA_CIRCUIT_HALF_OPEN_CALLS`` probes through, which
+close it if they all succeed or open it again on the first failure.
+
+With ``ROA_CIRCUIT_FALLBACK = 'stale'``, bodies of successful GETs no
+larger than ``ROA_CIRCUIT_STALE_MAX_SIZE`` are kept in the
+``ROA_CIRCUIT_STALE_CACHE`` cache for ``ROA_CIRCUIT_STALE_TIMEOUT``
+seconds, and served instead of raising while the circuit is open or when
+a GET fails.
+
+Transitions send ``roa_circuit_changed`` and ``snapshot()`` returns the
+state of every circuit.
+"""
+import collections
+import threading
+import time
+import urlparse
+
+from django.conf import settings
+from django.core.cache import get_cache
+
+from django_roa.db.cassettes import CassetteResponse, request_key
+from django_roa.db.signals import roa_circuit_changed
+
+ROA_CIRCUIT_BREAKER = getattr(settings, 'ROA_CIRCUIT_BREAKER', False)
+ROA_CIRCUIT_SCOPE = getattr(settings, 'ROA_CIRCUIT_SCOPE', 'host')
+ROA_CIRCUIT_WINDOW = getattr(settings, 'ROA_CIRCUIT_WINDOW', 20)
+ROA_CIRCUIT_MIN_CALLS = getattr(settings, 'ROA_CIRCUIT_MIN_CALLS', 10)
+ROA_CIRCUIT_ERROR_RATE = getattr(settings, 'ROA_CIRCUIT_ERROR_RATE', 0.5)
+ROA_CIRCUIT_SLOW_CALL = getattr(settings, 'ROA_CIRCUIT_SLOW_CALL', None)
+ROA_CIRCUIT_OPEN_SECONDS = getattr(settings, 'ROA_CIRCUIT_OPEN_SECONDS', 30)
+ROA_CIRCUIT_HALF_OPEN_CALLS = getattr(settings, 'ROA_CIRCUIT_HALF_OPEN_CALLS', 1)
+ROA_CIRCUIT_FALLBACK = getattr(settings, 'ROA_CIRCUIT_FALLBACK', 'raise')
+ROA_CIRCUIT_STALE_CACHE = getattr(settings, 'ROA_CIRCUIT_STALE_CACHE', 'default')
+ROA_CIRCUIT_STALE_TIMEOUT = getattr(settings, 'ROA_CIRCUIT_STALE_TIMEOUT', 3600)
+ROA_CIRCUIT_STALE_MAX_SIZE = getattr(settings, 'ROA_CIRCUIT_STALE_MAX_SIZE', 1024 * 1024)
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+_circuits = {}
+_lock = threading.Lock()
+_cache = []
+
+
+class Circuit(object):
+    """
+    State of the circuit of a host or resource, safe to share between
+    threads.
+    """
+    def __init__(self, key, window=ROA_CIRCUIT_WINDOW,
+                 min_calls=ROA_CIRCUIT_MIN_CALLS,
+                 error_rate=ROA_CIRCUIT_ERROR_RATE,
+                 slow_call=ROA_CIRCUIT_SLOW_CALL,
+                 open_seconds=ROA_CIRCUIT_OPEN_SECONDS,
+                 half_open_calls=ROA_CIRCUIT_HALF_OPEN_CALLS):
+        self.key = key
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self.outcomes = collections.deque(maxlen=window)
+        self.state = CLOSED
+        self.opened_at = None
+        self.probes = self.probes_succeeded = 0
+        self.rejected = self.times_opened = 0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """
+        Returns whether a call may be made, counting rejected ones.
+        """
+        with self.lock:
+            if self.state == OPEN:
+                if time.time() - self.opened_at < self.open_seconds:
+                    self.rejected += 1
+                    return False
+                self.transition(HALF_OPEN)
+            if self.state == HALF_OPEN:
+                if self.probes >= self.half_open_calls:
+                    self.rejected += 1
+                    return False
+                self.probes += 1
+            return True
+
+    def record(self, failed, duration):
+        """
+        Records the outcome of a call which waited ``duration`` seconds for
+        its response.
+        """
+        if self.slow_call is not None and duration > self.slow_call:
+            failed = True
+        with self.lock:
+            if self.state == HALF_OPEN:
+                if failed:
+                    self.transition(OPEN)
+                else:
+                    self.probes_succeeded += 1
+                    if self.probes_succeeded >= self.half_open_calls:
+                        self.transition(CLOSED)
+                return
+            if self.state == OPEN:
+                # Started before the circuit opened.
+                return
+            self.outcomes.append(failed)
+            if len(self.outcomes) >= self.min_calls \
+               and self.failure_rate() >= self.error_rate:
+                self.transition(OPEN)
+
+    def failure_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return float(sum(self.outcomes)) / len(self.outcomes)
+
+    def transition(self, state):
+        previous, self.state = self.state, state
+        self.probes = self.probes_succeeded = 0
+        if state == OPEN:
+            self.opened_at = time.time()
+            self.times_opened += 1
+        elif state == CLOSED:
+            self.outcomes.clear()
+        roa_circuit_changed.send(sender=self, circuit=self, state=state,
+                                 previous=previous)
+
+    def as_dict(self):
+        with self.lock:
+            return {'state': self.state, 'calls': len(self.outcomes),
+                    'failure_rate': self.failure_rate(),
+                    'rejected': self.rejected, 'opened': self.times_opened}
+
+
+def enabled():
+    return bool(ROA_CIRCUIT_BREAKER)
+
+
+def circuit_key(resource):
+    if ROA_CIRCUIT_SCOPE == 'resource':
+        if resource.model is not None:
+            return resource.model._meta.object_name
+        return resource.uri
+    return urlparse.urlparse(resource.uri).netloc
+
+
+def get_circuit(resource):
+    """
+    Returns the circuit a call of the resource goes through.
+    """
+    key = circuit_key(resource)
+    with _lock:
+        circuit = _circuits.get(key)
+        if circuit is None:
+            circuit = _circuits[key] = Circuit(key)
+        return circuit
+
+
+def snapshot():
+    """
+    Returns the state of every circuit as a dictionary keyed by host or
+    resource.
+    """
+    with _lock:
+        circuits = _circuits.values()
+    return dict((circuit.key, circuit.as_dict()) for circuit in circuits)
+
+
+def reset():
+    with _lock:
+        _circuits.clear()
+
+
+def failed(error):
+    """
+    Returns whether an error tells the service is unhealthy.
+    """
+    status = getattr(error, 'status_int', None)
+    return status is None or status >= 500
+
+
+def stale_enabled(method):
+    return method == 'GET' and ROA_CIRCUIT_FALLBACK == 'stale'
+
+
+def stale_cache():
+    if not _cache:
+        _cache.append(get_cache(ROA_CIRCUIT_STALE_CACHE))
+    return _cache[0]
+
+
+def stale_key(uri, parameters):
+    return 'roa_stale:%s' % request_key('GET', uri, parameters, None)
+
+
+def stale_response(key):
+    """
+    Returns the last successful response kept for this key, if any.
+    """
+    entry = stale_cache().get(key)
+    if entry is None:
+        return None
+    status, body, headers = entry
+    return CassetteResponse(status, body, headers)
+
+
+class StaleCapture(object):
+    """
+    Response body stream keeping what is read to store it once complete.
+    """
+    def __init__(self, stream, key, status, headers):
+        self.stream = stream
+        self.key = key
+        self.status = status
+        self.headers = headers
+        self.chunks = []
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        if self.chunks is not None:
+            self.chunks.append(data)
+            self.size += len(data)
+            if self.size > ROA_CIRCUIT_STALE_MAX_SIZE:
+                self.chunks = None
+            elif not data or size is None or size < 0:
+                stale_cache().set(self.key, (self.status, ''.join(self.chunks),
+                                             self.headers),
+                                  ROA_CIRCUIT_STALE_TIMEOUT)
+                self.chunks = None
+        return data
+
+    def close(self):
+        self.stream.close()
+
+
+class StaleRecordingResponse(object):
+    """
+    Response keeping its body as the stale fallback of the request once
+    read.
+    """
+    def __init__(self, response, key):
+        self.response = response
+        self.key = key
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+    def body_stream(self):
+        headers = dict((name, self.response.headers.get(name))
+                       for name in ('Content-Type', 'Content-Encoding')
+                       if self.response.headers.get(name))
+        return StaleCapture(self.response.body_stream(), self.key,
+                            self.response.status_int, headers)
+
+    def body_string(self, charset=None, unicode_errors='strict'):
+        body = self.body_stream().read()
+        if charset is not None:
+            return body.decode(charset, unicode_errors)
+        return body
@@ -0,0 +1,207 @@
+import gzip
+import json
+import time
+import urllib
+import hashlib
+import threading
+from StringIO import StringIO
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from restkit import ResourceNotFound, Unauthorized, ResourceGone, RequestFailed
+
+ROA_CASSETTE_MODE = getattr(settings, 'ROA_CASSETTE_MODE', None)
+ROA_CASSETTE_PATH = getattr(settings, 'ROA_CASSETTE_PATH', 'roa_cassette.jsonl.gz')
+ROA_CASSETTE_LATENCY = getattr(settings, 'ROA_CASSETTE_LATENCY', None)
+
+DEFAULT_CHARSET = getattr(settings, 'DEFAULT_CHARSET', 'utf-8')
+
+RECORD, REPLAY = 'record', 'replay'
+
+
+# Headers describing the transfer of a response rather than its body.
+TRANSFER_HEADERS = ('connection', 'content-length', 'keep-alive',
+                    'transfer-encoding')
+
+
+class CassetteMiss(Exception):
+    pass
+
+
+class CassetteHeaders(dict):
+    """
+    Case insensitive headers of a replayed response.
+    """
+    def __init__(self, headers=()):
+        super(CassetteHeaders, self).__init__()
+        self.update(headers)
+
+    def update(self, headers=()):
+        if isinstance(headers, dict):
+            headers = headers.items()
+        for name, value in headers:
+            self[name] = value
+
+    def __setitem__(self, name, value):
+        super(CassetteHeaders, self).__setitem__(name.lower(), value)
+
+    def __getitem__(self, name):
+        return super(CassetteHeaders, self).__getitem__(name.lower())
+
+    def __contains__(self, name):
+        return super(CassetteHeaders, self).__contains__(name.lower())
+
+    def get(self, name, default=None):
+        return super(CassetteHeaders, self).get(name.lower(), default)
+
+
+class CassetteResponse(object):
+    """
+    Replayed response exposing the subset of restkit's ``Response`` used by
+    django-roa.
+    """
+    def __init__(self, status_int, body, headers=()):
+        self.status_int = status_int
+        self.status = str(status_int)
+        self.body = body
+        self.headers = CassetteHeaders(headers)
+        self._already_read = False
+
+    def can_read(self):
+        return not self._already_read
+
+    def body_string(self, charset=None, unicode_errors="strict"):
+        self._already_read = True
+        if charset is not None:
+            return self.body.decode(charset, unicode_errors)
+        return self.body
+
+    def body_stream(self):
+        self._already_read = True
+        return StringIO(self.body)
+
+
+def recorded_headers(headers):
+    """
+    Returns the headers of a response to record as pairs, without those
+    describing its transfer.
+    """
+    return [(name, value) for name, value in headers.items()
+            if name.lower() not in TRANSFER_HEADERS]
+
+
+def request_key(method, uri, params, payload):
+    """
+    Returns the key matching a request to its recorded interactions,
+    parameters are sorted so that it does not depend on dict ordering.
+    """
+    query = urllib.urlencode(sorted(
+        (key, isinstance(value, unicode) and value.encode(DEFAULT_CHARSET) or value)
+        for key, value in params.iteritems()))
+    if isinstance(payload, unicode):
+        payload = payload.encode(DEFAULT_CHARSET)
+    if payload is not None and not isinstance(payload, str):
+        # Streamed bodies are not read twice, they are told apart by URL.
+        digest = 'stream'
+    else:
+        digest = payload and hashlib.sha1(payload).hexdigest() or None
+    return u'%s %s?%s %s' % (method, uri, query, digest)
+
+
+class Cassette(object):
+    """
+    Compact on-disk log of remote interactions: one JSON document per line
+    in a gzipped file.
+
+    Statuses, headers and bodies are recorded as received, brotli bodies
+    being decoded when replayed like when they are received.
+
+    In record mode each interaction is appended as soon as it is done, in
+    replay mode interactions matching a request are served back in the
+    recorded order (the last one being repeated), with no latency, the
+    recorded one (``latency='recorded'``) or a fixed number of seconds.
+    """
+    def __init__(self, path, mode, latency=None):
+        if mode not in (RECORD, REPLAY):
+            raise ValueError("Cassette mode must be '%s' or '%s'." % (RECORD, REPLAY))
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.interactions = {}
+        if mode == REPLAY:
+            self.load()
+
+    @property
+    def replaying(self):
+        return self.mode == REPLAY
+
+    def load(self):
+        with gzip.open(self.path, 'rb') as f:
+            for line in f:
+                interaction = json.loads(line)
+                self.interactions.setdefault(interaction['key'], []).append(interaction)
+
+    def record(self, key, status, body, headers, duration):
+        line = json.dumps({
+            'key': key,
+            'status': status,
+            # latin-1 maps bytes to code points one to one
+            'body': body.decode('latin-1'),
+            'headers': headers,
+            'duration': round(duration, 6),
+        }, separators=(',', ':'))
+        with self.lock:
+            with gzip.open(self.path, 'ab') as f:
+                f.write(line + '\n')
+
+    def play(self, key):
+        """
+        Returns a ``CassetteResponse`` for the request, raising restkit's
+        errors for recorded error statuses like ``Resource.request`` does.
+        """
+        with self.lock:
+            interactions = self.interactions.get(key)
+            if not interactions:
+                raise CassetteMiss("No recorded interaction for %s" % key)
+            interaction = len(interactions) > 1 and interactions.pop(0) \
+                          or interactions[0]
+        if self.latency == 'recorded':
+            time.sleep(interaction['duration'])
+        elif self.latency:
+            time.sleep(self.latency)
+        status = interaction['status']
+        body = interaction['body'].encode('latin-1')
+        response = CassetteResponse(status, body, interaction['headers'])
+        if status == 404:
+            raise ResourceNotFound(body, response=response)
+        elif status in (401, 403):
+            raise Unauthorized(body, http_code=status, response=response)
+        elif status == 410:
+            raise ResourceGone(body, response=response)
+        elif status >= 400:
+            raise RequestFailed(body, http_code=status, response=response)
+        return response
+
+
+cassette = None
+if ROA_CASSETTE_MODE:
+    cassette = Cassette(ROA_CASSETTE_PATH, ROA_CASSETTE_MODE, ROA_CASSETTE_LATENCY)
+
+
+def current_cassette():
+    return cassette
+
+
+@contextmanager
+def use_cassette(path, mode, latency=None):
+    """
+    Records or replays remote calls done within the block.
+    """
+    global cassette
+    previous, cassette = cassette, Cassette(path, mode, latency)
+    try:
+        yield cassette
+    finally:
+        cassette = previous
@@ -0,0 +1,121 @@
+from django.db.models.fields import BooleanField, NullBooleanField
+from django.db.models.fields.related import ManyToOneRel
+
+
+class ForeignKeyConverter(object):
+    """
+    Converts a remote foreign key value (either a raw primary key or a nested
+    representation like ``{"id": 42}``) into the local attname value.
+
+    The target primary key field is resolved on first use because the related
+    model may not be loaded yet when the plan is compiled.
+    """
+    def __init__(self, field):
+        self.field = field
+        self.to_python = None
+        self.key = None
+
+    def resolve(self):
+        rel = self.field.rel
+        target = rel.to._meta.get_field(rel.field_name)
+        self.key = target.attname
+        self.to_python = target.to_python
+
+    def __call__(self, value):
+        if value is None:
+            return None
+        if self.to_python is None:
+            self.resolve()
+        if isinstance(value, dict):
+            value = value.get(self.key, value.get('id'))
+            if value is None:
+                return None
+        return self.to_python(value)
+
+
+BOOLEAN_STRINGS = {
+    u'true': True, u't': True, u'1': True,
+    u'false': False, u'f': False, u'0': False,
+}
+
+
+def boolean_converter(field):
+    """
+    Returns a converter which only delegates to ``to_python`` for values which
+    are neither booleans nor usual string representations of booleans
+    (``"true"``, ``"False"``, ``"1"``...).
+    """
+    to_python = field.to_python
+    nullable = isinstance(field, NullBooleanField)
+
+    def convert(value):
+        if value is True or value is False:
+            return value
+        if value is None and nullable:
+            return None
+        if isinstance(value, basestring):
+            result = BOOLEAN_STRINGS.get(value.lower())
+            if result is not None:
+                return result
+        return to_python(value)
+    return convert
+
+
+class DecoderPlan(object):
+    """
+    Compiled decoding plan of a model: a list of ``(wire key, attname,
+    converter)`` steps with foreign keys and booleans resolved up front, so
+    that decoding a remote row does not need any ``_meta`` lookup.
+
+    Related rows nested in a row (``select_related`` expansion) are decoded
+    into the cache of their foreign key when the related model is a remote
+    one. Deferred fields missing from a row are left unset. Rows in the
+    envelope of Django's serializers (``{"pk": ..., "model": ...,
+    "fields": {...}}``) are unwrapped.
+    """
+    def __init__(self, opts, deferred=()):
+        self.pk_name = opts.pk.name
+        self.steps = []
+        self.defaults = []
+        self.related = []
+        for field in opts.fields:
+            if field.rel and isinstance(field.rel, ManyToOneRel):
+                converter = ForeignKeyConverter(field)
+                self.steps.append((field.name, field.attname, converter))
+                self.related.append((field.name, field.get_cache_name(), field.rel))
+                if field.attname != field.name:
+                    self.steps.append((field.attname, field.attname, converter))
+            elif isinstance(field, (BooleanField, NullBooleanField)):
+                self.steps.append((field.name, field.attname,
+                                   boolean_converter(field)))
+            else:
+                self.steps.append((field.name, field.attname,
+                                   field.to_python))
+            if field.attname not in deferred:
+                self.defaults.append((field.attname, field.get_default))
+        self.width = len(opts.fields)
+
+    def decode(self, row):
+        """
+        Returns a dictionary of attname/value from a parsed remote row,
+        missing values being filled with fields' defaults unless deferred.
+        """
+        fields = row.get('fields')
+        if isinstance(fields, dict) and 'pk' in row and 'model' in row:
+            pk = row['pk']
+            row = dict(fields)
+            row[self.pk_name] = pk
+        values = {}
+        for key, attname, convert in self.steps:
+            if key in row:
+                values[attname] = convert(row[key])
+        if len(values) < self.width:
+            for attname, get_default in self.defaults:
+                if attname not in values:
+                    values[attname] = get_default()
+        for key, cache_name, rel in self.related:
+            value = row.get(key)
+            if isinstance(value, dict) and len(value) > 1 \
+               and hasattr(rel.to, 'from_remote_row'):
+                values[cache_name] = rel.to.from_remote_row(value)
+        return values
@@ -0,0 +1,141 @@
+"""
+Deferred loading of heavy fields declared by the ``deferred_fields`` Meta
+option of remote models.
+
+Lists are requested with a ``defer=<field>,<field>`` parameter (name
+configurable through ``ROA_ARGS_NAMES_MAPPING``, ``DEFER`` key) and the
+service may leave these fields out of rows. A field missing from a row
+is loaded on first access, for every instance of the same result set
+still missing it, by requests filtered on ``pk__in`` of at most
+``ROA_DEFERRED_BATCH_SIZE`` primary keys. If ``ROA_SUPPORTED_LOOKUPS``
+doesn't declare ``in`` for the model, which would fetch every row of the
+resource to filter them locally, instances are loaded one request each,
+filtered on ``pk``.
+
+A field the service doesn't return is left unloaded, accessing it raises
+``DoesNotExist`` if the row is gone, ``ROAException`` otherwise: a default
+value would overwrite the remote one on the next save.
+"""
+import weakref
+
+from django.conf import settings
+
+from django_roa.db.exceptions import ROAException
+from django_roa.db.filters import supported_lookups
+
+ROA_DEFERRED_BATCH_SIZE = getattr(settings, 'ROA_DEFERRED_BATCH_SIZE', 100)
+
+DEFERRED_GROUP = '_roa_deferred_group'
+
+
+class DeferredGroup(object):
+    """
+    Instances fetched by the same request, loaded together.
+
+    Only weak references are kept and none is pickled, an unpickled
+    instance loads its deferred fields on its own.
+    """
+    def __init__(self, objects):
+        self.refs = [weakref.ref(obj) for obj in objects]
+
+    def pending(self, attname):
+        """
+        Returns instances still alive which miss the field.
+        """
+        objects = [ref() for ref in self.refs]
+        return [obj for obj in objects
+                if obj is not None and attname not in obj.__dict__]
+
+    def __getstate__(self):
+        return {'refs': []}
+
+
+def attach_group(objects):
+    """
+    Makes instances of a result set load their deferred fields together.
+    """
+    group = DeferredGroup(objects)
+    for obj in objects:
+        obj.__dict__[DEFERRED_GROUP] = group
+
+
+def load_deferred(instance, field):
+    """
+    Loads the deferred fields of the instance and of the instances of its
+    result set which miss the same field.
+    """
+    model = instance.__class__
+    fields = [model._meta.get_field(name) for name in model._meta.deferred_fields]
+    group = instance.__dict__.get(DEFERRED_GROUP)
+    objects = group and group.pending(field.attname) or []
+    if not any(obj is instance for obj in objects):
+        objects.insert(0, instance)
+    lookups = supported_lookups(model)
+    batch_size = ROA_DEFERRED_BATCH_SIZE
+    if lookups is not None and 'in' not in lookups:
+        batch_size = 1
+    found = False
+    while objects:
+        batch, objects = objects[:batch_size], objects[batch_size:]
+        queryset = model._default_manager.defer(None)
+        if batch_size == 1:
+            queryset = queryset.filter(pk=batch[0].pk)
+        else:
+            queryset = queryset.filter(pk__in=[obj.pk for obj in batch])
+        queryset.query.deferred_load = field.name
+        loaded = dict((obj.pk, obj) for obj in queryset)
+        for obj in batch:
+            if obj.pk not in loaded:
+                continue
+            found = found or obj is instance
+            values = loaded[obj.pk].__dict__
+            for deferred in fields:
+                attname = deferred.attname
+                if attname not in obj.__dict__ and attname in values:
+                    obj.__dict__[attname] = values[attname]
+    if not found:
+        raise model.DoesNotExist("%s matching pk %r does not exist."
+                                 % (model._meta.object_name, instance.pk))
+    if field.attname not in instance.__dict__:
+        raise ROAException("%s wasn't returned for %s %r."
+                           % (field.name, model._meta.object_name, instance.pk))
+
+
+class DeferredField(object):
+    """
+    Descriptor of a deferred field, wrapping the descriptor the field may
+    already have (``FileDescriptor`` for instance).
+    """
+    def __init__(self, field, descriptor=None):
+        self.field = field
+        self.attname = field.attname
+        self.descriptor = descriptor
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        if self.attname not in instance.__dict__:
+            load_deferred(instance, self.field)
+        if self.descriptor is not None:
+            return self.descriptor.__get__(instance, owner)
+        return instance.__dict__[self.attname]
+
+    def __set__(self, instance, value):
+        if self.descriptor is not None:
+            self.descriptor.__set__(instance, value)
+        else:
+            instance.__dict__[self.attname] = value
+
+
+def contribute_deferred_fields(cls):
+    """
+    Installs descriptors of deferred fields on a model, returns their
+    attnames.
+    """
+    attnames = []
+    for name in cls._meta.deferred_fields:
+        field = cls._meta.get_field(name)
+        descriptor = cls.__dict__.get(field.attname)
+        setattr(cls, field.attname, DeferredField(field, descriptor))
+        attnames.append(field.attname)
+    return attnames
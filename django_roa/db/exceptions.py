@@ -49,5 +49,24 @@ class ROAException(Exception):
         }
 
 
+class ROACircuitOpen(ROAException):
+    """
+    Raised without calling the remote service while its circuit is open.
+    """
+
+
+class ROATimeout(ROAException):
+    """
+    Raised when a remote call times out.
+    """
+
+
+class ROADeadlineExceeded(ROATimeout):
+    """
+    Raised without calling the remote service once the deadline of the
+    current request is reached.
+    """
+
+
 class ROANotImplementedYetException(Exception):
     pass
@@ -0,0 +1,378 @@
+"""
+Translation of Django lookups into remote filter parameters and back.
+
+Conditions are encoded as follows, parameter names being mapped through
+``ROA_ARGS_NAMES_MAPPING`` (``FILTER_``, ``EXCLUDE_`` and ``WHERE`` keys)
+and all parameters being ANDed together:
+
+* ``filter_<lookup>=<value>`` for lookups ANDed at the top of the tree,
+* ``exclude_<lookup>=<value>`` for a single negated group of lookups, the
+  server excludes rows matching all of them like ``QuerySet.exclude``,
+* ``where=<JSON>`` for anything else (OR, other negations, lookups used
+  twice), a node being ``{"and": [node, ...]}``, ``{"or": [node, ...]}``,
+  ``{"not": node}`` or a ``[lookup, value]`` leaf.
+
+In ``filter_`` and ``exclude_`` parameters, ``__in`` and ``__range`` values
+are comma separated and ``__isnull`` values are ``true`` or ``false``.
+Model instances are sent as their primary key. ``decode_condition`` turns
+parameters back into a ``Q`` object for servers built with Django.
+
+Lookups a remote service can't evaluate are declared per model in
+``ROA_SUPPORTED_LOOKUPS``, keyed by ``app_label.modelname``: an iterable of
+lookup types (``exact``, ``in``, ``icontains``...) plus ``where`` if the
+service understands the JSON tree. Conditions using other lookups are
+not sent but compiled by ``compile_condition`` and evaluated on rows.
+"""
+import re
+import json
+import operator
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Model
+from django.db.models.expressions import ExpressionNode
+from django.db.models.fields import FieldDoesNotExist, BooleanField, \
+    NullBooleanField
+from django.db.models.query_utils import Q
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.encoding import force_unicode
+# Django >= 1.5
+try:
+    from django.db.models.constants import LOOKUP_SEP
+#Django < 1.4
+except:
+    from django.db.models.sql.constants import LOOKUP_SEP
+from django.db.models.sql.constants import QUERY_TERMS
+
+from django_roa.db.decoders import boolean_converter
+from django_roa.db.exceptions import ROANotImplementedYetException
+
+ROA_SUPPORTED_LOOKUPS = getattr(settings, 'ROA_SUPPORTED_LOOKUPS', {})
+
+LIST_LOOKUPS = ('__in', '__range')
+TRUE_STRINGS = ('true', 't', '1')
+
+
+def prepare_value(value):
+    """
+    Returns a lookup value made of primary keys and basic types.
+    """
+    if isinstance(value, Model):
+        return value.pk
+    if isinstance(value, ExpressionNode):
+        raise ROANotImplementedYetException("F() expressions can't be sent to remote resources.")
+    if hasattr(value, '__iter__') and not isinstance(value, dict):
+        return [prepare_value(item) for item in value]
+    return value
+
+
+def flat_value(lookup, value):
+    """
+    Returns the value of a ``filter_`` or ``exclude_`` parameter, None if
+    the lookup can only be sent in the JSON tree.
+    """
+    value = prepare_value(value)
+    if lookup.endswith(LIST_LOOKUPS):
+        items = [force_unicode(item) for item in value]
+        if any(u',' in item for item in items):
+            return None
+        return u','.join(items)
+    if lookup.endswith('__isnull'):
+        return value and 'true' or 'false'
+    if value is None or isinstance(value, (list, dict)):
+        return None
+    return value
+
+
+def conjuncts(node):
+    """
+    Yields lookups and nodes ANDed at the top of a ``Q`` tree.
+    """
+    if isinstance(node, tuple):
+        yield node
+    elif not node.negated and (node.connector == Q.AND or len(node.children) == 1):
+        for child in node.children:
+            for conjunct in conjuncts(child):
+                yield conjunct
+    else:
+        yield node
+
+
+def flat_lookups(lookups, prefix, names):
+    """
+    Returns parameters of lookups if they can all be flattened, else None.
+    """
+    parameters = {}
+    for lookup, value in lookups:
+        value = flat_value(lookup, value)
+        name = names.lookup(prefix, lookup)
+        if value is None or name in parameters:
+            return None
+        parameters[name] = value
+    return parameters
+
+
+def encode_node(node):
+    if isinstance(node, tuple):
+        lookup, value = node
+        return [lookup, prepare_value(value)]
+    children = [encode_node(child) for child in node.children]
+    encoded = len(children) == 1 and children[0] \
+              or {node.connector.lower(): children}
+    return node.negated and {'not': encoded} or encoded
+
+
+def lookup_type(lookup):
+    parts = lookup.split(LOOKUP_SEP)
+    if len(parts) > 1 and parts[-1] in QUERY_TERMS:
+        return parts[-1]
+    return 'exact'
+
+
+def leaves(node):
+    if isinstance(node, tuple):
+        yield node
+    else:
+        for child in node.children:
+            for leaf in leaves(child):
+                yield leaf
+
+
+_supported_lookups = {}
+
+
+def supported_lookups(model):
+    """
+    Returns the lookup types declared for the model in
+    ``ROA_SUPPORTED_LOOKUPS``, None if they are all supported.
+    """
+    try:
+        return _supported_lookups[model]
+    except KeyError:
+        lookups = None
+        if model is not None:
+            opts = model._meta
+            lookups = ROA_SUPPORTED_LOOKUPS.get('%s.%s' % (opts.app_label, opts.module_name))
+            if lookups is not None:
+                lookups = frozenset(lookups)
+        _supported_lookups[model] = lookups
+        return lookups
+
+
+def encode_condition(conditions, names):
+    """
+    Returns remote parameters for a list of ANDed ``Q`` objects.
+    """
+    return split_condition(conditions, names)[0]
+
+
+def split_condition(conditions, names, supported=None):
+    """
+    Returns remote parameters for a list of ANDed ``Q`` objects and the
+    list of ANDed conditions which can't be sent given supported lookups.
+    """
+    parameters = {}
+    excluded = False
+    remaining, local = [], []
+    where = supported is None or 'where' in supported
+    for conjunct in conjuncts(Q(*conditions)):
+        if supported is not None and any(lookup_type(lookup) not in supported
+                                         for lookup, value in leaves(conjunct)):
+            local.append(conjunct)
+            continue
+        if isinstance(conjunct, tuple):
+            lookup, value = conjunct
+            name = names.filter(lookup)
+            value = flat_value(lookup, value)
+            if value is not None and name not in parameters:
+                parameters[name] = value
+                continue
+        elif not excluded and conjunct.negated \
+                and (conjunct.connector == Q.AND or len(conjunct.children) == 1):
+            lookups = list(conjuncts(Q(*conjunct.children)))
+            excludes = all(isinstance(lookup, tuple) for lookup in lookups) \
+                       and flat_lookups(lookups, names.exclude_prefix, names)
+            if excludes:
+                parameters.update(excludes)
+                excluded = True
+                continue
+        if where:
+            remaining.append(conjunct)
+        else:
+            local.append(conjunct)
+    if remaining:
+        tree = len(remaining) == 1 and encode_node(remaining[0]) \
+               or {'and': [encode_node(conjunct) for conjunct in remaining]}
+        parameters[names.where] = json.dumps(tree, cls=DjangoJSONEncoder,
+                                             separators=(',', ':'))
+    return parameters, local
+
+
+def decode_value(lookup, value):
+    if lookup.endswith(LIST_LOOKUPS):
+        return value.split(',')
+    if lookup.endswith('__isnull'):
+        return value.lower() in TRUE_STRINGS
+    return value
+
+
+def decode_node(node):
+    if isinstance(node, list):
+        lookup, value = node
+        return Q(**{str(lookup): value})
+    if 'not' in node:
+        return ~decode_node(node['not'])
+    connector, children = node.items()[0]
+    return reduce(connector == 'or' and operator.or_ or operator.and_,
+                  [decode_node(child) for child in children])
+
+
+def decode_condition(parameters, names):
+    """
+    Returns the ``Q`` object encoded in parameters by ``encode_condition``.
+    """
+    filters, excludes = {}, {}
+    for key, value in parameters.iteritems():
+        if key.startswith(names.filter_prefix):
+            lookup = str(key[len(names.filter_prefix):])
+            filters[lookup] = decode_value(lookup, value)
+        elif key.startswith(names.exclude_prefix):
+            lookup = str(key[len(names.exclude_prefix):])
+            excludes[lookup] = decode_value(lookup, value)
+    condition = Q(**filters)
+    if excludes:
+        condition &= ~Q(**excludes)
+    if names.where in parameters:
+        condition &= decode_node(json.loads(parameters[names.where]))
+    return condition
+
+
+#################################
+# EVALUATION OF LOOKUPS ON ROWS #
+#################################
+
+def _lower(value):
+    return value is not None and force_unicode(value).lower() or value
+
+
+def _week_day(value):
+    return value.isoweekday() % 7 + 1
+
+# Lookup type: (comparison of the row value with the prepared lookup
+# value, preparation of the row value, preparation of the lookup value).
+LOOKUPS = {
+    'exact': (operator.eq, None, 'python'),
+    'iexact': (operator.eq, _lower, _lower),
+    'contains': (operator.contains, force_unicode, force_unicode),
+    'icontains': (operator.contains, _lower, _lower),
+    'startswith': (lambda a, b: a.startswith(b), force_unicode, force_unicode),
+    'istartswith': (lambda a, b: a.startswith(b), _lower, _lower),
+    'endswith': (lambda a, b: a.endswith(b), force_unicode, force_unicode),
+    'iendswith': (lambda a, b: a.endswith(b), _lower, _lower),
+    'gt': (operator.gt, None, 'python'),
+    'gte': (operator.ge, None, 'python'),
+    'lt': (operator.lt, None, 'python'),
+    'lte': (operator.le, None, 'python'),
+    'in': (lambda a, b: a in b, None, 'list'),
+    'range': (lambda a, b: b[0] <= a <= b[1], None, 'list'),
+    'year': (operator.eq, operator.attrgetter('year'), int),
+    'month': (operator.eq, operator.attrgetter('month'), int),
+    'day': (operator.eq, operator.attrgetter('day'), int),
+    'week_day': (operator.eq, _week_day, int),
+    'regex': (lambda a, b: b.search(a) is not None, force_unicode,
+              lambda value: re.compile(value, re.UNICODE)),
+    'iregex': (lambda a, b: b.search(a) is not None, force_unicode,
+               lambda value: re.compile(value, re.UNICODE | re.IGNORECASE)),
+}
+
+
+def compile_lookup(model, lookup, value):
+    """
+    Returns a function telling whether an instance matches the lookup,
+    only lookups on fields and foreign keys of the model can be compiled.
+    """
+    parts = lookup.split(LOOKUP_SEP)
+    kind = lookup_type(lookup)
+    if len(parts) > 1 and parts[-1] == kind:
+        parts.pop()
+    opts = model._meta
+    path, field = [], None
+    for index, name in enumerate(parts):
+        if field is not None:
+            if not field.rel:
+                raise ROANotImplementedYetException("Lookup %s can't be evaluated locally." % lookup)
+            if index == len(parts) - 1 and name in ('pk', field.rel.field_name):
+                # Compare the value of the foreign key, without fetching
+                # the related instance.
+                break
+            path[-1] = field.name
+            opts = field.rel.to._meta
+        try:
+            field = name == 'pk' and opts.pk or opts.get_field(name)
+        except FieldDoesNotExist:
+            raise ROANotImplementedYetException("Lookup %s can't be evaluated locally." % lookup)
+        if field.rel and not hasattr(field.rel, 'field_name'):
+            raise ROANotImplementedYetException("Lookup %s can't be evaluated locally." % lookup)
+        path.append(field.attname)
+    if field.rel:
+        field = field.rel.get_related_field()
+    if isinstance(field, (BooleanField, NullBooleanField)):
+        to_python = boolean_converter(field)
+    else:
+        to_python = field.to_python
+
+    if kind == 'isnull':
+        compare, prepare_row, value = (lambda a, b: (a is None) == b), None, bool(value)
+    else:
+        try:
+            compare, prepare_row, prepare_lookup = LOOKUPS[kind]
+        except KeyError:
+            raise ROANotImplementedYetException("Lookup type %s can't be evaluated locally." % kind)
+        value = prepare_value(value)
+        if prepare_lookup == 'python':
+            if value is not None:
+                value = to_python(value)
+        elif prepare_lookup == 'list':
+            value = [to_python(item) for item in value]
+        elif prepare_lookup is not None:
+            value = prepare_lookup(value)
+        if kind == 'exact' and value is None:
+            compare = lambda a, b: a is None
+        elif kind != 'exact':
+            # None never matches, like NULL in SQL.
+            compare = (lambda compare: lambda a, b: a is not None and compare(a, b))(compare)
+
+    getter = operator.attrgetter('.'.join(path))
+
+    def matches(obj):
+        try:
+            row_value = getter(obj)
+        except (AttributeError, ObjectDoesNotExist):
+            row_value = None
+        if prepare_row is not None and row_value is not None:
+            row_value = prepare_row(row_value)
+        return compare(row_value, value)
+    return matches
+
+
+def compile_node(model, node):
+    if isinstance(node, tuple):
+        return compile_lookup(model, *node)
+    predicates = [compile_node(model, child) for child in node.children]
+    if len(predicates) == 1:
+        predicate = predicates[0]
+    elif node.connector == Q.OR:
+        predicate = lambda obj: any(predicate(obj) for predicate in predicates)
+    else:
+        predicate = lambda obj: all(predicate(obj) for predicate in predicates)
+    if node.negated:
+        return lambda obj: not predicate(obj)
+    return predicate
+
+
+def compile_condition(model, conditions):
+    """
+    Returns a function telling whether an instance of the model matches
+    a list of ANDed ``Q`` objects.
+    """
+    return compile_node(model, Q(*conditions))
@@ -0,0 +1,156 @@
+"""
+Hedged reads, enabled by ``ROA_HEDGE_READS``: a GET still waiting for its
+response after a delay is sent a second time and whichever response comes
+first is used, the other one being read and dropped in the background.
+
+The delay is ``ROA_HEDGE_DELAY`` seconds if set, else the
+``ROA_HEDGE_PERCENTILE`` percentile of the time the last
+``ROA_HEDGE_WINDOW`` GETs of the same resource (model) waited for their
+response. Nothing is hedged until ``ROA_HEDGE_MIN_SAMPLES`` of them were
+observed.
+"""
+import collections
+import Queue
+import threading
+
+from django.conf import settings
+
+ROA_HEDGE_READS = getattr(settings, 'ROA_HEDGE_READS', False)
+ROA_HEDGE_DELAY = getattr(settings, 'ROA_HEDGE_DELAY', None)
+ROA_HEDGE_PERCENTILE = getattr(settings, 'ROA_HEDGE_PERCENTILE', 95)
+ROA_HEDGE_WINDOW = getattr(settings, 'ROA_HEDGE_WINDOW', 100)
+ROA_HEDGE_MIN_SAMPLES = getattr(settings, 'ROA_HEDGE_MIN_SAMPLES', 20)
+
+_latencies = {}
+_lock = threading.Lock()
+
+
+class LatencyWindow(object):
+    """
+    Durations of the last calls of a resource.
+    """
+    def __init__(self, size=ROA_HEDGE_WINDOW):
+        self.durations = collections.deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self.lock:
+            self.durations.append(seconds)
+
+    def percentile(self, percent, min_samples=ROA_HEDGE_MIN_SAMPLES):
+        """
+        Returns the given percentile of durations, None if there are fewer
+        than ``min_samples`` of them.
+        """
+        with self.lock:
+            durations = sorted(self.durations)
+        if not durations or len(durations) < min_samples:
+            return None
+        index = int(round(percent / 100.0 * (len(durations) - 1)))
+        return durations[index]
+
+
+def enabled(method):
+    return ROA_HEDGE_READS and method == 'GET'
+
+
+def resource_key(resource):
+    if resource.model is not None:
+        return resource.model._meta.object_name
+    return resource.uri
+
+
+def latency_window(resource):
+    key = resource_key(resource)
+    with _lock:
+        window = _latencies.get(key)
+        if window is None:
+            window = _latencies[key] = LatencyWindow()
+        return window
+
+
+def observe(resource, seconds):
+    latency_window(resource).observe(seconds)
+
+
+def hedge_delay(resource):
+    """
+    Returns the seconds after which a GET of the resource is hedged, None
+    if it is not.
+    """
+    if ROA_HEDGE_DELAY is not None:
+        return ROA_HEDGE_DELAY
+    return latency_window(resource).percentile(ROA_HEDGE_PERCENTILE)
+
+
+def discard(response):
+    """
+    Reads and drops the body of a response so that its connection is
+    released.
+    """
+    try:
+        response.body_string()
+    except Exception:
+        pass
+
+
+def hedged(first, second, delay, abort=None):
+    """
+    Calls ``first`` on the calling thread, where thread locals (deadline,
+    query log) are set, and ``second`` in another thread if ``first`` has
+    not returned after ``delay`` seconds. If ``second`` answers first,
+    ``abort`` is called to interrupt ``first``.
+
+    Returns the first response and whether the request was hedged, errors
+    are raised once every call failed.
+    """
+    lock = threading.Lock()
+    state = {'finished': False, 'hedged': False}
+    answered = []
+    hedge_results = Queue.Queue()
+
+    def hedge():
+        with lock:
+            if state['finished']:
+                return
+            state['hedged'] = True
+        try:
+            response = second()
+        except Exception as e:
+            hedge_results.put((None, e))
+            return
+        with lock:
+            won = not answered
+            answered.append(response)
+        if won:
+            hedge_results.put((response, None))
+            if abort is not None:
+                abort()
+        else:
+            discard(response)
+
+    timer = threading.Timer(delay, hedge)
+    timer.daemon = True
+    timer.start()
+    response = error = None
+    try:
+        response = first()
+    except Exception as e:
+        error = e
+    timer.cancel()
+    with lock:
+        state['finished'] = True
+        is_hedged = state['hedged']
+        won = error is None and not answered
+        if won:
+            answered.append(response)
+    if won:
+        return response, is_hedged
+    if error is None:
+        discard(response)
+    elif not is_hedged:
+        raise error
+    hedge_response, hedge_error = hedge_results.get()
+    if hedge_error is not None:
+        raise error or hedge_error
+    return hedge_response, True
@@ -0,0 +1,220 @@
+"""
+HTTP/2 transport, enabled by ``ROA_HTTP2`` and requiring the ``hyper``
+module.
+
+Every remote call to a host goes through a single HTTP/2 connection, shared
+by all threads: concurrent calls are multiplexed as streams of this
+connection instead of each opening a socket. Requests are built as usual by
+restkit (filters, parameters, error responses), only sending them and
+reading responses differ, see ``HTTP2Client``.
+
+Plain ``http`` URLs speak HTTP/2 with prior knowledge, ``https`` ones
+negotiate it through ALPN. Redirects are followed as restkit does if the
+client is told to.
+
+Socket timeouts would apply to every stream of a shared connection, calls
+bounded by connect or read timeouts (or by a deadline) are therefore sent
+over HTTP/1.1, see ``ROAResource.make_client``.
+"""
+import socket
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from restkit.client import Client
+from restkit.errors import AlreadyRead, RequestError
+
+from django_roa.db.metrics import ConnectionTiming
+
+try:
+    from hyper import HTTP20Connection
+    from hyper.common.exceptions import ConnectionResetError
+    from hyper.http20.exceptions import ConnectionError
+    CONNECTION_ERRORS = (socket.error, IOError, ConnectionResetError,
+                         ConnectionError)
+except ImportError:
+    HTTP20Connection = None
+    CONNECTION_ERRORS = (socket.error, IOError)
+
+ROA_HTTP2 = getattr(settings, 'ROA_HTTP2', False)
+
+if ROA_HTTP2 and HTTP20Connection is None:
+    raise ImproperlyConfigured("ROA_HTTP2 is set but the hyper module is not "
+                               "installed.")
+
+# Headers specific to HTTP/1.1 connections, forbidden in HTTP/2.
+CONNECTION_HEADERS = ('connection', 'host', 'keep-alive', 'proxy-connection',
+                      'transfer-encoding', 'upgrade')
+
+# Methods retried once on a new connection if the shared one was lost.
+IDEMPOTENT_METHODS = ('GET', 'HEAD')
+
+_connections = {}
+_lock = threading.Lock()
+
+
+# Statuses redirecting to the same method, and to a GET for POSTs.
+REDIRECT_STATUSES = (301, 302, 307)
+SEE_OTHER = 303
+
+
+def enabled():
+    return bool(ROA_HTTP2)
+
+
+def get_connection(scheme, host, port):
+    """
+    Returns the connection shared by every call to this host.
+    """
+    key = (scheme, host, port)
+    with _lock:
+        connection = _connections.get(key)
+        if connection is None:
+            connection = _connections[key] = HTTP20Connection(
+                host, port, secure=scheme == 'https')
+        return connection
+
+
+def drop_connection(scheme, host, port, connection):
+    """
+    Forgets a broken connection so that the next call opens a new one.
+    """
+    key = (scheme, host, port)
+    with _lock:
+        if _connections.get(key) is connection:
+            del _connections[key]
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+def http2_headers(headers):
+    """
+    Returns request headers as a dict, without connection specific ones.
+    """
+    return dict((name, str(value)) for name, value in headers.items()
+                if name.lower() not in CONNECTION_HEADERS)
+
+
+class ResponseHeaders(dict):
+    """
+    Case insensitive response headers, multiple values being joined.
+    """
+    def __init__(self, pairs):
+        super(ResponseHeaders, self).__init__()
+        for name, value in pairs:
+            name = name.lower()
+            if name in self:
+                value = '%s, %s' % (self[name], value)
+            self[name] = value
+
+    def __getitem__(self, name):
+        return super(ResponseHeaders, self).__getitem__(name.lower())
+
+    def __contains__(self, name):
+        return super(ResponseHeaders, self).__contains__(name.lower())
+
+    def get(self, name, default=None):
+        return super(ResponseHeaders, self).get(name.lower(), default)
+
+
+class HTTP2Response(object):
+    """
+    Response of a stream, with the interface of restkit's responses used
+    by django-roa. Gzip and deflate bodies are decompressed by hyper.
+    """
+    def __init__(self, request, response):
+        self.request = request
+        self.final_url = request.url
+        self.status_int = response.status
+        self.status = '%s %s' % (response.status, response.reason or '')
+        self.headers = ResponseHeaders(response.headers.iter_raw())
+        self._response = response
+        self._already_read = False
+
+    def __getitem__(self, key):
+        return self.headers.get(key)
+
+    def __contains__(self, key):
+        return key in self.headers
+
+    def can_read(self):
+        return not self._already_read
+
+    def body_stream(self):
+        if self._already_read:
+            raise AlreadyRead()
+        self._already_read = True
+        return self._response
+
+    def body_string(self, charset=None, unicode_errors='strict'):
+        body = self.body_stream().read()
+        self._response.close()
+        if charset is not None:
+            try:
+                body = body.decode(charset, unicode_errors)
+            except UnicodeDecodeError:
+                pass
+        return body
+
+
+class HTTP2Client(ConnectionTiming, Client):
+    """
+    Restkit client sending requests as streams of shared HTTP/2
+    connections.
+    """
+    def perform(self, request):
+        parsed = request.parsed_url
+        scheme = parsed.scheme
+        port = parsed.port or (scheme == 'https' and 443 or 80)
+        headers = http2_headers(request.headers)
+        attempts = request.method in IDEMPOTENT_METHODS and 2 or 1
+        while True:
+            attempts -= 1
+            with self.connecting():
+                connection = get_connection(scheme, parsed.hostname, port)
+            try:
+                stream_id = connection.request(request.method, request.path,
+                                               body=request.body,
+                                               headers=headers)
+                response = connection.get_response(stream_id)
+            except CONNECTION_ERRORS as e:
+                drop_connection(scheme, parsed.hostname, port, connection)
+                if not attempts:
+                    raise RequestError(str(e))
+            else:
+                break
+        response = HTTP2Response(request, response)
+        if self.follow_redirect and self.redirects(request, response):
+            response.body_string()
+            return self.redirect(response.headers.get('location'), request)
+        for f in self.response_filters:
+            f.on_response(response, request)
+        return response
+
+    def redirects(self, request, response):
+        """
+        Returns whether the response redirects the request, updating it
+        for the redirection the way restkit's client does.
+        """
+        if 'location' not in response.headers:
+            return False
+        if response.status_int in REDIRECT_STATUSES:
+            if request.method not in IDEMPOTENT_METHODS \
+               and not self.force_follow_redirect:
+                return False
+            if hasattr(request.body, 'read'):
+                try:
+                    request.body.seek(0)
+                except AttributeError:
+                    raise RequestError("Can't redirect %s to %s because "
+                                       "body has already been read"
+                                       % (request.url, response.headers['location']))
+            return True
+        if response.status_int == SEE_OTHER and request.method == 'POST':
+            request.method = 'GET'
+            request.body = None
+            return True
+        return False
@@ -0,0 +1,50 @@
+import logging
+
+from django.conf import settings
+from django.utils.encoding import force_unicode
+
+logger = logging.getLogger("django_roa")
+payload_logger = logging.getLogger("django_roa.payloads")
+
+ROA_LOG_PAYLOADS = getattr(settings, 'ROA_LOG_PAYLOADS', False)
+ROA_LOG_PAYLOADS_MAX_SIZE = getattr(settings, 'ROA_LOG_PAYLOADS_MAX_SIZE', 1024)
+
+
+class TruncatedPayload(object):
+    """
+    Defers the conversion of a payload to unicode until the record is
+    actually emitted, truncating it to ``ROA_LOG_PAYLOADS_MAX_SIZE``.
+    """
+    def __init__(self, payload, max_size=None):
+        self.payload = payload
+        self.max_size = max_size or ROA_LOG_PAYLOADS_MAX_SIZE
+
+    def __unicode__(self):
+        payload = force_unicode(self.payload, errors='replace')
+        if len(payload) > self.max_size:
+            return u"%s...(%d more characters)" % (payload[:self.max_size],
+                                                    len(payload) - self.max_size)
+        return payload
+
+    def __str__(self):
+        return self.__unicode__().encode('utf-8')
+
+
+def log_request(action, subject, uri, parameters=None, payload=None):
+    """
+    Logs a remote call as a structured event, formatting is deferred to the
+    logging framework so that nothing is built when DEBUG is disabled.
+
+    Payloads are only dumped, truncated, to the ``django_roa.payloads``
+    logger if ``ROA_LOG_PAYLOADS`` is set.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(u'%-10s: "%s" through %s with parameters "%s"',
+                     action, subject, uri, parameters,
+                     extra={'roa_action': action, 'roa_uri': uri,
+                            'roa_parameters': parameters})
+    if payload is not None and ROA_LOG_PAYLOADS \
+            and payload_logger.isEnabledFor(logging.DEBUG):
+        payload_logger.debug(u'%-10s: "%s" through %s with payload "%s"',
+                             action, subject, uri, TruncatedPayload(payload),
+                             extra={'roa_action': action, 'roa_uri': uri})
@@ -15,3 +15,12 @@ class ROAManager(Manager):
         Returns a QuerySet which access remote resources.
         """
         return RemoteQuerySet(self.model)
+
+    def keyset(self, *args, **kwargs):
+        return self.get_query_set().keyset(*args, **kwargs)
+
+    def timeout(self, *args, **kwargs):
+        return self.get_query_set().timeout(*args, **kwargs)
+
+    def with_count(self, *args, **kwargs):
+        return self.get_query_set().with_count(*args, **kwargs)
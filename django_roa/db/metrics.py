@@ -0,0 +1,229 @@
+import time
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from django_roa.db.signals import roa_request_started, roa_request_finished
+
+ROA_COLLECT_METRICS = getattr(settings, 'ROA_COLLECT_METRICS', False)
+ROA_METRICS_BUCKETS = getattr(settings, 'ROA_METRICS_BUCKETS',
+                              (5, 10, 25, 50, 100, 250, 500, 1000, 2500,
+                               5000, 10000))
+
+PHASES = ('connect', 'wait', 'transfer', 'parse', 'instantiate')
+
+
+class RemoteCall(object):
+    """
+    Tracks a single remote call: its status, the number of bytes read, the
+    time spent in each phase and, for lists filtered locally, the number of
+    rows fetched and kept. Phases are getting a connection (``connect``),
+    sending the request and waiting for the response headers (``wait``),
+    reading the body (``transfer``), parsing it and building instances.
+    Calls loading deferred fields tell which field access triggered them.
+    Calls refused by an open circuit are flagged ``short_circuited``, those
+    answered from the stale fallback ``stale`` and hedged GETs ``hedged``.
+    Signals are sent when it starts and when it finishes, using it as a
+    context manager finishes it on exit.
+    """
+    def __init__(self, model, verb, url, parameters=None):
+        self.model = model
+        self.verb = verb
+        self.url = url
+        self.parameters = parameters
+        self.status = None
+        self.bytes = 0
+        self.rows_fetched = self.rows_kept = None
+        self.deferred_field = None
+        self.short_circuited = self.stale = self.hedged = False
+        self.error = None
+        self.timings = dict.fromkeys(PHASES, 0.0)
+        self.duration = None
+        self.finished = False
+        self.started_at = time.time()
+        roa_request_started.send(sender=model, call=self, model=model,
+                                 verb=verb, url=url)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.finish(error=exc_value)
+
+    @contextmanager
+    def measure(self, phase):
+        """
+        Adds the time spent in the block to the given phase, time spent
+        in other phases measured within the block is left to them.
+        """
+        start = time.time()
+        timings = dict(self.timings)
+        try:
+            yield
+        finally:
+            elapsed = time.time() - start
+            for other, seconds in timings.iteritems():
+                if other != phase:
+                    elapsed -= self.timings[other] - seconds
+            self.timings[phase] += elapsed
+
+    def finish(self, status=None, error=None):
+        """
+        Marks the call as finished, only the first call is taken into account.
+        """
+        if self.finished:
+            return
+        self.finished = True
+        if status is not None:
+            self.status = status
+        self.error = error
+        self.duration = time.time() - self.started_at
+        roa_request_finished.send(sender=self.model, call=self,
+                                  model=self.model, verb=self.verb,
+                                  url=self.url, status=self.status,
+                                  bytes=self.bytes, timings=self.timings,
+                                  duration=self.duration, error=error)
+
+
+class ConnectionTiming(object):
+    """
+    Client mixin accounting the time spent getting a connection, opened or
+    taken from a pool, to the connect phase of its current call.
+    """
+    call = None
+
+    @contextmanager
+    def connecting(self):
+        if self.call is None:
+            yield
+        else:
+            with self.call.measure('connect'):
+                yield
+
+    def get_connection(self, request):
+        with self.connecting():
+            return super(ConnectionTiming, self).get_connection(request)
+
+
+class TimedStream(object):
+    """
+    Wraps a response body to account bytes read and transfer time to a call.
+    """
+    def __init__(self, stream, call):
+        self.stream = stream
+        self.call = call
+
+    def read(self, size=-1):
+        with self.call.measure('transfer'):
+            data = self.stream.read(size)
+        self.call.bytes += len(data)
+        return data
+
+    def close(self):
+        self.stream.close()
+
+
+class Histogram(object):
+    """
+    Cumulative histogram of durations expressed in milliseconds.
+    """
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, milliseconds):
+        self.total += milliseconds
+        for index, bound in enumerate(self.buckets):
+            if milliseconds <= bound:
+                self.counts[index] += 1
+                return
+        self.counts[-1] += 1
+
+    def as_dict(self):
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        return {'buckets': dict(zip(bounds, self.counts)),
+                'count': sum(self.counts), 'sum': self.total}
+
+
+class MetricsCollector(object):
+    """
+    Aggregates finished remote calls per model and verb: counters of
+    requests, errors, bytes, rows fetched and kept by lists filtered
+    locally, loads of deferred fields, calls refused by an open circuit,
+    stale responses and hedged GETs, plus histograms of the duration of
+    each phase.
+    """
+    def __init__(self, buckets=ROA_METRICS_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+
+    def connect(self):
+        roa_request_finished.connect(self.receive,
+                                     dispatch_uid='django_roa_metrics')
+
+    def disconnect(self):
+        roa_request_finished.disconnect(dispatch_uid='django_roa_metrics')
+
+    def receive(self, sender, call, **kwargs):
+        label = call.model and call.model._meta.object_name or 'unknown'
+        with self.lock:
+            stats = self.stats.get((label, call.verb))
+            if stats is None:
+                stats = self.stats[(label, call.verb)] = {
+                    'requests': 0, 'errors': 0, 'bytes': 0,
+                    'rows_fetched': 0, 'rows_kept': 0, 'deferred_loads': 0,
+                    'short_circuits': 0, 'stale_responses': 0, 'hedged': 0,
+                    'histograms': dict((phase, Histogram(self.buckets))
+                                       for phase in PHASES + ('total',)),
+                }
+            stats['requests'] += 1
+            stats['bytes'] += call.bytes
+            if call.error is not None:
+                stats['errors'] += 1
+            if call.rows_fetched is not None:
+                stats['rows_fetched'] += call.rows_fetched
+                stats['rows_kept'] += call.rows_kept
+            if call.deferred_field is not None:
+                stats['deferred_loads'] += 1
+            if call.short_circuited:
+                stats['short_circuits'] += 1
+            if call.stale:
+                stats['stale_responses'] += 1
+            if call.hedged:
+                stats['hedged'] += 1
+            histograms = stats['histograms']
+            for phase, seconds in call.timings.iteritems():
+                histograms[phase].observe(seconds * 1000)
+            histograms['total'].observe(call.duration * 1000)
+
+    def snapshot(self):
+        """
+        Returns the aggregated metrics as a dictionary keyed by
+        ``"<model>.<verb>"``.
+        """
+        with self.lock:
+            return dict(('%s.%s' % key, {
+                'requests': stats['requests'],
+                'errors': stats['errors'],
+                'bytes': stats['bytes'],
+                'rows_fetched': stats['rows_fetched'],
+                'rows_kept': stats['rows_kept'],
+                'deferred_loads': stats['deferred_loads'],
+                'short_circuits': stats['short_circuits'],
+                'stale_responses': stats['stale_responses'],
+                'hedged': stats['hedged'],
+                'histograms': dict((phase, histogram.as_dict())
+                    for phase, histogram in stats['histograms'].iteritems()),
+            }) for key, stats in self.stats.iteritems())
+
+
+collector = MetricsCollector()
+if ROA_COLLECT_METRICS:
+    collector.connect()
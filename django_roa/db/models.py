@@ -1,17 +1,17 @@
 import sys
 import copy
-import logging
+import json
 from StringIO import StringIO
 
 from django.conf import settings
 from django.core import serializers
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned,\
-    FieldError
+    FieldError, ValidationError
 from django.db import models
 from django.db.models import signals
 from django.db.models.options import Options
 from django.db.models.loading import register_models, get_model
-from django.db.models.base import ModelBase, subclass_exception, \
+from django.db.models.base import ModelBase, ModelState, subclass_exception, \
     get_absolute_url, method_get_order, method_set_order
 from django.db.models.fields.related import (OneToOneField, add_lazy_relation)
 from django.utils.functional import curry
@@ -19,10 +19,16 @@ from functools import update_wrapper
 
 from django.utils.encoding import force_unicode, smart_unicode
 
-from restkit import Resource, RequestFailed, ResourceNotFound
+from restkit import RequestFailed, ResourceNotFound
+from django_roa.db.decoders import DecoderPlan
+from django_roa.db.deferred import contribute_deferred_fields
 from django_roa.db.exceptions import ROAException
-
-logger = logging.getLogger("django_roa")
+from django_roa.db.logs import log_request
+from django_roa.db.query import PARAMETER_NAMES, static_parameters, \
+    instantiate, single_row
+from django_roa.db.transport import ROAResource, response_body
+from django_roa.db.unique import unique_constraints, encode_constraints, \
+    conflicting_errors
 
 ROA_HEADERS = getattr(settings, 'ROA_HEADERS', {})
 ROA_FORMAT = getattr(settings, 'ROA_FORMAT', 'json')
@@ -31,6 +37,7 @@ ROA_MODEL_NAME_MAPPING = getattr(settings, 'ROA_MODEL_NAME_MAPPING', [])
 ROA_MODEL_CREATE_MAPPING = getattr(settings, 'ROA_MODEL_CREATE_MAPPING', {})
 ROA_MODEL_UPDATE_MAPPING = getattr(settings, 'ROA_MODEL_UPDATE_MAPPING', {})
 ROA_CUSTOM_ARGS = getattr(settings, "ROA_CUSTOM_ARGS", {})
+ROA_FAST_INSTANTIATION = getattr(settings, 'ROA_FAST_INSTANTIATION', True)
 
 DEFAULT_CHARSET = getattr(settings, 'DEFAULT_CHARSET', 'utf-8')
 
@@ -69,6 +76,20 @@ class ROAModelBase(ModelBase):
             meta = attr_meta
         base_meta = getattr(new_class, '_meta', None)
 
+        # Remote only options, unknown to Options.
+        deferred_fields = getattr(base_meta, 'deferred_fields', ())
+        if meta is not None and 'deferred_fields' in meta.__dict__:
+            deferred_fields = tuple(meta.deferred_fields)
+            del meta.deferred_fields
+        timeouts = getattr(base_meta, 'timeouts', None)
+        if meta is not None and 'timeouts' in meta.__dict__:
+            timeouts = meta.timeouts
+            del meta.timeouts
+        fast_instantiation = getattr(base_meta, 'fast_instantiation', None)
+        if meta is not None and 'fast_instantiation' in meta.__dict__:
+            fast_instantiation = meta.fast_instantiation
+            del meta.fast_instantiation
+
         if getattr(meta, 'app_label', None) is None:
             # Figure out the app_label by looking one level up.
             # For 'django.contrib.sites.models', this would be 'sites'.
@@ -78,6 +99,9 @@ class ROAModelBase(ModelBase):
             kwargs = {}
 
         new_class.add_to_class('_meta', Options(meta, **kwargs))
+        new_class._meta.deferred_fields = deferred_fields
+        new_class._meta.timeouts = timeouts
+        new_class._meta.fast_instantiation = fast_instantiation
         if not abstract:
             new_class.add_to_class('DoesNotExist', subclass_exception(str('DoesNotExist'),
                     tuple(x.DoesNotExist
@@ -241,6 +265,19 @@ class ROAModelBase(ModelBase):
         opts = cls._meta
         opts._prepare(cls)
 
+        # Compile the decoding plan of remote rows once and for all, rows
+        # may lack deferred fields which are loaded on access.
+        deferred = contribute_deferred_fields(cls)
+        cls._roa_decoder = DecoderPlan(opts, deferred)
+
+        # Rows are built by the plan rather than by a serializer of the
+        # model, unless it has one and did not opt in.
+        fast_instantiation = opts.fast_instantiation
+        if fast_instantiation is None:
+            fast_instantiation = ROA_FAST_INSTANTIATION \
+                and getattr(cls, 'get_serializer', None) is None
+        cls._roa_fast_instantiation = fast_instantiation
+
         if opts.order_with_respect_to:
             cls.get_next_in_order = curry(cls._get_next_or_previous_in_order, is_next=True)
             cls.get_previous_in_order = curry(cls._get_next_or_previous_in_order, is_next=False)
@@ -273,17 +310,8 @@ class ROAModelBase(ModelBase):
             cls.get_absolute_url = update_wrapper(curry(get_absolute_url, opts, cls.get_absolute_url),
                                                   cls.get_absolute_url)
 
-        if hasattr(cls, 'get_resource_url_list'):
-            cls.get_resource_url_list = staticmethod(curry(get_resource_url_list,
-                                                           opts, cls.get_resource_url_list))
-
-        if hasattr(cls, 'get_resource_url_count'):
-            cls.get_resource_url_count = update_wrapper(curry(get_resource_url_count, opts, cls.get_resource_url_count),
-                                                        cls.get_resource_url_count)
-
-        if hasattr(cls, 'get_resource_url_detail'):
-            cls.get_resource_url_detail = update_wrapper(curry(get_resource_url_detail, opts, cls.get_resource_url_detail),
-                                                         cls.get_resource_url_detail)
+        # Resolve resource URLs and their overrides once and for all.
+        ResourceURLs(cls).contribute_to_class(cls)
 
         signals.class_prepared.send(sender=cls)
 
@@ -301,9 +329,37 @@ class ROAModel(models.Model):
     def get_resource_url_count(self):
         return u"%scount/" % (self.get_resource_url_list(),)
 
+    def get_resource_url_aggregate(self):
+        return u"%saggregate/" % (self.get_resource_url_list(),)
+
+    def get_resource_url_unique(self):
+        return u"%sunique/" % (self.get_resource_url_list(),)
+
     def get_resource_url_detail(self):
         return u"%s%s/" % (self.get_resource_url_list(), self.pk)
 
+    @classmethod
+    def from_remote_row(cls, row):
+        """
+        Builds an instance from a parsed remote row without going through
+        ``Model.__init__``, the way ``from_db`` does for SQL rows: decoded
+        values are assigned to ``__dict__`` directly and init signals are
+        only sent if something listens to them.
+        """
+        values = cls._roa_decoder.decode(row)
+        send_signals = signals.pre_init.has_listeners(cls) \
+                    or signals.post_init.has_listeners(cls)
+        if send_signals:
+            signals.pre_init.send(sender=cls, args=(), kwargs=dict(values))
+        instance = cls.__new__(cls)
+        instance.__dict__ = values
+        state = ModelState()
+        state.adding = False
+        values['_state'] = state
+        if send_signals:
+            signals.post_init.send(sender=cls, instance=instance)
+        return instance
+
     def save_base(self, raw=False, cls=None, origin=None, force_insert=False,
                   force_update=False, using=None, update_fields=None):
         """
@@ -358,6 +414,12 @@ class ROAModel(models.Model):
             get_args = {'format': ROA_FORMAT}
             get_args.update(ROA_CUSTOM_ARGS)
 
+            # Store uncommitted files first, only their names are serialized.
+            for field in meta.local_fields:
+                if isinstance(field, models.FileField) \
+                   and field.attname in self.__dict__:
+                    field.pre_save(self, not pk_is_set)
+
             serializer = self.get_serializer(self)
             payload = self.get_renderer().render(serializer.data)
 
@@ -365,8 +427,8 @@ class ROAModel(models.Model):
             if not meta.pk.attname in ['pk', 'id']:
                 # consider it might be inserting so check it first
                 # @todo: try to improve this block to check if custom pripary key is not None first
-                resource = Resource(self.get_resource_url_detail(),
-                                    filters=ROA_FILTERS)
+                resource = ROAResource(self.get_resource_url_detail(),
+                                       model=cls, filters=ROA_FILTERS)
                 try:
                     response = resource.get(payload=None, headers=ROA_HEADERS, **get_args)
                 except ResourceNotFound:
@@ -374,48 +436,47 @@ class ROAModel(models.Model):
                     pk_is_set = False
                 except RequestFailed:
                     pk_is_set = False
+                else:
+                    resource.call.finish()
 
             if force_update or pk_is_set and not self.pk is None:
                 record_exists = True
-                resource = Resource(self.get_resource_url_detail(),
-                                    filters=ROA_FILTERS)
+                resource = ROAResource(self.get_resource_url_detail(),
+                                       model=cls, filters=ROA_FILTERS)
                 try:
-                    logger.debug(u"""Modifying : "%s" through %s
-                                  with payload "%s" and GET args "%s" """ % (
-                                  force_unicode(self),
-                                  force_unicode(resource.uri),
-                                  force_unicode(payload),
-                                  force_unicode(get_args)))
+                    log_request(u'Modifying', self, resource.uri, get_args,
+                                payload=payload)
                     response = resource.put(payload=payload, headers=ROA_HEADERS, **get_args)
                 except RequestFailed as e:
                     raise ROAException(e)
             else:
                 record_exists = False
-                resource = Resource(self.get_resource_url_list(),
-                                    filters=ROA_FILTERS)
+                resource = ROAResource(self.get_resource_url_list(),
+                                       model=cls, filters=ROA_FILTERS)
                 try:
-                    logger.debug(u"""Creating  : "%s" through %s
-                                  with payload "%s" and GET args "%s" """ % (
-                                  force_unicode(self),
-                                  force_unicode(resource.uri),
-                                  force_unicode(payload),
-                                  force_unicode(get_args)))
+                    log_request(u'Creating', self, resource.uri, get_args,
+                                payload=payload)
                     response = resource.post(payload=payload, headers=ROA_HEADERS, **get_args)
                 except RequestFailed as e:
                     raise ROAException(e)
 
-            response = force_unicode(response.body_string()).encode(DEFAULT_CHARSET)
-
-            for local_name, remote_name in ROA_MODEL_NAME_MAPPING:
-                response = response.replace(remote_name, local_name)
+            with resource.call as call:
+                response = force_unicode(response_body(response, call)).encode(DEFAULT_CHARSET)
 
-            parser = self.get_parser()
-            serializer = self.get_serializer(data=parser.parse(StringIO(response)))
+                for local_name, remote_name in ROA_MODEL_NAME_MAPPING:
+                    response = response.replace(remote_name, local_name)
 
-            if not serializer.is_valid():
-                raise ROAException('Invalid deserialization')
+                parser = self.get_parser()
+                with call.measure('parse'):
+                    data = single_row(parser.parse(StringIO(response)))
+                with call.measure('instantiate'):
+                    obj = instantiate(cls, data)
 
-            self = serializer.object
+            # Values set remotely (primary key, defaults) are kept.
+            for field in meta.local_fields:
+                if field.attname in obj.__dict__:
+                    setattr(self, field.attname, obj.__dict__[field.attname])
+            self._state.adding = False
 
         if origin:
             signals.post_save.send(sender=origin, instance=self,
@@ -429,44 +490,176 @@ class ROAModel(models.Model):
                 % (self._meta.object_name, self._meta.pk.attname)
 
         # Deletion in cascade should be done server side.
-        resource = Resource(self.get_resource_url_detail(),
-                            filters=ROA_FILTERS)
+        resource = ROAResource(self.get_resource_url_detail(),
+                               model=self.__class__, filters=ROA_FILTERS)
+
+        signals.pre_delete.send(sender=self.__class__, instance=self)
 
-        logger.debug(u"""Deleting  : "%s" through %s""" % \
-            (unicode(self), unicode(resource.uri)))
+        log_request(u'Deleting', self, resource.uri, ROA_CUSTOM_ARGS)
 
         resource.delete(headers=ROA_HEADERS, **ROA_CUSTOM_ARGS)
+        resource.call.finish()
+
+        signals.post_delete.send(sender=self.__class__, instance=self)
 
     delete.alters_data = True
 
-    def _get_unique_checks(self, exclude=None):
+    def validate_unique(self, exclude=None):
         """
-        We don't want to check unicity that way for now.
+        Checks unique constraints on the model in a single request to its
+        unique URL and raises ``ValidationError`` if any failed. Nothing is
+        checked if the resource has no unique URL (404).
         """
-        unique_checks, date_checks = [], []
-        return unique_checks, date_checks
-
-
-##############################################
-# HELPER FUNCTIONS (CURRIED MODEL FUNCTIONS) #
-##############################################
+        unique_checks, date_checks = self._get_unique_checks(exclude=exclude)
+        constraints = unique_constraints(self, unique_checks, date_checks)
+        if not constraints:
+            return
+
+        pk = not self._state.adding and self.pk or None
+        parameters = encode_constraints(constraints, pk, PARAMETER_NAMES)
+        parameters.update(static_parameters())
+        resource = ROAResource(self.get_resource_url_unique(),
+                               model=self.__class__, filters=ROA_FILTERS)
+        try:
+            log_request(u'Checking uniqueness of', self, resource.uri, parameters)
+            response = resource.get(headers=ROA_HEADERS, **parameters)
+        except ResourceNotFound:
+            # The service has no unique URL, it checks constraints on save.
+            return
+        except ROAException:
+            raise
+        except Exception as e:
+            raise ROAException(e)
+
+        with resource.call as call:
+            conflicts = json.loads(response_body(response, call))
+        errors = conflicting_errors(constraints, conflicts, PARAMETER_NAMES)
+        if errors:
+            raise ValidationError(errors)
+
+
+#############################################
+# RESOURCE URLS RESOLVED ONCE PER MODEL CLASS #
+#############################################
 
 ROA_URL_OVERRIDES_LIST = getattr(settings, 'ROA_URL_OVERRIDES_LIST', {})
 ROA_URL_OVERRIDES_COUNT = getattr(settings, 'ROA_URL_OVERRIDES_COUNT', {})
+ROA_URL_OVERRIDES_AGGREGATE = getattr(settings, 'ROA_URL_OVERRIDES_AGGREGATE', {})
+ROA_URL_OVERRIDES_UNIQUE = getattr(settings, 'ROA_URL_OVERRIDES_UNIQUE', {})
 ROA_URL_OVERRIDES_DETAIL = getattr(settings, 'ROA_URL_OVERRIDES_DETAIL', {})
+ROA_CACHE_RESOURCE_URLS = getattr(settings, 'ROA_CACHE_RESOURCE_URLS', True)
+
+
+def original_function(func):
+    """
+    Returns the function defined by the user from a (possibly inherited)
+    ``get_resource_url_*`` attribute.
+    """
+    func = getattr(func, 'im_func', func)
+    return getattr(func, '_roa_original', func)
+
+
+class ResourceURLs(object):
+    """
+    Resource URLs of a model with ``ROA_URL_OVERRIDES_*`` settings resolved
+    once at class preparation.
+
+    The list URL is computed on first use and cached (unless
+    ``ROA_CACHE_RESOURCE_URLS`` is False), default count, aggregate,
+    unique and detail URLs are derived from it without instantiating the model.
+    Custom functions get an instance built by ``from_remote_row``.
+    """
+    def __init__(self, model):
+        opts = model._meta
+        key = '%s.%s' % (opts.app_label, opts.module_name)
+        self.model = model
+        self.pk_attname = opts.pk.attname
+        self.originals = (original_function(model.get_resource_url_list),
+                          original_function(model.get_resource_url_count),
+                          original_function(model.get_resource_url_aggregate),
+                          original_function(model.get_resource_url_unique),
+                          original_function(model.get_resource_url_detail))
+        self.list_func, count_func, aggregate_func, unique_func, detail_func = self.originals
+        self.list_url = ROA_URL_OVERRIDES_LIST.get(key) or None
+        self.count_func = ROA_URL_OVERRIDES_COUNT.get(key, count_func)
+        self.aggregate_func = ROA_URL_OVERRIDES_AGGREGATE.get(key, aggregate_func)
+        self.unique_func = ROA_URL_OVERRIDES_UNIQUE.get(key, unique_func)
+        self.detail_func = ROA_URL_OVERRIDES_DETAIL.get(key, detail_func)
+        self.default_count = self.count_func is ROAModel.get_resource_url_count.im_func
+        self.default_aggregate = self.aggregate_func is ROAModel.get_resource_url_aggregate.im_func
+        self.default_unique = self.unique_func is ROAModel.get_resource_url_unique.im_func
+        self.default_detail = self.detail_func is ROAModel.get_resource_url_detail.im_func
+
+    def list(self):
+        if self.list_url is not None:
+            return self.list_url
+        url = self.list_func()
+        if ROA_CACHE_RESOURCE_URLS:
+            self.list_url = url
+        return url
+
+    def count(self, instance=None):
+        if self.default_count:
+            return u"%scount/" % (self.list(),)
+        if instance is None:
+            instance = self.model.from_remote_row({})
+        return self.count_func(instance)
+
+    def aggregate(self, instance=None):
+        if self.default_aggregate:
+            return u"%saggregate/" % (self.list(),)
+        if instance is None:
+            instance = self.model.from_remote_row({})
+        return self.aggregate_func(instance)
+
+    def unique(self, instance=None):
+        if self.default_unique:
+            return u"%sunique/" % (self.list(),)
+        if instance is None:
+            instance = self.model.from_remote_row({})
+        return self.unique_func(instance)
+
+    def detail(self, instance=None, pk=None):
+        if instance is not None:
+            pk = instance.pk
+        if self.default_detail:
+            return u"%s%s/" % (self.list(), pk)
+        if instance is None:
+            instance = self.model.from_remote_row({})
+            setattr(instance, self.pk_attname, pk)
+        return self.detail_func(instance)
+
+    def contribute_to_class(self, cls):
+        """
+        Replaces ``get_resource_url_*`` methods of the model with ones
+        relying on this object, originals are kept for subclasses.
+        """
+        urls = self
+
+        def get_resource_url_list():
+            return urls.list()
 
+        def get_resource_url_count(self):
+            return urls.count(self)
 
-def get_resource_url_list(opts, func, *args, **kwargs):
-    key = '%s.%s' % (opts.app_label, opts.module_name)
-    overridden = ROA_URL_OVERRIDES_LIST.get(key, False)
-    return overridden and overridden or func(*args, **kwargs)
+        def get_resource_url_aggregate(self):
+            return urls.aggregate(self)
 
+        def get_resource_url_unique(self):
+            return urls.unique(self)
 
-def get_resource_url_count(opts, func, self, *args, **kwargs):
-    key = '%s.%s' % (opts.app_label, opts.module_name)
-    return ROA_URL_OVERRIDES_COUNT.get(key, func)(self, *args, **kwargs)
+        def get_resource_url_detail(self):
+            return urls.detail(self)
 
+        (get_resource_url_list._roa_original,
+         get_resource_url_count._roa_original,
+         get_resource_url_aggregate._roa_original,
+         get_resource_url_unique._roa_original,
+         get_resource_url_detail._roa_original) = self.originals
 
-def get_resource_url_detail(opts, func, self, *args, **kwargs):
-    key = '%s.%s' % (opts.app_label, opts.module_name)
-    return ROA_URL_OVERRIDES_DETAIL.get(key, func)(self, *args, **kwargs)
+        cls._roa_urls = self
+        cls.get_resource_url_list = staticmethod(get_resource_url_list)
+        cls.get_resource_url_count = get_resource_url_count
+        cls.get_resource_url_aggregate = get_resource_url_aggregate
+        cls.get_resource_url_unique = get_resource_url_unique
+        cls.get_resource_url_detail = get_resource_url_detail
@@ -1,4 +1,5 @@
-import logging
+import json
+import urllib
 from StringIO import StringIO
 
 from django.conf import settings
@@ -11,24 +12,153 @@ try:
 except:
     from django.db.models.sql.constants import LOOKUP_SEP
 from django.db.models.query_utils import Q
+from django.utils.datastructures import SortedDict
 from django.utils.encoding import force_unicode
 
-from restkit import Resource, ResourceNotFound
+from restkit import ResourceNotFound
+from django_roa.db.aggregates import encode_aggregates, aggregate_locally, \
+    value_getter
+from django_roa.db.deferred import attach_group
 from django_roa.db.exceptions import ROAException, ROANotImplementedYetException
-
-logger = logging.getLogger("django_roa")
+from django_roa.db.filters import split_condition, supported_lookups, \
+    compile_condition
+from django_roa.db.logs import logger, log_request
+from django_roa.db.transport import ROAResource, response_body, response_stream
 
 ROA_MODEL_NAME_MAPPING = getattr(settings, 'ROA_MODEL_NAME_MAPPING', [])
 ROA_ARGS_NAMES_MAPPING = getattr(settings, 'ROA_ARGS_NAMES_MAPPING', {})
 ROA_HEADERS = getattr(settings, 'ROA_HEADERS', {})
 ROA_FORMAT = getattr(settings, 'ROA_FORMAT', 'json')
 ROA_FILTERS = getattr(settings, 'ROA_FILTERS', {})
+ROA_KEYSET_PAGE_SIZE = getattr(settings, 'ROA_KEYSET_PAGE_SIZE', 100)
+ROA_COUNT_HEADER = getattr(settings, 'ROA_COUNT_HEADER', 'X-Total-Count')
 
 DEFAULT_CHARSET = getattr(settings, 'DEFAULT_CHARSET', 'utf-8')
 
 
+class ParameterNames(object):
+    """
+    Remote names of query parameters with ``ROA_ARGS_NAMES_MAPPING``
+    applied once, names of filtering lookups are memoized.
+    """
+    def __init__(self, mapping):
+        self.mapping = mapping
+        self.filter_prefix = mapping.get('FILTER_', 'filter_')
+        self.exclude_prefix = mapping.get('EXCLUDE_', 'exclude_')
+        self.order_by = mapping.get('ORDER_BY', 'order_by')
+        self.limit_start = mapping.get('LIMIT_START', 'limit_start')
+        self.limit_stop = mapping.get('LIMIT_STOP', 'limit_stop')
+        self.format = mapping.get('FORMAT', 'format')
+        self.where = mapping.get('WHERE', 'where')
+        self.aggregate_prefix = mapping.get('AGGREGATE_', 'aggregate_')
+        self.group_by = mapping.get('GROUP_BY', 'group_by')
+        self.unique_prefix = mapping.get('UNIQUE_', 'unique_')
+        self.after = mapping.get('AFTER', 'after')
+        # Related objects nested in rows: expand=<fk>,<fk>__<fk>
+        self.expand = mapping.get('EXPAND', 'expand')
+        # Number of matching rows requested with count=exact|estimate and
+        # returned as {"results": [...], "count": <n>} or a header.
+        self.count = mapping.get('COUNT', 'count')
+        # Deferred fields the service may leave out: defer=<field>,<field>
+        self.defer = mapping.get('DEFER', 'defer')
+        # Keys of paginated responses: {"results": [...], "next": <URL>}
+        # or {"results": [...], "cursor": <value sent as after>}.
+        self.results = mapping.get('RESULTS', 'results')
+        self.next = mapping.get('NEXT', 'next')
+        self.cursor = mapping.get('CURSOR', 'cursor')
+        self.lookups = {}
+
+    def lookup(self, prefix, lookup):
+        try:
+            return self.lookups[prefix, lookup]
+        except KeyError:
+            key = '%s%s' % (prefix, lookup)
+            name = self.lookups[prefix, lookup] = self.mapping.get(key, key)
+            return name
+
+    def filter(self, lookup):
+        return self.lookup(self.filter_prefix, lookup)
+
+    def exclude(self, lookup):
+        return self.lookup(self.exclude_prefix, lookup)
+
+    def aggregate(self, alias):
+        return self.lookup(self.aggregate_prefix, alias)
+
+    def unique(self, index):
+        return self.lookup(self.unique_prefix, str(index))
+
+
+PARAMETER_NAMES = ParameterNames(ROA_ARGS_NAMES_MAPPING)
+
+_static_parameters = (None, None)
+
+
+def static_parameters():
+    """
+    Returns parameters sent with every query: the format and
+    ``ROA_CUSTOM_ARGS``, recomputed only when the setting is replaced.
+    """
+    global _static_parameters
+    custom_args = getattr(settings, 'ROA_CUSTOM_ARGS', {})
+    cached_args, parameters = _static_parameters
+    if custom_args is not cached_args:
+        parameters = {PARAMETER_NAMES.format: ROA_FORMAT}
+        parameters.update(custom_args)
+        _static_parameters = (custom_args, parameters)
+    return parameters
+
+
+def encode_parameters(parameters):
+    """
+    Returns parameters as a query string, sorted to be usable as a key.
+    """
+    return urllib.urlencode(sorted(
+        (key, isinstance(value, unicode) and value.encode(DEFAULT_CHARSET) or value)
+        for key, value in parameters.iteritems()))
+
+
+def single_row(data):
+    """
+    Returns the row of a response holding a single object, which Django's
+    serializers put in a list.
+    """
+    if isinstance(data, list) and len(data) == 1:
+        return data[0]
+    return data
+
+
+def instantiate(model, data, response=None):
+    """
+    Returns instances from parsed data, a row or a list of rows: built by
+    ``from_remote_row`` if the model allows it (no serializer of its own
+    or the ``fast_instantiation`` Meta option), by its serializer
+    otherwise. The response is quoted by errors if given.
+    """
+    if model._roa_fast_instantiation:
+        if isinstance(data, list):
+            return [model.from_remote_row(row) for row in data]
+        return model.from_remote_row(data)
+    serializer = model.get_serializer(data=data)
+    if not serializer.is_valid():
+        if response is not None:
+            raise ROAException("Couldn't validate the data (%s)" % response)
+        raise ROAException('Invalid deserialization')
+    objects = serializer.object
+    # Instances come from the service, they are not being added.
+    for obj in isinstance(objects, list) and objects or [objects]:
+        obj._state.adding = False
+    return objects
+
+
 class Query(object):
-    def __init__(self):
+    """
+    Remote query, its parameters are updated as filters, ordering and
+    limits are added and memoized until the next change, so alter it
+    through its methods rather than its attributes.
+    """
+    def __init__(self, model=None):
+        self.model = model
         self.order_by = []
         self.extra_order_by = []
         self.default_ordering = []
@@ -41,26 +171,86 @@ class Query(object):
         self.select_related = False
         self.max_depth = None
         self.extra_select = {}
+        self.conditions = []
+        self.condition_parameters = {}
+        self.local_conditions = []
+        self._local_filter = None
+        self.annotations = SortedDict()
+        self.keyset = None
+        self.keyset_after = None
+        self.dynamic_parameters = {}
+        self._parameters = None
+        self._query_string = None
+        self.deferred = ()
+        self.deferred_load = None
+        self.timeouts = None
+        if model is not None and getattr(model._meta, 'deferred_fields', ()):
+            self.set_deferred(model._meta.deferred_fields)
 
     def can_filter(self):
         return self.filterable
 
     def clone(self):
-        return self
+        obj = self.__class__.__new__(self.__class__)
+        obj.__dict__ = self.__dict__.copy()
+        for name in ('order_by', 'extra_order_by', 'default_ordering', 'conditions'):
+            setattr(obj, name, getattr(self, name)[:])
+        for name in ('filters', 'excludes', 'extra_select', 'dynamic_parameters',
+                     'annotations'):
+            setattr(obj, name, getattr(self, name).copy())
+        return obj
+
+    def _changed(self):
+        self._parameters = self._query_string = None
+
+    def _set_parameter(self, name, value):
+        if value:
+            self.dynamic_parameters[name] = value
+        else:
+            self.dynamic_parameters.pop(name, None)
 
-    def clear_ordering(self):
+    def clear_ordering(self, force_empty=False):
         self.order_by = []
+        self._set_parameter(PARAMETER_NAMES.order_by, None)
+        self._changed()
+
+    def add_ordering(self, *field_names):
+        self.order_by.extend(field_names)
+        self._set_parameter(PARAMETER_NAMES.order_by, ','.join(self.order_by))
+        self._changed()
+
+    def _add_condition(self, condition):
+        self.conditions.append(condition)
+        self.condition_parameters, self.local_conditions = split_condition(
+            self.conditions, PARAMETER_NAMES, supported_lookups(self.model))
+        self._local_filter = None
+        self._changed()
+
+    @property
+    def local_filter(self):
+        """
+        Returns a function evaluating conditions the remote service can't,
+        None if they are all sent to it.
+        """
+        if self.local_conditions and self._local_filter is None:
+            self._local_filter = compile_condition(self.model, self.local_conditions)
+        return self._local_filter
 
     def filter(self, *args, **kwargs):
         self.filters.update(kwargs)
+        self._add_condition(Q(*args, **kwargs))
 
     def exclude(self, *args, **kwargs):
         self.excludes.update(kwargs)
+        self._add_condition(~Q(*args, **kwargs))
 
     def set_limits(self, start=None, stop=None):
         self.limit_start = start
         self.limit_stop = stop
         self.filterable = False
+        self._set_parameter(PARAMETER_NAMES.limit_start, start)
+        self._set_parameter(PARAMETER_NAMES.limit_stop, stop)
+        self._changed()
 
     def add_select_related(self, fields):
         """
@@ -76,45 +266,99 @@ class Query(object):
         self.select_related = field_dict
         self.related_select_cols = []
         self.related_select_fields = []
+        self._set_parameter(PARAMETER_NAMES.expand, ','.join(sorted(fields)))
+        self._changed()
+
+    def set_select_related(self):
+        """
+        Selects related objects of non-null foreign keys, like
+        ``select_related()`` without fields does.
+        """
+        self.select_related = True
+        fields = self.model and [field.name for field in self.model._meta.fields
+                                 if field.rel and not field.null] or []
+        self._set_parameter(PARAMETER_NAMES.expand, ','.join(fields))
+        self._changed()
+
+    def set_deferred(self, fields):
+        self.deferred = tuple(fields)
+        self._set_parameter(PARAMETER_NAMES.defer, ','.join(self.deferred))
+        self._changed()
+
+    def set_count(self, estimate=False):
+        """
+        Requests the number of matching rows along with the rows.
+        """
+        self._set_parameter(PARAMETER_NAMES.count, estimate and 'estimate' or 'exact')
+        self._changed()
 
     @property
     def parameters(self):
         """
-        Returns useful parameters as a dictionary.
+        Returns useful parameters as a dictionary, which must not be
+        mutated since it is shared until the query changes.
         """
-        parameters = {}
-
-        # Filtering
-        for k, v in self.filters.iteritems():
-            key = '%s%s' % (ROA_ARGS_NAMES_MAPPING.get('FILTER_', 'filter_'), k)
-            if key in ROA_ARGS_NAMES_MAPPING:
-                parameters[ROA_ARGS_NAMES_MAPPING[key]] = v
-            else:
-                parameters[key] = v
-        for k, v in self.excludes.iteritems():
-            key = '%s%s' % (ROA_ARGS_NAMES_MAPPING.get('EXCLUDE_', 'exclude_'), k)
-            if key in ROA_ARGS_NAMES_MAPPING:
-                parameters[ROA_ARGS_NAMES_MAPPING[key]] = v
-            else:
-                parameters[key] = v
-
-        # Ordering
-        if self.order_by:
-            order_by = ','.join(self.order_by)
-            parameters[ROA_ARGS_NAMES_MAPPING.get('ORDER_BY', 'order_by')] = order_by
-
-        # Slicing
-        if self.limit_start:
-            parameters[ROA_ARGS_NAMES_MAPPING.get('LIMIT_START', 'limit_start')] = self.limit_start
-        if self.limit_stop:
-            parameters[ROA_ARGS_NAMES_MAPPING.get('LIMIT_STOP', 'limit_stop')] = self.limit_stop
-
-        # Format
-        parameters[ROA_ARGS_NAMES_MAPPING.get('FORMAT', 'format')] = ROA_FORMAT
+        if self._parameters is None:
+            parameters = self.condition_parameters.copy()
+            parameters.update(self.dynamic_parameters)
+            if self.local_conditions:
+                # Rows are sliced once filtered locally.
+                parameters.pop(PARAMETER_NAMES.limit_start, None)
+                parameters.pop(PARAMETER_NAMES.limit_stop, None)
+            parameters.update(static_parameters())
+            self._parameters = parameters
+        return self._parameters
+
+    def aggregate_parameters(self, aggregates, group_by=None):
+        """
+        Returns parameters of a request to the aggregate URL, ordering and
+        limits only apply to groups.
+        """
+        parameters = self.parameters.copy()
+        if not group_by:
+            for name in (PARAMETER_NAMES.order_by, PARAMETER_NAMES.limit_start,
+                         PARAMETER_NAMES.limit_stop):
+                parameters.pop(name, None)
+        parameters.update(encode_aggregates(aggregates, group_by, PARAMETER_NAMES))
+        return parameters
 
-        parameters.update(getattr(settings, 'ROA_CUSTOM_ARGS', {}))
+    def keyset_parameters(self, after=None, index=None):
+        """
+        Returns parameters of a page of a keyset iteration: the key as
+        ordering and the page size, capped at the stop of the slice, as
+        limit. The first page (``index`` None) starts after
+        ``keyset_after`` and the start of the slice is sent as its
+        offset, next ones start ``after`` the given key, ``index`` rows
+        into the slice. Rows filtered locally are sliced once fetched.
+        """
+        key, attname, page_size = self.keyset
+        parameters = self.parameters.copy()
+        parameters.pop(PARAMETER_NAMES.limit_start, None)
+        parameters[PARAMETER_NAMES.order_by] = key
+        offset = 0
+        if index is None:
+            after, index = self.keyset_after, 0
+            if self.limit_start and not self.local_conditions:
+                offset = index = self.limit_start
+                parameters[PARAMETER_NAMES.limit_start] = offset
+        size = page_size
+        if self.limit_stop is not None and not self.local_conditions:
+            size = min(size, self.limit_stop - index)
+        parameters[PARAMETER_NAMES.limit_stop] = offset + size
+        if after is not None:
+            parameters[PARAMETER_NAMES.after] = after
         return parameters
 
+    @property
+    def query_string(self):
+        """
+        Returns parameters encoded as a query string, it identifies the
+        query for a given resource URL and can be used as a cache key.
+        """
+        if self._query_string is None:
+            self._query_string = encode_parameters(self.parameters)
+        return self._query_string
+
     ##########################################
     # Fake methods required by admin options #
     ##########################################
@@ -146,7 +390,7 @@ class RemoteQuerySet(query.QuerySet):
     """
     def __init__(self, model=None, query=None):
         self.model = model
-        self.query = query or Query()
+        self.query = query or Query(model)
         self._result_cache = None
         self._iter = None
         self._sticky_filter = False
@@ -156,6 +400,7 @@ class RemoteQuerySet(query.QuerySet):
         self.params = {}
 
         self._prefetch_related_lookups = False
+        self.remote_count = None
 
     ########################
     # PYTHON MAGIC METHODS #
@@ -179,33 +424,115 @@ class RemoteQuerySet(query.QuerySet):
         An iterator over the results from applying this QuerySet to the
         remote web service.
         """
-        resource = Resource(self.model.get_resource_url_list(),
-                            filters=ROA_FILTERS)
+        if self.query.keyset is not None:
+            objects = self._keyset_iterator()
+        else:
+            objects = self._fetch(self.model.get_resource_url_list(),
+                                  self.query.parameters)[0]
+        for obj in objects:
+            yield obj
+
+    def _fetch(self, url, parameters, sliced=True):
+        """
+        Requests a list of rows, returns instances kept once filtered
+        locally (and sliced if asked), all fetched instances and the
+        pagination envelope of the response, if any.
+        """
+        resource = ROAResource(url, model=self.model, timeouts=self.query.timeouts,
+                               filters=ROA_FILTERS)
         try:
-            parameters = self.query.parameters
-            logger.debug(u"""Requesting: "%s" through %s
-                          with parameters "%s" """ % (
-                          self.model.__name__,
-                          resource.uri,
-                          force_unicode(parameters)))
+            log_request(u'Requesting', self.model.__name__, resource.uri,
+                        parameters)
             response = resource.get(headers=ROA_HEADERS, **parameters)
         except ResourceNotFound:
-            return
+            return [], [], None
+        except ROAException:
+            raise
         except Exception as e:
             raise ROAException(e)
 
-        response = force_unicode(response.body_string()).encode(DEFAULT_CHARSET)
-
-        stream = StringIO(response)
-        data = self.model.get_parser().parse(stream)
-
-        serializer = self.model.get_serializer(data=data)
-        if not serializer.is_valid():
-            raise ROAException('Invalid deserialization')
+        with resource.call as call:
+            stream = response_stream(response, call)
+            with call.measure('parse'):
+                data = self.model.get_parser().parse(stream)
+
+            page = None
+            if isinstance(data, dict) and PARAMETER_NAMES.results in data:
+                page, data = data, data[PARAMETER_NAMES.results]
+            if PARAMETER_NAMES.count in parameters:
+                count = page and page.get(PARAMETER_NAMES.count)
+                if count is None:
+                    count = response.headers.get(ROA_COUNT_HEADER)
+                if count is not None and not self.query.local_conditions:
+                    self.remote_count = int(count)
+
+            if isinstance(data, dict):
+                data = [data]
+            with call.measure('instantiate'):
+                objects = instantiate(self.model, data)
+
+            fetched = objects
+            call.deferred_field = self.query.deferred_load
+            if self.query.deferred and len(objects) > 1:
+                attach_group(objects)
+            local_filter = self.query.local_filter
+            if local_filter is not None:
+                objects = self._filter_locally(objects, local_filter, call, sliced)
+
+        return objects, fetched, page
+
+    def _keyset_iterator(self):
+        """
+        Iterates over pages of rows ordered by a unique key, each page
+        being requested after the last key of the previous one (or by
+        following the next link or cursor returned by the service), so
+        that the service only scans rows at an offset for the start of a
+        slice, on the first page. Pages stop at the end of the slice.
+        """
+        attname, page_size = self.query.keyset[1:]
+        start, stop = self.query.limit_start or 0, self.query.limit_stop
+        url = self.model.get_resource_url_list()
+        parameters = self.query.keyset_parameters()
+        # Rows before the offset of the first page are skipped remotely.
+        index = parameters.get(PARAMETER_NAMES.limit_start, 0)
+        while True:
+            requested = parameters.get(PARAMETER_NAMES.limit_stop, page_size) \
+                        - parameters.get(PARAMETER_NAMES.limit_start, 0)
+            objects, fetched, page = self._fetch(url, parameters, sliced=False)
+            for obj in objects:
+                if index >= start:
+                    yield obj
+                index += 1
+                if stop is not None and index >= stop:
+                    return
+
+            page = page or {}
+            if page.get(PARAMETER_NAMES.next):
+                url, parameters = page[PARAMETER_NAMES.next], {}
+            elif page.get(PARAMETER_NAMES.cursor):
+                parameters = self.query.keyset_parameters(
+                    page[PARAMETER_NAMES.cursor], index)
+            elif not page and fetched and len(fetched) >= requested:
+                parameters = self.query.keyset_parameters(
+                    getattr(fetched[-1], attname), index)
+            else:
+                return
 
-        for obj in serializer.object:
-            obj = res.object
-            yield obj
+    def _filter_locally(self, objects, local_filter, call, sliced=True):
+        """
+        Evaluates conditions the remote service can't on fetched rows,
+        then slices them.
+        """
+        fetched = len(objects)
+        objects = [obj for obj in objects if local_filter(obj)]
+        if sliced:
+            objects = objects[self.query.limit_start or 0:self.query.limit_stop]
+        call.rows_fetched, call.rows_kept = fetched, len(objects)
+        if call.rows_kept < fetched:
+            logger.warning(u"%s: kept %s of %s rows fetched from %s, "
+                           u"unsupported lookups were filtered locally",
+                           self.model.__name__, call.rows_kept, fetched, call.url)
+        return objects
 
     def count(self):
         """
@@ -214,32 +541,71 @@ class RemoteQuerySet(query.QuerySet):
         The result is not cached nor comes from cache, cache must be handled
         by the server.
         """
+        if self.query.local_conditions:
+            # The remote count doesn't take local conditions into account.
+            return len(list(self._clone().iterator()))
+
         clone = self._clone()
 
-        # Instantiation of clone.model is necessary because we can't set
-        # a staticmethod for get_resource_url_count and avoid to set it
-        # for all model without relying on get_resource_url_list
-        instance = clone.model()
-        resource = Resource(instance.get_resource_url_count(),
-                            filters=ROA_FILTERS)
+        resource = ROAResource(clone.model._roa_urls.count(),
+                               model=clone.model, timeouts=clone.query.timeouts,
+                               filters=ROA_FILTERS)
         try:
             parameters = clone.query.parameters
-            logger.debug(u"""Counting  : "%s" through %s
-                          with parameters "%s" """ % (
-                clone.model.__name__,
-                resource.uri,
-                force_unicode(parameters)))
+            log_request(u'Counting', clone.model.__name__, resource.uri,
+                        parameters)
             response = resource.get(headers=ROA_HEADERS, **parameters)
+        except ROAException:
+            raise
         except Exception as e:
             raise ROAException(e)
 
         cnt = 0
-        try:
-            cnt = int(response.body_string())
-        except ValueError: pass
+        with resource.call as call:
+            try:
+                cnt = int(response_body(response, call))
+            except ValueError: pass
 
         return cnt
 
+    def aggregate(self, *args, **kwargs):
+        """
+        Returns a dictionary containing the calculations (aggregation)
+        over the current queryset, computed by the remote service.
+
+        If args is present the expression is passed as a kwarg using
+        the Aggregate object's default alias.
+        """
+        for arg in args:
+            kwargs[arg.default_alias] = arg
+        if self.query.local_conditions:
+            return aggregate_locally(self.model, list(self.iterator()), kwargs)
+        return self._aggregate(kwargs)
+
+    def _aggregate(self, aggregates, group_by=None):
+        """
+        Requests aggregates to the get_resource_url_aggregate URL.
+        """
+        clone = self._clone()
+
+        resource = ROAResource(clone.model._roa_urls.aggregate(),
+                               model=clone.model, timeouts=clone.query.timeouts,
+                               filters=ROA_FILTERS)
+        try:
+            parameters = clone.query.aggregate_parameters(aggregates, group_by)
+            log_request(u'Aggregating', clone.model.__name__, resource.uri,
+                        parameters)
+            response = resource.get(headers=ROA_HEADERS, **parameters)
+        except ROAException:
+            raise
+        except Exception as e:
+            raise ROAException(e)
+
+        with resource.call as call:
+            stream = response_stream(response, call)
+            with call.measure('parse'):
+                return json.load(stream)
+
     def _get_from_id_or_pk(self, id=None, pk=None, **kwargs):
         """
         Returns an object given an id or pk, request directly with the
@@ -248,41 +614,34 @@ class RemoteQuerySet(query.QuerySet):
         """
         clone = self._clone()
 
-        # Instantiation of clone.model is necessary because we can't set
-        # a staticmethod for get_resource_url_detail and avoid to set it
-        # for all model without relying on get_resource_url_list
-        instance = clone.model()
         if pk is None:
-            instance.id = id
-        else:
-            instance.pk = pk
-
-        resource = Resource(instance.get_resource_url_detail(),
-                            filters=ROA_FILTERS,
-                            **kwargs)
+            pk = id
+        resource = ROAResource(clone.model._roa_urls.detail(pk=pk),
+                               model=clone.model, timeouts=clone.query.timeouts,
+                               filters=ROA_FILTERS, **kwargs)
         try:
             parameters = clone.query.parameters
-            logger.debug(u"""Retrieving : "%s" through %s
-                          with parameters "%s" """ % (
-                clone.model.__name__,
-                resource.uri,
-                force_unicode(parameters)))
+            log_request(u'Retrieving', clone.model.__name__, resource.uri,
+                        parameters)
             response = resource.get(headers=ROA_HEADERS, **parameters)
+        except ROAException:
+            raise
         except Exception as e:
             raise ROAException(e)
 
-        response = force_unicode(response.body_string()).encode(DEFAULT_CHARSET)
+        with resource.call as call:
+            response = force_unicode(response_body(response, call)).encode(DEFAULT_CHARSET)
 
-        for local_name, remote_name in ROA_MODEL_NAME_MAPPING:
-            response = response.replace(remote_name, local_name)
+            for local_name, remote_name in ROA_MODEL_NAME_MAPPING:
+                response = response.replace(remote_name, local_name)
 
-        parser = self.model.get_parser()
-        parsed_data = parser.parse(StringIO(response))
-        serializer = self.model.get_serializer(data=parsed_data)
-        if not serializer.is_valid():
-            raise ROAException("Couldn't validate the data ({})" % response)
+            parser = self.model.get_parser()
+            with call.measure('parse'):
+                parsed_data = single_row(parser.parse(StringIO(response)))
+            with call.measure('instantiate'):
+                obj = instantiate(self.model, parsed_data, response)
 
-        return serializer.object
+        return obj
 
     def get(self, *args, **kwargs):
         """
@@ -323,8 +682,9 @@ class RemoteQuerySet(query.QuerySet):
         latest_by = field_name or self.model._meta.get_latest_by
         assert bool(latest_by), "latest() requires either a field_name parameter or 'get_latest_by' in the model"
 
-        self.query.order_by.append('-%s' % latest_by)
-        return self.iterator().next()
+        obj = self._clone()
+        obj.query.add_ordering('-%s' % latest_by)
+        return obj.iterator().next()
 
     def delete(self):
         """
@@ -384,7 +744,9 @@ class RemoteQuerySet(query.QuerySet):
         This exists to support framework features such as 'limit_choices_to',
         and usually it will be more natural to use other methods.
         """
-        if isinstance(filter_obj, Q) or hasattr(filter_obj, 'add_to_query'):
+        if isinstance(filter_obj, Q):
+            return self.filter(filter_obj)
+        if hasattr(filter_obj, 'add_to_query'):
             raise ROAException('Not implemented yet')
         return self.filter(**filter_obj)
 
@@ -405,11 +767,80 @@ class RemoteQuerySet(query.QuerySet):
                 raise TypeError('Cannot pass both "depth" and fields to select_related()')
             obj.query.add_select_related(fields)
         else:
-            obj.query.select_related = True
+            obj.query.set_select_related()
         if depth:
             obj.query.max_depth = depth
         return obj
 
+    def defer(self, *fields):
+        """
+        Returns a new QuerySet whose rows may lack the given fields, which
+        are loaded on first access. Only fields of the ``deferred_fields``
+        Meta option can be deferred, they are by default.
+
+        ``defer(None)`` requests all fields.
+        """
+        clone = self._clone()
+        if fields == (None,):
+            clone.query.set_deferred(())
+            return clone
+        for field in fields:
+            if field not in self.model._meta.deferred_fields:
+                raise ROAException("%s isn't declared in deferred_fields of %s."
+                                   % (field, self.model.__name__))
+        clone.query.set_deferred(clone.query.deferred + tuple(
+            field for field in fields if field not in clone.query.deferred))
+        return clone
+
+    def timeout(self, connect=None, read=None):
+        """
+        Returns a QuerySet whose remote calls give up connecting after
+        ``connect`` seconds and reading a response after ``read`` seconds,
+        the ``timeouts`` Meta option or settings applying otherwise.
+        """
+        clone = self._clone()
+        clone.query.timeouts = (connect, read)
+        return clone
+
+    def with_count(self, estimate=False):
+        """
+        Returns a QuerySet also requesting the number of rows matching its
+        filters, whatever its slice. Once evaluated, this number is
+        available as ``remote_count`` if the service returned it in a
+        ``{"results": [...], "count": <n>}`` envelope or in the
+        ``ROA_COUNT_HEADER`` header, None otherwise. ``estimate`` allows
+        the service to return an approximation.
+        """
+        clone = self._clone()
+        clone.query.set_count(estimate)
+        return clone
+
+    def keyset(self, key='pk', page_size=ROA_KEYSET_PAGE_SIZE, after=None):
+        """
+        Returns a QuerySet iterated over by pages ordered by a unique key,
+        each one requested with an ``after=<last key>`` parameter instead
+        of an offset. ``after`` starts the iteration after a known key,
+        the service is expected to interpret it in the order of the key
+        (descending if prefixed with ``-``).
+        """
+        opts = self.model._meta
+        name = key.lstrip('-')
+        field = name == 'pk' and opts.pk or opts.get_field(name)
+        if not field.unique:
+            raise ROAException("Keyset pagination requires a unique key, %s is not." % name)
+        if self.query.order_by and self.query.order_by != [key]:
+            raise ROAException("Keyset pagination requires ordering by %s only." % key)
+        clone = self._clone()
+        clone.query.keyset = (key.replace(name, field.name), field.attname, page_size)
+        clone.query.keyset_after = after
+        return clone
+
+    def values(self, *fields):
+        return self._clone(klass=RemoteValuesQuerySet, _fields=fields)
+
+    def annotate(self, *args, **kwargs):
+        raise ROANotImplementedYetException('annotate is only supported after values().')
+
     def order_by(self, *field_names):
         """
         Returns a QuerySet instance with the ordering changed.
@@ -418,39 +849,15 @@ class RemoteQuerySet(query.QuerySet):
                 "Cannot reorder a query once a slice has been taken."
 
         clone = self._clone()
-        for field_name in field_names:
-            clone.query.order_by.append(field_name)
+        clone.query.add_ordering(*field_names)
         return clone
 
     def extra(self, select=None, where=None, params=None, tables=None,
               order_by=None, select_params=None):
         """
-        Only to handle the case of the "cute trick" used in ModelForms (and
-        per extension admin) for unique and date constraints.
-
-        Example: ``.extra(select={'a': 1}).values('a').order_by()``.
-
-        http://code.djangoproject.com/browser/django/trunk/django/forms/models.py#L322
-        is an interesting documentation for details.
+        Unique and date constraints of ModelForms are checked by
+        ``ROAModel.validate_unique``, there is no remote equivalent.
         """
-        assert self.query.can_filter(), \
-                "Cannot change a query once a slice has been taken"
-        if select == {'a': 1}:
-            # Totally hackish but we need a fake object to deal with
-            # successive calls to values and order_by based on a count
-            # which is the less expensive action for our implementation.
-            class FakeInt(object):
-                def __init__(self, count):
-                    self.count = count
-
-                def values(self, *fields):
-                    if fields == ('a',): # double check that it's our case
-                        return self
-
-                def order_by(self):
-                    return self.count
-
-            return FakeInt(self.count())
         raise ROANotImplementedYetException('extra is not yet fully implemented.')
 
     ###################
@@ -476,3 +883,43 @@ class RemoteQuerySet(query.QuerySet):
         as (u'url', {'arg_key': 'arg_value'}).
         """
         return self.model.get_resource_url_list(), self.query.parameters
+
+
+class RemoteValuesQuerySet(RemoteQuerySet):
+    """
+    QuerySet returning dictionaries of field values, once annotated rows
+    are grouped by these fields and aggregated by the remote service.
+    """
+    _fields = ()
+
+    def iterator(self):
+        fields = self._fields or [f.attname for f in self.model._meta.fields]
+        annotations = self.query.annotations
+        if annotations:
+            if self.query.local_conditions:
+                objects = list(super(RemoteValuesQuerySet, self).iterator())
+                rows = aggregate_locally(self.model, objects, annotations, fields)
+            else:
+                rows = self._aggregate(annotations, fields)
+            for row in rows:
+                yield row
+            return
+
+        getters = [(name, value_getter(self.model, name)) for name in fields]
+        for obj in super(RemoteValuesQuerySet, self).iterator():
+            yield dict((name, get(obj)) for name, get in getters)
+
+    def annotate(self, *args, **kwargs):
+        """
+        Returns a QuerySet grouped by the fields given to values() with
+        the aggregates added to each group.
+        """
+        for arg in args:
+            kwargs[arg.default_alias] = arg
+        clone = self._clone()
+        clone.query.annotations.update(kwargs)
+        return clone
+
+    def _clone(self, klass=None, setup=False, **kwargs):
+        kwargs.setdefault('_fields', self._fields)
+        return super(RemoteValuesQuerySet, self)._clone(klass, setup, **kwargs)
@@ -0,0 +1,105 @@
+import os
+import threading
+import traceback
+
+from django.conf import settings
+
+from django_roa.db.signals import roa_request_finished
+
+ROA_QUERY_LOG_STACK_DEPTH = getattr(settings, 'ROA_QUERY_LOG_STACK_DEPTH', 3)
+ROA_N_PLUS_ONE_THRESHOLD = getattr(settings, 'ROA_N_PLUS_ONE_THRESHOLD', 3)
+
+# Frames coming from these packages are hidden from call-site summaries.
+IGNORED_PATHS = tuple(os.path.dirname(__import__(name).__file__) + os.sep
+                      for name in ('django', 'django_roa', 'restkit'))
+
+
+class RemoteQueryLog(threading.local):
+    """
+    Thread-local log of the remote calls done while it is active, the
+    counterpart of ``connection.queries`` for ROA models.
+
+    Starts and stops can be nested (middleware and debug toolbar panel),
+    the log is shared until the outermost one stops.
+    """
+    entries = None
+    depth = 0
+
+    def start(self):
+        roa_request_finished.connect(record, dispatch_uid='django_roa_query_log')
+        if self.entries is None:
+            self.entries = []
+        self.depth += 1
+        return self.entries
+
+    def stop(self):
+        entries = self.entries
+        self.depth = max(self.depth - 1, 0)
+        if not self.depth:
+            self.entries = None
+        return entries or []
+
+    @property
+    def active(self):
+        return self.entries is not None
+
+
+query_log = RemoteQueryLog()
+
+
+def call_site():
+    """
+    Returns a summary of the innermost frames outside of Django, restkit
+    and django-roa as a tuple of ``"file:line in function"`` strings.
+    """
+    frames = [frame for frame in traceback.extract_stack()[:-1]
+              if not frame[0].startswith(IGNORED_PATHS)]
+    return tuple(u"%s:%s in %s" % frame[:3]
+                 for frame in frames[-ROA_QUERY_LOG_STACK_DEPTH:])
+
+
+def record(sender, call, **kwargs):
+    """
+    Receiver of ``roa_request_finished`` appending the call to the log of
+    the current thread, if any.
+    """
+    entries = query_log.entries
+    if entries is None:
+        return
+    parameters = call.parameters or {}
+    entries.append({
+        'model': call.model and call.model._meta.object_name or None,
+        'verb': call.verb,
+        'url': call.url,
+        'parameters': parameters,
+        'status': call.status,
+        'duration': call.duration,
+        'bytes': call.bytes,
+        'stack': call_site(),
+        'key': (call.verb, call.url, tuple(sorted(parameters.items()))),
+    })
+
+
+def analyze(entries):
+    """
+    Flags duplicated requests and N+1 patterns in a list of entries.
+
+    An entry is a duplicate if the same verb, URL and parameters were
+    already requested. Requests of the same model done from the same call
+    site on at least ``ROA_N_PLUS_ONE_THRESHOLD`` distinct URLs or
+    parameters are flagged as N+1. Returns the counts of both.
+    """
+    seen = set()
+    groups = {}
+    for entry in entries:
+        entry['duplicate'] = entry['key'] in seen
+        seen.add(entry['key'])
+        group = (entry['model'], entry['verb'], entry['stack'])
+        groups.setdefault(group, set()).add(entry['key'])
+    duplicates = n_plus_one = 0
+    for entry in entries:
+        group = (entry['model'], entry['verb'], entry['stack'])
+        entry['n_plus_one'] = len(groups[group]) >= ROA_N_PLUS_ONE_THRESHOLD
+        duplicates += entry['duplicate']
+        n_plus_one += entry['n_plus_one']
+    return duplicates, n_plus_one
@@ -0,0 +1,16 @@
+from django.dispatch import Signal
+
+# Sent before every remote call, the sender is the model (or None).
+roa_request_started = Signal(providing_args=["call", "model", "verb", "url"])
+
+# Sent once a remote call has been fully handled (response read, parsed and
+# instances built) or has failed, the sender is the model (or None).
+# ``timings`` is a dictionary of seconds spent in the connect, wait,
+# transfer, parse and instantiate phases.
+roa_request_finished = Signal(providing_args=["call", "model", "verb", "url",
+                                              "status", "bytes", "timings",
+                                              "duration", "error"])
+
+# Sent when the circuit breaker of a host or resource changes state, the
+# sender is the ``Circuit``. States are "closed", "open" and "half-open".
+roa_circuit_changed = Signal(providing_args=["circuit", "state", "previous"])
@@ -0,0 +1,180 @@
+"""
+Storage of file and image fields of remote models as blobs of a remote
+service, streamed in both directions instead of being read in memory.
+
+Files are stored under ``ROA_STORAGE_URL``: a ``PUT`` of the raw content
+to ``<ROA_STORAGE_URL><name>`` stores a file, with its ``Content-Length``
+when known, chunked otherwise, and the service may respond with a JSON
+object whose ``name`` is the name it actually stored the file under. A
+``GET`` reads it back, ``HEAD`` tells whether it exists and its size and
+``DELETE`` removes it. Public URLs are built from ``ROA_STORAGE_BASE_URL``,
+``ROA_STORAGE_URL`` by default.
+
+Use it for a field with ``storage=RemoteStorage()`` or for every field with
+``DEFAULT_FILE_STORAGE = 'django_roa.db.storage.RemoteStorage'``.
+"""
+import json
+import mimetypes
+import urlparse
+
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import Storage
+from django.utils.encoding import filepath_to_uri
+
+from restkit import ResourceError, ResourceNotFound
+
+from django_roa.db.exceptions import ROAException
+from django_roa.db.transport import ROAResource, response_body, \
+    response_stream, CHUNK_SIZE
+
+ROA_STORAGE_URL = getattr(settings, 'ROA_STORAGE_URL', None)
+ROA_STORAGE_BASE_URL = getattr(settings, 'ROA_STORAGE_BASE_URL', None)
+ROA_HEADERS = getattr(settings, 'ROA_HEADERS', {})
+ROA_FILTERS = getattr(settings, 'ROA_FILTERS', {})
+ROA_CUSTOM_ARGS = getattr(settings, 'ROA_CUSTOM_ARGS', {})
+
+
+class UploadStream(object):
+    """
+    File-like body of an upload, read by restkit ``CHUNK_SIZE`` bytes at a
+    time (iterators would be turned into a list before being sent).
+    """
+    def __init__(self, content):
+        self.content = content
+        self.seek(0)
+
+    def read(self, size=CHUNK_SIZE):
+        return self.content.read(size)
+
+    def seek(self, offset):
+        # Lets restkit rewind the body when it retries a request.
+        if hasattr(self.content, 'seek'):
+            self.content.seek(offset)
+
+
+class RemoteFile(File):
+    """
+    File reading the body of a response as it comes, closing it finishes
+    the remote call.
+    """
+    def __init__(self, response, name, call):
+        self.call = call
+        super(RemoteFile, self).__init__(response_stream(response, call), name)
+        length = response.headers.get('Content-Length')
+        if length is not None \
+           and not response.headers.get('Content-Encoding', '').strip():
+            self._size = int(length)
+
+    def chunks(self, chunk_size=None):
+        chunk_size = chunk_size or self.DEFAULT_CHUNK_SIZE
+        while True:
+            data = self.file.read(chunk_size)
+            if not data:
+                break
+            yield data
+
+    def close(self):
+        try:
+            self.file.close()
+        finally:
+            self.call.finish()
+
+
+class RemoteStorage(Storage):
+    """
+    Storage of files on the remote service at ``location``.
+    """
+    def __init__(self, location=None, base_url=None):
+        self.location = location or ROA_STORAGE_URL
+        if not self.location:
+            raise ROAException("RemoteStorage requires ROA_STORAGE_URL to be set.")
+        self.base_url = base_url or ROA_STORAGE_BASE_URL or self.location
+
+    def resource(self, name):
+        return ROAResource(urlparse.urljoin(self.location, filepath_to_uri(name)),
+                           filters=ROA_FILTERS)
+
+    def request(self, method, name, **kwargs):
+        """
+        Returns the resource of the file and the response of the request,
+        error statuses other than a missing file raise a ``ROAException``.
+        """
+        resource = self.resource(name)
+        try:
+            response = resource.request(method, params_dict=ROA_CUSTOM_ARGS,
+                                        **kwargs)
+        except ResourceNotFound:
+            raise
+        except ResourceError as e:
+            raise ROAException(e)
+        return resource, response
+
+    def _open(self, name, mode='rb'):
+        if 'w' in mode or 'a' in mode or '+' in mode:
+            raise IOError("Remote files are read only, save them instead.")
+        try:
+            resource, response = self.request('GET', name)
+        except ResourceNotFound:
+            raise IOError("No such remote file: %r" % name)
+        return RemoteFile(response, name, resource.call)
+
+    def _save(self, name, content):
+        headers = dict(ROA_HEADERS)
+        headers['Content-Type'] = mimetypes.guess_type(name)[0] \
+                                  or 'application/octet-stream'
+        try:
+            size = content.size
+        except (AttributeError, OSError):
+            size = None
+        if size is None:
+            headers['Transfer-Encoding'] = 'chunked'
+        else:
+            headers['Content-Length'] = str(size)
+        try:
+            resource, response = self.request('PUT', name, headers=headers,
+                                               payload=UploadStream(content))
+        except ResourceNotFound as e:
+            raise ROAException(e)
+        with resource.call as call:
+            body = response_body(response, call)
+        try:
+            return json.loads(body)['name']
+        except (ValueError, TypeError, KeyError):
+            return name
+
+    def get_available_name(self, name):
+        # The service renames files on conflicts, see ``_save``.
+        return name
+
+    def head(self, name):
+        """
+        Returns the headers of the file or None if it does not exist.
+        """
+        try:
+            resource, response = self.request('HEAD', name)
+        except ResourceNotFound:
+            return None
+        with resource.call as call:
+            response_body(response, call)
+        return response.headers
+
+    def exists(self, name):
+        return self.head(name) is not None
+
+    def size(self, name):
+        headers = self.head(name)
+        if headers is None:
+            raise OSError("No such remote file: %r" % name)
+        return int(headers.get('Content-Length', 0))
+
+    def delete(self, name):
+        try:
+            resource, response = self.request('DELETE', name)
+        except ResourceNotFound:
+            return
+        with resource.call as call:
+            response_body(response, call)
+
+    def url(self, name):
+        return urlparse.urljoin(self.base_url, filepath_to_uri(name))
@@ -0,0 +1,213 @@
+"""
+Connect and read timeouts of remote calls and request-scoped deadlines.
+
+Timeouts are ``(connect, read)`` seconds, ``None`` meaning no limit. They
+are taken from ``RemoteQuerySet.timeout()`` for a single query, else from
+the ``timeouts`` Meta option of the model, else from ``ROA_CONNECT_TIMEOUT``
+and ``ROA_READ_TIMEOUT``. The read timeout bounds each read from the
+socket, not the whole transfer.
+
+A deadline set by ``deadline(seconds)`` (or by ``RemoteDeadlineMiddleware``
+for each Django request, see ``ROA_REQUEST_BUDGET``) bounds every remote
+call made within it: calls are given at most the remaining budget as
+timeouts and fail with ``ROADeadlineExceeded`` without being sent once it
+is spent. The remaining budget is sent to the service in milliseconds in
+the ``ROA_DEADLINE_HEADER`` header if set.
+"""
+import socket
+import threading
+import time
+
+from django.conf import settings
+
+from restkit.client import Client
+from restkit.conn import Connection
+from restkit.errors import RequestError
+from socketpool import ConnectionPool
+
+from django_roa.db.exceptions import ROADeadlineExceeded
+from django_roa.db.metrics import ConnectionTiming
+
+ROA_CONNECT_TIMEOUT = getattr(settings, 'ROA_CONNECT_TIMEOUT', None)
+ROA_READ_TIMEOUT = getattr(settings, 'ROA_READ_TIMEOUT', None)
+ROA_REQUEST_BUDGET = getattr(settings, 'ROA_REQUEST_BUDGET', None)
+ROA_DEADLINE_HEADER = getattr(settings, 'ROA_DEADLINE_HEADER', None)
+
+_local = threading.local()
+_pools = {}
+_lock = threading.Lock()
+
+
+def normalize(timeouts):
+    """
+    Returns timeouts as a ``(connect, read)`` pair, a single number
+    applying to both.
+    """
+    if timeouts is None:
+        return (None, None)
+    if isinstance(timeouts, (int, long, float)):
+        return (timeouts, timeouts)
+    connect, read = timeouts
+    return (connect, read)
+
+
+def resolve(model=None, timeouts=None):
+    """
+    Returns the timeouts of a call, falling back to those of the model
+    then to settings for each of them.
+    """
+    connect, read = normalize(timeouts)
+    model_connect, model_read = normalize(
+        getattr(getattr(model, '_meta', None), 'timeouts', None))
+    if connect is None:
+        connect = ROA_CONNECT_TIMEOUT if model_connect is None else model_connect
+    if read is None:
+        read = ROA_READ_TIMEOUT if model_read is None else model_read
+    return (connect, read)
+
+
+class deadline(object):
+    """
+    Context manager bounding remote calls made within it to ``seconds``
+    from now, nested deadlines can only shorten the current one.
+    """
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __enter__(self):
+        self.previous = getattr(_local, 'deadline', None)
+        if self.seconds is not None:
+            expires = time.time() + self.seconds
+            if self.previous is None or expires < self.previous:
+                _local.deadline = expires
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _local.deadline = self.previous
+
+
+def remaining():
+    """
+    Returns the seconds left before the current deadline, None if there is
+    no deadline.
+    """
+    expires = getattr(_local, 'deadline', None)
+    if expires is None:
+        return None
+    return expires - time.time()
+
+
+def bounded(timeouts):
+    """
+    Returns timeouts shortened to the remaining budget and the budget,
+    raising ``ROADeadlineExceeded`` once it is spent.
+    """
+    budget = remaining()
+    if budget is None:
+        return timeouts, None
+    if budget <= 0:
+        raise ROADeadlineExceeded(u"Deadline exceeded %.3fs ago." % -budget)
+    return tuple(timeout is None and budget or min(timeout, budget)
+                 for timeout in timeouts), budget
+
+
+def deadline_headers(budget):
+    if ROA_DEADLINE_HEADER and budget is not None:
+        return {ROA_DEADLINE_HEADER: str(int(budget * 1000))}
+    return {}
+
+
+class ConnectTimeoutBackend(object):
+    """
+    Socket backend whose sockets time out, so that the timeout also
+    applies to connecting them.
+    """
+    def __init__(self, backend_mod, timeout):
+        self.backend_mod = backend_mod
+        self.timeout = timeout
+
+    def Socket(self, *args, **kwargs):
+        sock = self.backend_mod.Socket(*args, **kwargs)
+        sock.settimeout(self.timeout)
+        return sock
+
+    def __getattr__(self, name):
+        return getattr(self.backend_mod, name)
+
+
+class TimeoutConnection(Connection):
+    """
+    Connection giving up connecting after the connect timeout of the
+    client creating it, or once the deadline of this client is reached.
+    """
+    def __init__(self, host, port, pool=None, is_ssl=False,
+                 extra_headers=[], backend_mod=None, **ssl_args):
+        timeout, expires = getattr(_local, 'connect', (None, None))
+        if expires is not None:
+            left = expires - time.time()
+            if left <= 0:
+                raise socket.timeout("Deadline exceeded while connecting.")
+            timeout = timeout is None and left or min(timeout, left)
+        super(TimeoutConnection, self).__init__(
+            host, port, pool=pool, is_ssl=is_ssl, extra_headers=extra_headers,
+            backend_mod=ConnectTimeoutBackend(backend_mod, timeout), **ssl_args)
+        self.backend_mod = backend_mod
+        # Until the client sets its read timeout.
+        self._s.settimeout(timeout)
+
+
+def get_pool(backend, **options):
+    with _lock:
+        pool = _pools.get(backend)
+        if pool is None:
+            pool = _pools[backend] = ConnectionPool(factory=TimeoutConnection,
+                                                    backend=backend, **options)
+        return pool
+
+
+class TimeoutClient(ConnectionTiming, Client):
+    """
+    Restkit client applying connect and read timeouts to its connections,
+    its pending request can be aborted (see ``django_roa.db.hedging``).
+    """
+    def __init__(self, connect_timeout=None, read_timeout=None,
+                 expires=None, **client_opts):
+        backend = client_opts.get('backend', 'thread')
+        client_opts.setdefault('pool', get_pool(backend,
+            retry_delay=client_opts.get('wait_tries', 0.3),
+            retry_max=client_opts.get('max_tries', 3)))
+        super(TimeoutClient, self).__init__(**client_opts)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.expires = expires
+        self.connection = None
+        self.aborted = False
+
+    def request(self, *args, **kwargs):
+        self.aborted = False
+        return super(TimeoutClient, self).request(*args, **kwargs)
+
+    def get_connection(self, request):
+        if self.aborted:
+            raise RequestError("Request aborted.")
+        _local.connect = (self.connect_timeout, self.expires)
+        try:
+            connection = super(TimeoutClient, self).get_connection(request)
+        finally:
+            _local.connect = (None, None)
+        connection.socket().settimeout(self.read_timeout)
+        self.connection = connection
+        return connection
+
+    def abort(self):
+        """
+        Makes the pending request fail from another thread, by shutting
+        its connection down, without retrying it.
+        """
+        self.aborted = True
+        connection = self.connection
+        if connection is not None:
+            try:
+                connection.socket().shutdown(socket.SHUT_RDWR)
+            except (socket.error, AttributeError):
+                pass
@@ -0,0 +1,273 @@
+import copy
+import time
+import zlib
+from StringIO import StringIO
+
+from django.conf import settings
+
+from restkit import Resource
+from restkit.client import Client
+from restkit.errors import ResourceError, RequestTimeout
+
+from django_roa.db import breaker, hedging, http2
+from django_roa.db import timeouts as timeouts_module
+from django_roa.db.cassettes import current_cassette, request_key, \
+    recorded_headers, CassetteResponse
+from django_roa.db.exceptions import ROACircuitOpen, ROATimeout
+from django_roa.db.metrics import ConnectionTiming, RemoteCall, TimedStream
+from django_roa.db.timeouts import TimeoutClient
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ROA_ACCEPT_ENCODING = getattr(settings, 'ROA_ACCEPT_ENCODING', 'gzip, deflate, br')
+ROA_COMPRESS_REQUESTS_ABOVE = getattr(settings, 'ROA_COMPRESS_REQUESTS_ABOVE', None)
+ROA_COMPRESSION_LEVEL = getattr(settings, 'ROA_COMPRESSION_LEVEL', 6)
+
+DEFAULT_CHARSET = getattr(settings, 'DEFAULT_CHARSET', 'utf-8')
+
+CHUNK_SIZE = 64 * 1024
+
+
+class TimedClient(ConnectionTiming, Client):
+    """
+    Restkit client accounting the time spent getting connections to the
+    call being sent.
+    """
+
+
+class ROAResource(Resource):
+    """
+    Resource used for every remote call, it negotiates compressed responses
+    (brotli only if the module is installed) and gzips request bodies
+    larger than ``ROA_COMPRESS_REQUESTS_ABOVE``.
+
+    Gzip and deflate responses are decompressed on the fly by restkit's
+    parser, brotli ones by ``response_stream``.
+
+    Each request is tracked by a ``RemoteCall`` available as ``self.call``,
+    the caller is responsible for finishing it once the response has been
+    handled.
+
+    Requests go through shared HTTP/2 connections if ``ROA_HTTP2`` is set,
+    unless they are bounded by timeouts, and through circuit breakers if
+    ``ROA_CIRCUIT_BREAKER`` is set. They are bounded by timeouts and by the
+    current deadline (see ``django_roa.db.timeouts``), GETs may be hedged
+    (see ``django_roa.db.hedging``).
+    """
+    def __init__(self, uri, model=None, timeouts=None, **client_opts):
+        self.model = model
+        self.call = None
+        self.timeouts = timeouts_module.resolve(model, timeouts)
+        super(ROAResource, self).__init__(uri, **client_opts)
+        self.client = self.make_client(*self.timeouts)
+
+    def make_client(self, connect_timeout=None, read_timeout=None, expires=None):
+        """
+        Returns a new client, applying timeouts to its connections.
+
+        Calls bounded by timeouts are sent over HTTP/1.1 even if
+        ``ROA_HTTP2`` is set, shared HTTP/2 connections can't be given
+        per call timeouts.
+        """
+        self.client_timeouts = (connect_timeout, read_timeout, expires)
+        if connect_timeout is None and read_timeout is None:
+            if http2.enabled():
+                return http2.HTTP2Client(**self.client_opts)
+            return TimedClient(**self.client_opts)
+        return TimeoutClient(connect_timeout, read_timeout, expires,
+                             **self.client_opts)
+
+    def request(self, method, path=None, payload=None, headers=None,
+                params_dict=None, **params):
+        headers = dict(headers or {})
+        parameters = dict(params, **(params_dict or {}))
+        cassette = current_cassette()
+        if cassette is not None:
+            key = request_key(method, self.uri + (path or u''), parameters,
+                              payload)
+        if ACCEPT_ENCODING:
+            headers.setdefault('Accept-Encoding', ACCEPT_ENCODING)
+        if payload is not None and ROA_COMPRESS_REQUESTS_ABOVE is not None:
+            payload = compress_payload(payload, headers)
+        call = self.call = RemoteCall(self.model, method, self.uri, parameters)
+        circuit = stale = None
+        if breaker.enabled() and (cassette is None or not cassette.replaying):
+            circuit = breaker.get_circuit(self)
+            if breaker.stale_enabled(method):
+                stale = breaker.stale_key(self.uri + (path or u''), parameters)
+        sent = False
+        start = time.time()
+        try:
+            # A spent deadline fails before taking a probe of the circuit.
+            timeouts, budget = timeouts_module.bounded(self.timeouts)
+            if circuit is not None and not circuit.allow():
+                call.short_circuited = True
+                raise ROACircuitOpen(u"Circuit of %s is open." % circuit.key)
+            if budget is not None:
+                self.client = self.make_client(*timeouts, expires=start + budget)
+                headers.update(timeouts_module.deadline_headers(budget))
+            kwargs = dict(path=path, payload=payload, headers=headers,
+                          params_dict=params_dict, **params)
+            sent = True
+            self.client.call = call
+            with call.measure('wait'):
+                if cassette is None:
+                    response = self.send(method, **kwargs)
+                elif cassette.replaying:
+                    response = cassette.play(key)
+                else:
+                    response = self.record(cassette, key, method, **kwargs)
+        except Exception as e:
+            error = isinstance(e, RequestTimeout) and ROATimeout(e) or e
+            if circuit is not None and sent:
+                circuit.record(breaker.failed(error), time.time() - start)
+            if stale is not None and (call.short_circuited or breaker.failed(error)):
+                response = breaker.stale_response(stale)
+                if response is not None:
+                    call.stale = True
+                    call.status = response.status_int
+                    return response
+            call.finish(status=getattr(error, 'status_int', None), error=error)
+            if error is e:
+                raise
+            raise error
+        if circuit is not None:
+            circuit.record(False, time.time() - start)
+        call.status = response.status_int
+        if stale is not None:
+            response = breaker.StaleRecordingResponse(response, stale)
+        return response
+
+    def send(self, method, **kwargs):
+        """
+        Performs the request, hedging it if it is a GET taking longer than
+        usual. Over HTTP/2, a request outrun by its hedge is not aborted
+        but waited for.
+        """
+        send = super(ROAResource, self).request
+        if not hedging.enabled(method):
+            return send(method, **kwargs)
+        delay = hedging.hedge_delay(self)
+        start = time.time()
+        if delay is None:
+            response = send(method, **kwargs)
+        else:
+            if type(self.client) is TimedClient:
+                # Aborted once the hedge answered.
+                self.client = TimeoutClient(**self.client_opts)
+                self.client.call = self.call
+            hedge = copy.copy(self)
+            hedge.client = self.make_client(*self.client_timeouts)
+            response, self.call.hedged = hedging.hedged(
+                lambda: send(method, **kwargs),
+                lambda: super(ROAResource, hedge).request(method, **kwargs),
+                delay, getattr(self.client, 'abort', None))
+        hedging.observe(self, time.time() - start)
+        return response
+
+    def record(self, cassette, key, method, **kwargs):
+        """
+        Performs the request and records it, including error responses,
+        into the cassette. The body is read and served from memory.
+        """
+        start = time.time()
+        try:
+            response = super(ROAResource, self).request(method, **kwargs)
+        except ResourceError as e:
+            if e.response is not None:
+                cassette.record(key, e.status_int, e.msg or '',
+                                recorded_headers(e.response.headers),
+                                time.time() - start)
+            raise
+        body = response.body_stream().read()
+        headers = recorded_headers(response.headers)
+        cassette.record(key, response.status_int, body, headers,
+                        time.time() - start)
+        return CassetteResponse(response.status_int, body, headers)
+
+
+def accept_encoding(encodings):
+    """
+    Returns the encodings of an Accept-Encoding header without ``br`` if
+    the brotli module is not installed, responses would not be readable.
+    """
+    if brotli is not None or not encodings:
+        return encodings
+    return ', '.join(encoding.strip() for encoding in encodings.split(',')
+                     if encoding.split(';')[0].strip().lower() != 'br')
+
+
+ACCEPT_ENCODING = accept_encoding(ROA_ACCEPT_ENCODING)
+
+
+def compress_payload(payload, headers):
+    """
+    Gzips a string payload if it is larger than the configured threshold,
+    updating headers accordingly. Compressed payloads are returned as files.
+    """
+    if not isinstance(payload, basestring) or 'Content-Encoding' in headers:
+        return payload
+    if isinstance(payload, unicode):
+        payload = payload.encode(DEFAULT_CHARSET)
+    if len(payload) < ROA_COMPRESS_REQUESTS_ABOVE:
+        return payload
+    compressor = zlib.compressobj(ROA_COMPRESSION_LEVEL, zlib.DEFLATED,
+                                  16 + zlib.MAX_WBITS)
+    headers['Content-Encoding'] = 'gzip'
+    # As a file, restkit does not join the binary body to headers, which
+    # are unicode if the URL is.
+    return StringIO(compressor.compress(payload) + compressor.flush())
+
+
+class BrotliStream(object):
+    """
+    File-like object decompressing a brotli body chunk by chunk.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self.decompressor = brotli.Decompressor()
+        self.buffer = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            chunk = self.stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            self.buffer += self.decompressor.process(chunk)
+        if size < 0:
+            data, self.buffer = self.buffer, ''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def close(self):
+        self.stream.close()
+
+
+def response_stream(response, call=None):
+    """
+    Returns a decompressed file-like object over the body of a response,
+    suitable to be fed to a parser without reading it in memory first.
+
+    Bytes read and transfer time are accounted to ``call`` if given.
+    """
+    stream = response.body_stream()
+    encoding = response.headers.get('Content-Encoding', '').strip().lower()
+    if encoding == 'br':
+        if brotli is None:
+            raise ValueError("Received a brotli encoded response but the "
+                             "brotli module is not installed.")
+        stream = BrotliStream(stream)
+    if call is not None:
+        stream = TimedStream(stream, call)
+    return stream
+
+
+def response_body(response, call=None):
+    """
+    Returns the decompressed body of a response as a string.
+    """
+    return response_stream(response, call).read()
@@ -0,0 +1,98 @@
+"""
+Batched validation of uniqueness constraints against the unique URL of a
+resource (``get_resource_url_unique``).
+
+Each constraint is a ``unique_<n>=<JSON>`` parameter holding the lookups
+of an existing row which would conflict, encoded like the ``where``
+parameter of filters, and ``exclude_pk=<pk>`` excludes the instance being
+edited. Names are configurable through ``ROA_ARGS_NAMES_MAPPING``
+(``UNIQUE_`` and ``EXCLUDE_`` keys).
+
+Whatever ``ROA_FORMAT`` is, the service responds with a JSON list of the
+names of constraints matching an existing row.
+"""
+import json
+
+from django.core.exceptions import NON_FIELD_ERRORS
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.query_utils import Q
+from django.utils.datastructures import SortedDict
+
+from django_roa.db.filters import encode_node, decode_node
+
+
+def unique_constraints(instance, unique_checks, date_checks):
+    """
+    Returns constraints to check as a list of ``(lookups, error key, error
+    message)`` from checks gathered by ``Model._get_unique_checks``,
+    skipping them when Django would (missing values, primary key of an
+    edited instance).
+    """
+    constraints = []
+    opts = instance._meta
+    for model_class, unique_check in unique_checks:
+        lookups = {}
+        for field_name in unique_check:
+            field = opts.get_field(field_name)
+            value = getattr(instance, field.attname)
+            if value is None or field.primary_key and not instance._state.adding:
+                continue
+            lookups[str(field_name)] = value
+        if len(lookups) != len(unique_check):
+            continue
+        key = len(unique_check) == 1 and unique_check[0] or NON_FIELD_ERRORS
+        constraints.append((lookups, key,
+                            instance.unique_error_message(model_class, unique_check)))
+
+    for model_class, lookup_type, field, unique_for in date_checks:
+        date = getattr(instance, unique_for)
+        if date is None:
+            continue
+        if lookup_type == 'date':
+            lookups = {'%s__day' % unique_for: date.day,
+                       '%s__month' % unique_for: date.month,
+                       '%s__year' % unique_for: date.year}
+        else:
+            lookups = {'%s__%s' % (unique_for, lookup_type): getattr(date, lookup_type)}
+        lookups[str(field)] = getattr(instance, field)
+        constraints.append((lookups, field,
+                            instance.date_error_message(lookup_type, field, unique_for)))
+    return constraints
+
+
+def encode_constraints(constraints, pk, names):
+    """
+    Returns parameters checking constraints in a single request, rows with
+    this primary key being ignored if given.
+    """
+    parameters = dict((names.unique(index),
+                       json.dumps(encode_node(Q(**lookups)), cls=DjangoJSONEncoder,
+                                  separators=(',', ':')))
+                      for index, (lookups, key, message) in enumerate(constraints))
+    if pk is not None:
+        parameters[names.exclude('pk')] = pk
+    return parameters
+
+
+def decode_constraints(parameters, names):
+    """
+    Returns constraints encoded in parameters by ``encode_constraints`` as
+    ``Q`` objects keyed by parameter name and the primary key to ignore.
+    """
+    constraints = SortedDict()
+    for key, value in sorted(parameters.items()):
+        if key.startswith(names.unique_prefix):
+            constraints[key] = decode_node(json.loads(value))
+    return constraints, parameters.get(names.exclude('pk'))
+
+
+def conflicting_errors(constraints, conflicts, names):
+    """
+    Returns validation errors of constraints the service reported as
+    conflicting, keyed like ``Model.validate_unique`` does.
+    """
+    errors = {}
+    for index, (lookups, key, message) in enumerate(constraints):
+        if names.unique(index) in conflicts:
+            errors.setdefault(key, []).append(message)
+    return errors
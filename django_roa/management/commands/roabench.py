@@ -0,0 +1,171 @@
+import time
+import random
+import pstats
+import cProfile
+import threading
+from StringIO import StringIO
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+SCENARIOS = ('list', 'get-by-pk', 'count', 'save', 'mixed')
+
+
+def percentile(values, fraction):
+    """
+    Returns the given percentile of a sorted list using nearest rank.
+    """
+    if not values:
+        return 0.0
+    index = min(int(round(fraction * len(values) + 0.5)) - 1, len(values) - 1)
+    return values[max(index, 0)]
+
+
+class Command(BaseCommand):
+    args = '<app_label.ModelName> <%s>' % '|'.join(SCENARIOS)
+    help = ("Load-tests the remote resource of a model from the client side "
+            "and reports throughput, latencies, bytes transferred and where "
+            "client CPU time goes. The save scenario re-saves an existing "
+            "instance, beware of write side effects on the remote service.")
+
+    option_list = BaseCommand.option_list + (
+        make_option('--concurrency', type='int', default=1,
+            help='Number of concurrent workers [1].'),
+        make_option('--duration', type='float', default=10.0,
+            help='Duration of the run in seconds [10].'),
+        make_option('--pk', default=None,
+            help='Primary key used by get-by-pk and save, defaults to the '
+                 'first one of the list.'),
+        make_option('--limit', type='int', default=None,
+            help='Slice list requests to this number of rows.'),
+        make_option('--profile', action='store_true', default=False,
+            help='Profile workers with cProfile and print hot functions.'),
+        make_option('--profile-lines', type='int', default=20,
+            help='Number of functions printed by --profile [20].'),
+    )
+
+    requires_model_validation = False
+
+    def handle(self, *args, **options):
+        from django.db.models import get_model
+        from django_roa.db.metrics import MetricsCollector, PHASES
+
+        if len(args) != 2:
+            raise CommandError("Usage: roabench %s" % self.args)
+        label, scenario = args
+        try:
+            app_label, model_name = label.split('.')
+        except ValueError:
+            raise CommandError("Model label must be app_label.ModelName.")
+        model = get_model(app_label, model_name)
+        if model is None or not hasattr(model.objects, 'is_roa_manager'):
+            raise CommandError("%s is not a ROA model." % label)
+        if scenario not in SCENARIOS:
+            raise CommandError("Scenario must be one of %s." % ', '.join(SCENARIOS))
+
+        operation = self.get_operation(model, scenario, options)
+        collector = MetricsCollector()
+        collector.connect()
+        try:
+            latencies, errors, profiles, elapsed = self.run(operation, options)
+        finally:
+            collector.disconnect()
+
+        latencies.sort()
+        stats = collector.snapshot()
+        requests = sum(value['requests'] for value in stats.values())
+        transferred = sum(value['bytes'] for value in stats.values())
+        phases = dict((phase, sum(value['histograms'][phase]['sum']
+                                  for value in stats.values()))
+                      for phase in PHASES)
+
+        write = self.stdout.write
+        write("%s %s: %s workers during %.1fs\n" % (
+            label, scenario, options['concurrency'], elapsed))
+        write("  operations:   %s (%s errors), %.1f/s\n" % (
+            len(latencies), errors, len(latencies) / elapsed))
+        write("  requests:     %s, %.1f/s\n" % (requests, requests / elapsed))
+        write("  transferred:  %s bytes, %.1f KiB/s\n" % (
+            transferred, transferred / 1024.0 / elapsed))
+        write("  latency (ms): p50=%.2f p90=%.2f p95=%.2f p99=%.2f max=%.2f\n" % tuple(
+            percentile(latencies, fraction) * 1000
+            for fraction in (0.5, 0.9, 0.95, 0.99, 1.0)))
+        total = sum(phases.values()) or 1.0
+        write("  time per phase (ms, share):\n")
+        for phase in PHASES:
+            write("    %-12s %10.1f %5.1f%%\n" % (phase, phases[phase],
+                                                100 * phases[phase] / total))
+
+        if profiles:
+            output = StringIO()
+            merged = pstats.Stats(profiles[0], stream=output)
+            for profile in profiles[1:]:
+                merged.add(profile)
+            merged.sort_stats('cumulative').print_stats(options['profile_lines'])
+            write("  client-side CPU profile:\n")
+            write(output.getvalue())
+
+    def get_operation(self, model, scenario, options):
+        """
+        Returns a callable doing one operation of the scenario.
+        """
+        queryset = model.objects.all()
+        if options['limit']:
+            queryset = queryset[:options['limit']]
+        operations = {
+            'list': lambda: list(queryset._clone()),
+            'count': lambda: model.objects.count(),
+        }
+        if scenario in ('get-by-pk', 'save', 'mixed'):
+            pk = options['pk']
+            if pk is None:
+                try:
+                    pk = model.objects.all()[:1][0].pk
+                except IndexError:
+                    raise CommandError("The remote resource is empty, use --pk.")
+            operations['get-by-pk'] = lambda: model.objects.get(pk=pk)
+            if scenario == 'save':
+                instance = model.objects.get(pk=pk)
+                operations['save'] = lambda: instance.save()
+        if scenario == 'mixed':
+            weighted = ['get-by-pk'] * 6 + ['list'] * 2 + ['count'] * 2
+            return lambda: operations[random.choice(weighted)]()
+        return operations[scenario]
+
+    def run(self, operation, options):
+        """
+        Runs the operation in concurrent workers until the deadline.
+        """
+        deadline = time.time() + options['duration']
+        latencies, profiles = [], []
+        errors = [0]
+        lock = threading.Lock()
+
+        def worker():
+            profile = options['profile'] and cProfile.Profile() or None
+            local_latencies, local_errors = [], 0
+            if profile is not None:
+                profile.enable()
+            while time.time() < deadline:
+                start = time.time()
+                try:
+                    operation()
+                except Exception:
+                    local_errors += 1
+                local_latencies.append(time.time() - start)
+            if profile is not None:
+                profile.disable()
+            with lock:
+                latencies.extend(local_latencies)
+                errors[0] += local_errors
+                if profile is not None:
+                    profiles.append(profile)
+
+        started = time.time()
+        workers = [threading.Thread(target=worker)
+                   for i in xrange(options['concurrency'])]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return latencies, errors[0], profiles, time.time() - started
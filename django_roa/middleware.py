@@ -0,0 +1,51 @@
+import logging
+
+from django_roa.db.querylog import query_log, analyze
+from django_roa.db.timeouts import deadline, ROA_REQUEST_BUDGET
+
+logger = logging.getLogger("django_roa")
+
+
+class RemoteQueryLogMiddleware(object):
+    """
+    Keeps a log of the remote calls done while handling each request,
+    available as ``request.roa_queries``. Duplicated requests and N+1
+    patterns are reported as warnings through the ``django_roa`` logger.
+    """
+    def process_request(self, request):
+        request.roa_queries = query_log.start()
+
+    def process_response(self, request, response):
+        entries = query_log.stop()
+        if entries:
+            duplicates, n_plus_one = analyze(entries)
+            if duplicates or n_plus_one:
+                logger.warning(u'%s remote calls for %s including %s '
+                               u'duplicates and %s N+1 requests',
+                               len(entries), request.path, duplicates,
+                               n_plus_one)
+        return response
+
+
+class RemoteDeadlineMiddleware(object):
+    """
+    Bounds the remote calls done while handling each request to
+    ``ROA_REQUEST_BUDGET`` seconds from its start, see
+    ``django_roa.db.timeouts``.
+    """
+    def process_request(self, request):
+        request.roa_deadline = deadline(ROA_REQUEST_BUDGET)
+        request.roa_deadline.__enter__()
+
+    def process_response(self, request, response):
+        self.leave(request)
+        return response
+
+    def process_exception(self, request, exception):
+        self.leave(request)
+
+    def leave(self, request):
+        current = getattr(request, 'roa_deadline', None)
+        if current is not None:
+            del request.roa_deadline
+            current.__exit__(None, None, None)
@@ -0,0 +1,43 @@
+from django.utils.translation import ugettext_lazy as _, ungettext
+
+from debug_toolbar.panels import Panel
+
+from django_roa.db.querylog import query_log, analyze
+
+
+class RemoteQueriesPanel(Panel):
+    """
+    Django Debug Toolbar panel listing the remote calls of the request,
+    duplicated requests and N+1 patterns being highlighted.
+    """
+    title = _('Remote queries')
+    nav_title = _('Remote queries')
+    template = 'django_roa/remote_queries_panel.html'
+
+    @property
+    def nav_subtitle(self):
+        stats = self.get_stats()
+        count = len(stats.get('queries', []))
+        return ungettext('%(count)d call in %(time).2fms',
+                         '%(count)d calls in %(time).2fms',
+                         count) % {'count': count,
+                                   'time': stats.get('total_time', 0)}
+
+    def enable_instrumentation(self):
+        self.entries = query_log.start()
+
+    def disable_instrumentation(self):
+        query_log.stop()
+
+    def process_response(self, request, response):
+        entries = list(getattr(self, 'entries', []))
+        duplicates, n_plus_one = analyze(entries)
+        for entry in entries:
+            entry['duration_ms'] = (entry['duration'] or 0) * 1000
+        self.record_stats({
+            'queries': entries,
+            'duplicates': duplicates,
+            'n_plus_one': n_plus_one,
+            'total_time': sum(entry['duration_ms'] for entry in entries),
+            'total_bytes': sum(entry['bytes'] for entry in entries),
+        })
@@ -1,34 +1,178 @@
+import json
+import urllib
+
+from django.conf import settings
 from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import update_last_login as django_update_last_login
+from django.contrib.auth.signals import user_logged_in
+from django.contrib.contenttypes.models import ContentType
+from django.utils.encoding import smart_str
+from django.utils.functional import SimpleLazyObject, empty
+
+from restkit import RequestFailed, ResourceNotFound, Unauthorized
+
+from django_roa.db.exceptions import ROAException
+from django_roa.db.transport import ROAResource, response_body
+from django_roa.remoteauth import cache
+from django_roa.remoteauth.models import User, Permission, \
+    UserGroupThrough, GroupPermissionThrough
+
+ROA_AUTH_CHECK_URL = getattr(settings, 'ROA_AUTH_CHECK_URL', None)
+ROA_HEADERS = getattr(settings, 'ROA_HEADERS', {})
+ROA_FILTERS = getattr(settings, 'ROA_FILTERS', {})
+
+
+class LazyUser(SimpleLazyObject):
+    """
+    User authenticated by the remote check endpoint, only fetched once an
+    attribute other than ``pk``, ``id``, ``token`` or ``backend`` is used.
+    """
+    local_attributes = ('pk', 'id', 'token', 'backend')
+
+    def __init__(self, pk, token, load):
+        super(LazyUser, self).__init__(load)
+        self.__dict__.update(pk=pk, id=pk, token=token)
+
+    # Known without loading the user, signals are sent with it as sender.
+    __class__ = property(lambda self: User)
+
+    def _setup(self):
+        user = self._setupfunc()
+        if user is None:
+            raise User.DoesNotExist("Authenticated user %s no longer exists." % self.pk)
+        for name in ('token', 'backend'):
+            if name in self.__dict__:
+                setattr(user, name, self.__dict__[name])
+        self._wrapped = user
+
+    def __setattr__(self, name, value):
+        if name in self.local_attributes:
+            self.__dict__[name] = value
+            if self._wrapped is not empty:
+                setattr(self._wrapped, name, value)
+        else:
+            super(LazyUser, self).__setattr__(name, value)
+
+    def is_anonymous(self):
+        return False
+
+    def is_authenticated(self):
+        return True
 
-from django_roa.remoteauth.models import User
 
 class RemoteUserModelBackend(ModelBackend):
     """
     Authenticates against django_roa.remoteauth.models.RemoteUser.
+
+    If ``ROA_AUTH_CHECK_URL`` is set, credentials are checked by this
+    remote endpoint instead of fetching the user, see ``check_credentials``.
+    The endpoint is expected to update ``last_login``.
     """
     def authenticate(self, username=None, password=None):
+        if ROA_AUTH_CHECK_URL:
+            return self.check_credentials(username, password)
         try:
-            user = User.objects.get(username=username)
+            user = User.objects.defer(None).get(username=username)
             if user.check_password(password):
                 return user
         except User.DoesNotExist:
             return None
 
-    def get_group_permissions(self, user_obj):
+    def check_credentials(self, username, password):
+        """
+        Posts credentials to ``ROA_AUTH_CHECK_URL`` which responds with a
+        JSON object holding the ``pk`` of the user and an optional
+        ``token``, or a 404 for unknown usernames and a 401 or 403 for
+        wrong passwords. Failures are cached for a short time.
+
+        Returns a ``LazyUser`` or None.
+        """
+        if username is None or password is None \
+           or cache.rejected(username, password):
+            return None
+        resource = ROAResource(ROA_AUTH_CHECK_URL, model=User, filters=ROA_FILTERS)
+        payload = urllib.urlencode({'username': smart_str(username),
+                                    'password': smart_str(password)})
+        headers = dict(ROA_HEADERS, **{'Content-Type': 'application/x-www-form-urlencoded'})
+        try:
+            response = resource.post(payload=payload, headers=headers)
+        except ResourceNotFound:
+            cache.reject(username)
+            return None
+        except Unauthorized:
+            cache.reject(username, password)
+            return None
+        except RequestFailed as e:
+            raise ROAException(e)
+        with resource.call as call:
+            data = json.loads(response_body(response, call))
+        pk = data['pk']
+        return LazyUser(pk, data.get('token'),
+                        lambda: cache.get_user(pk, lambda: self.load_user(pk)))
+
+    def get_group_permissions(self, user_obj, obj=None):
         """
         Returns a set of permission strings that this user has through his/her
         groups.
         """
+        if user_obj.is_anonymous() or obj is not None:
+            return set()
         if not hasattr(user_obj, '_group_perm_cache'):
-            # TODO: improve performances
-            permissions = [u"%s.%s" % (p.content_type.app_label, p.codename) \
-                                        for group in user_obj.groups.all() \
-                                            for p in group.permissions.all()]
-            user_obj._group_perm_cache = permissions
+            user_obj._group_perm_cache = cache.get_permissions(
+                user_obj.pk, 'group', lambda: self.load_group_permissions(user_obj))
         return user_obj._group_perm_cache
 
+    def get_all_permissions(self, user_obj, obj=None):
+        if user_obj.is_anonymous() or obj is not None:
+            return set()
+        if not hasattr(user_obj, '_perm_cache'):
+            user_obj._perm_cache = cache.get_permissions(
+                user_obj.pk, 'all', lambda: self.load_all_permissions(user_obj))
+        return user_obj._perm_cache
+
+    def load_all_permissions(self, user_obj):
+        get_content_type = ContentType.objects.get_for_id
+        permissions = set(u"%s.%s" % (get_content_type(p.content_type_id).app_label, p.codename) \
+                          for p in user_obj.user_permissions.all())
+        permissions.update(self.get_group_permissions(user_obj))
+        return permissions
+
+    def load_group_permissions(self, user_obj):
+        """
+        Resolves group permissions in at most three remote calls: groups
+        of the user, permissions of these groups, then these permissions.
+        """
+        group_ids = set(row['group'] for row in UserGroupThrough.objects \
+                            .filter(user=user_obj.pk).values('group'))
+        if not group_ids:
+            return set()
+        permission_ids = set(row['permission'] for row in GroupPermissionThrough.objects \
+                                 .filter(group__in=sorted(group_ids)).values('permission'))
+        if not permission_ids:
+            return set()
+        get_content_type = ContentType.objects.get_for_id
+        return set(u"%s.%s" % (get_content_type(p.content_type_id).app_label, p.codename) \
+                   for p in Permission.objects.filter(pk__in=sorted(permission_ids)))
+
     def get_user(self, user_id):
+        return cache.get_user(user_id, lambda: self.load_user(user_id))
+
+    def load_user(self, user_id):
         try:
             return User.objects.get(pk=user_id)
         except User.DoesNotExist:
             return None
+
+
+def update_last_login(sender, user, **kwargs):
+    """
+    Replaces Django's receiver of ``user_logged_in``, which would load and
+    save users authenticated by ``ROA_AUTH_CHECK_URL``: the check endpoint
+    records their logins itself.
+    """
+    if isinstance(user, LazyUser):
+        return
+    django_update_last_login(sender, user, **kwargs)
+
+user_logged_in.disconnect(django_update_last_login)
+user_logged_in.connect(update_last_login)
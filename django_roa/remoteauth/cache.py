@@ -0,0 +1,177 @@
+"""
+Cross-request cache of remote users and of their resolved permissions,
+backed by Django's cache framework so that session authentication does
+not cost a remote call per request.
+
+Entries live ``ROA_AUTH_CACHE_TIMEOUT`` seconds (0 disables the cache) in
+the ``ROA_AUTH_CACHE`` cache alias. Saving or deleting a user or one of
+its group memberships drops its entries, saving or deleting a group, a
+permission or a group permission bumps a generation number which expires
+every permission set at once.
+
+Failed credential checks are remembered ``ROA_AUTH_NEGATIVE_CACHE_TIMEOUT``
+seconds (0 disables it): unknown usernames whatever the password, wrong
+passwords for this password only. Keys hold salted HMACs, never the
+credentials themselves, and cached users lack their password hash.
+"""
+import copy
+import time
+
+from django.conf import settings
+from django.core.cache import get_cache
+from django.utils.crypto import salted_hmac
+from django.utils.encoding import smart_str
+
+ROA_AUTH_CACHE = getattr(settings, 'ROA_AUTH_CACHE', 'default')
+ROA_AUTH_CACHE_TIMEOUT = getattr(settings, 'ROA_AUTH_CACHE_TIMEOUT', 300)
+ROA_AUTH_CACHE_PREFIX = getattr(settings, 'ROA_AUTH_CACHE_PREFIX', 'roa_auth')
+ROA_AUTH_NEGATIVE_CACHE_TIMEOUT = getattr(settings, 'ROA_AUTH_NEGATIVE_CACHE_TIMEOUT', 30)
+
+PERMISSION_KINDS = ('group', 'all')
+
+_cache = []
+
+
+def auth_cache():
+    if not _cache:
+        _cache.append(get_cache(ROA_AUTH_CACHE))
+    return _cache[0]
+
+
+def enabled():
+    return bool(ROA_AUTH_CACHE_TIMEOUT)
+
+
+def user_key(pk):
+    return '%s:user:%s' % (ROA_AUTH_CACHE_PREFIX, pk)
+
+
+def generation_key():
+    return '%s:generation' % ROA_AUTH_CACHE_PREFIX
+
+
+def generation():
+    """
+    Returns the current generation of permissions, starting from a time
+    based number so that an evicted generation never revives old entries.
+    """
+    generation = auth_cache().get(generation_key())
+    if generation is None:
+        auth_cache().add(generation_key(), int(time.time() * 1000))
+        generation = auth_cache().get(generation_key(), 0)
+    return generation
+
+
+def permissions_key(pk, kind, current=None):
+    if current is None:
+        current = generation()
+    return '%s:perms:%s:%s:%s' % (ROA_AUTH_CACHE_PREFIX, current, kind, pk)
+
+
+def get_user(pk, load):
+    """
+    Returns the cached user of this primary key, calling ``load`` and
+    caching its result on a miss. ``None`` results are not cached.
+
+    Deferred fields, the password hash of remote users, are left out of
+    the cache and loaded remotely if they are used.
+    """
+    if not enabled():
+        return load()
+    key = user_key(pk)
+    user = auth_cache().get(key)
+    if user is None:
+        user = load()
+        if user is not None:
+            auth_cache().set(key, without_deferred(user), ROA_AUTH_CACHE_TIMEOUT)
+    return user
+
+
+def without_deferred(user):
+    """
+    Returns a copy of the user without its deferred fields.
+    """
+    user = copy.copy(user)
+    for name in getattr(user._meta, 'deferred_fields', ()):
+        user.__dict__.pop(user._meta.get_field(name).attname, None)
+    return user
+
+
+def get_permissions(pk, kind, load):
+    """
+    Returns the cached set of permissions of this kind for the user of
+    this primary key, calling ``load`` on a miss.
+    """
+    if not enabled():
+        return load()
+    key = permissions_key(pk, kind)
+    permissions = auth_cache().get(key)
+    if permissions is None:
+        permissions = load()
+        auth_cache().set(key, permissions, ROA_AUTH_CACHE_TIMEOUT)
+    return set(permissions)
+
+
+def invalidate_user(pk):
+    """
+    Drops the cached user of this primary key and its permissions.
+    """
+    if not enabled() or pk is None:
+        return
+    current = generation()
+    auth_cache().delete_many([user_key(pk)] + [permissions_key(pk, kind, current)
+                                                for kind in PERMISSION_KINDS])
+
+
+def invalidate_permissions():
+    """
+    Expires the permissions of every user.
+    """
+    if not enabled():
+        return
+    try:
+        auth_cache().incr(generation_key())
+    except ValueError:
+        generation()
+
+
+def credentials_key(username, password=None):
+    value = smart_str(username)
+    if password is not None:
+        value += '\0' + smart_str(password)
+    digest = salted_hmac('django_roa.remoteauth.cache', value).hexdigest()
+    return '%s:rejected:%s' % (ROA_AUTH_CACHE_PREFIX, digest)
+
+
+def rejected(username, password):
+    """
+    Returns whether these credentials recently failed, either because the
+    username is unknown or because this password is wrong.
+    """
+    if not ROA_AUTH_NEGATIVE_CACHE_TIMEOUT:
+        return False
+    return bool(auth_cache().get_many([credentials_key(username),
+                                       credentials_key(username, password)]))
+
+
+def reject(username, password=None):
+    """
+    Remembers failed credentials, the whole username if no password is given.
+    """
+    if ROA_AUTH_NEGATIVE_CACHE_TIMEOUT:
+        auth_cache().set(credentials_key(username, password), True,
+                         ROA_AUTH_NEGATIVE_CACHE_TIMEOUT)
+
+
+def user_changed(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+    if ROA_AUTH_NEGATIVE_CACHE_TIMEOUT and instance.username:
+        auth_cache().delete(credentials_key(instance.username))
+
+
+def membership_changed(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+def permissions_changed(sender, instance, **kwargs):
+    invalidate_permissions()
@@ -10,8 +10,10 @@ except ImportError:
     DjangoMessage = None
 from django.utils.translation import ugettext_lazy as _
 from django.db import models
+from django.db.models import signals
 
 from django_roa import Model, Manager
+from django_roa.remoteauth import cache
 
 
 class Permission(Model, DjangoPermission):
@@ -93,6 +95,10 @@ class User(Model, DjangoUser):
 
     objects = UserManager()
 
+    class Meta(DjangoUser.Meta):
+        # Only fetched to check a password, never cached
+        deferred_fields = ('password',)
+
     @staticmethod
     def get_resource_url_list():
         return u'http://127.0.0.1:8081/auth/user/'
@@ -110,3 +116,13 @@ if DjangoMessage:
         @staticmethod
         def get_resource_url_list():
             return u'http://127.0.0.1:8081/auth/message/'
+
+
+# Keeps the shared cache of users and permissions up to date
+signals.post_save.connect(cache.user_changed, sender=User)
+signals.post_delete.connect(cache.user_changed, sender=User)
+signals.post_save.connect(cache.membership_changed, sender=UserGroupThrough)
+signals.post_delete.connect(cache.membership_changed, sender=UserGroupThrough)
+for sender in (Group, Permission, GroupPermissionThrough):
+    signals.post_save.connect(cache.permissions_changed, sender=sender)
+    signals.post_delete.connect(cache.permissions_changed, sender=sender)
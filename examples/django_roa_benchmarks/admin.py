@@ -0,0 +1,17 @@
+from django.contrib import admin
+from django_roa import ModelAdmin
+
+from django_roa_benchmarks.models import BenchPage, BenchPageWithRelation
+
+
+class BenchPageAdmin(ModelAdmin):
+    list_display = ('title', 'published')
+    list_per_page = 50
+
+
+class BenchPageWithRelationAdmin(ModelAdmin):
+    list_display = ('title', 'page')
+    list_per_page = 50
+
+admin.site.register(BenchPage, BenchPageAdmin)
+admin.site.register(BenchPageWithRelation, BenchPageWithRelationAdmin)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+"""
+Benchmarks of django-roa hot paths against an in-process stand-in server.
+
+Run it from this directory:
+
+    $ python bench.py --sizes 10,100,1000 --latency 0.001 --output results.json
+
+Results are emitted as JSON (one entry per benchmark and dataset size) so
+that they can be compared across revisions to track regressions.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import subprocess
+from optparse import OptionParser
+
+ROOT_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(os.path.dirname(ROOT_PATH)))
+sys.path.insert(0, os.path.dirname(ROOT_PATH))
+
+BENCHMARKS = ('list', 'keyset', 'get', 'count', 'save', 'delete', 'fk', 'changelist')
+
+
+def parse_options():
+    parser = OptionParser(usage="%prog [options] [benchmark ...]",
+                          description="Available benchmarks: %s." % ', '.join(BENCHMARKS))
+    parser.add_option('--sizes', default='10,100,1000',
+                      help="Comma separated dataset sizes [%default].")
+    parser.add_option('--repeat', type='int', default=5,
+                      help="Number of timed runs of each benchmark [%default].")
+    parser.add_option('--latency', type='float', default=0.0,
+                      help="Latency added by the server to each request, in seconds [%default].")
+    parser.add_option('--payload-size', type='int', default=100,
+                      help="Size of the text field of each row, in characters [%default].")
+    parser.add_option('--fk-rows', type='int', default=50,
+                      help="Number of rows whose foreign key is traversed [%default].")
+    parser.add_option('--page-size', type='int', default=100,
+                      help="Size of the pages requested by the keyset benchmark [%default].")
+    parser.add_option('--host', default='127.0.0.1',
+                      help="Address the stand-in server listens to [%default].")
+    parser.add_option('--port', type='int', default=8082,
+                      help="Port the stand-in server listens to [%default].")
+    parser.add_option('--output', default=None,
+                      help="File to write JSON results to, defaults to stdout.")
+    return parser.parse_args()
+
+
+def git_revision():
+    try:
+        return subprocess.Popen(['git', 'rev-parse', 'HEAD'], cwd=ROOT_PATH,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE).communicate()[0].strip()
+    except OSError:
+        return None
+
+
+class Benchmarks(object):
+    """
+    Each ``bench_<name>`` method returns a callable doing one timed run,
+    given the server populated with ``size`` rows.
+    """
+    def __init__(self, server, options):
+        from django.contrib import admin
+        from django_roa_benchmarks.models import BenchPage, BenchPageWithRelation
+        admin.autodiscover()
+        self.server = server
+        self.options = options
+        self.admin = admin
+        self.BenchPage = BenchPage
+        self.BenchPageWithRelation = BenchPageWithRelation
+
+    def bench_list(self, size):
+        return lambda: list(self.BenchPage.objects.all())
+
+    def bench_keyset(self, size):
+        return lambda: list(self.BenchPage.objects.keyset(page_size=self.options.page_size))
+
+    def bench_get(self, size):
+        return lambda: self.BenchPage.objects.get(pk=size)
+
+    def bench_count(self, size):
+        return lambda: self.BenchPage.objects.count()
+
+    def bench_save(self, size):
+        def run():
+            page = self.BenchPage(title=u'Saved page', text=u'x' * self.options.payload_size)
+            page.save()
+        return run
+
+    def bench_delete(self, size):
+        rows = self.server.resources['benchpage']
+
+        def run():
+            # Ensure that the row exists, the bookkeeping is negligible
+            # compared to the remote call.
+            rows.setdefault(1, {'id': 1, 'title': u'Page 1', 'text': u'', 'published': False})
+            self.BenchPage(id=1).delete()
+        return run
+
+    def bench_fk(self, size):
+        limit = self.options.fk_rows
+
+        def run():
+            for relation in self.BenchPageWithRelation.objects.all()[:limit]:
+                relation.page
+        return run
+
+    def bench_changelist(self, size):
+        from django.test.client import RequestFactory
+        model_admin = self.admin.site._registry[self.BenchPage]
+        request = RequestFactory().get('/admin/django_roa_benchmarks/benchpage/')
+        request.user = Superuser()
+
+        def run():
+            model_admin.changelist_view(request).render()
+        return run
+
+
+class Superuser(object):
+    """
+    Stands for an authenticated superuser without any database access.
+    """
+    pk = id = 1
+    is_active = is_staff = is_superuser = True
+
+    def is_authenticated(self):
+        return True
+
+    def has_perm(self, perm, obj=None):
+        return True
+
+    def has_module_perms(self, app_label):
+        return True
+
+
+class CallCounter(object):
+    """
+    Counts remote calls and bytes read through ``roa_request_finished``.
+    """
+    def __init__(self):
+        self.calls = self.bytes = 0
+
+    def __call__(self, sender, call, **kwargs):
+        self.calls += 1
+        self.bytes += call.bytes
+
+
+def run_benchmark(run, repeat):
+    from django_roa.db.signals import roa_request_finished
+    counter = CallCounter()
+    roa_request_finished.connect(counter, dispatch_uid='django_roa_bench')
+    timings = []
+    try:
+        run() # warm up connections and caches
+        counter.calls = counter.bytes = 0
+        for i in xrange(repeat):
+            start = time.time()
+            run()
+            timings.append(time.time() - start)
+    finally:
+        roa_request_finished.disconnect(dispatch_uid='django_roa_bench')
+    timings.sort()
+    return {
+        'min': timings[0],
+        'max': timings[-1],
+        'mean': sum(timings) / len(timings),
+        'median': timings[len(timings) // 2],
+        'remote_calls': counter.calls / repeat,
+        'bytes': counter.bytes / repeat,
+    }
+
+
+def main():
+    options, names = parse_options()
+    names = names or BENCHMARKS
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        sys.exit("Unknown benchmarks: %s" % ', '.join(sorted(unknown)))
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'django_roa_benchmarks.settings'
+    os.environ['ROA_BENCHMARK_HOST'] = options.host
+    os.environ['ROA_BENCHMARK_PORT'] = str(options.port)
+
+    from django_roa_benchmarks.server import StandInServer
+    server = StandInServer(options.host, options.port, latency=options.latency,
+                           payload_size=options.payload_size).start()
+    benchmarks = Benchmarks(server, options)
+
+    results = []
+    try:
+        for size in [int(size) for size in options.sizes.split(',')]:
+            for name in names:
+                server.populate(size)
+                result = {'benchmark': name, 'size': size, 'repeat': options.repeat}
+                try:
+                    run = getattr(benchmarks, 'bench_%s' % name)(size)
+                    result.update(run_benchmark(run, options.repeat))
+                except Exception as e:
+                    result['error'] = u'%s: %s' % (e.__class__.__name__, e)
+                results.append(result)
+                sys.stderr.write("%(benchmark)-10s size=%(size)-7s " % result +
+                                 ('error' in result and result['error'] or
+                                  "median=%(median).6fs calls=%(remote_calls)s" % result) +
+                                 "\n")
+    finally:
+        server.stop()
+
+    import django
+    output = json.dumps({
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'latency': options.latency,
+            'payload_size': options.payload_size,
+            'timestamp': time.time(),
+        },
+        'results': results,
+    }, indent=2)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(output)
+    else:
+        print output
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+from django_roa import Model
+
+BASE_URL = u'http://%s:%s/' % (settings.BENCHMARK_HOST, settings.BENCHMARK_PORT)
+
+
+class JSONParser(object):
+    def parse(self, stream):
+        return json.load(stream)
+
+
+class JSONRenderer(object):
+    def render(self, data):
+        return json.dumps(data, cls=DjangoJSONEncoder)
+
+
+class BenchSerializer(object):
+    """
+    Minimal serializer with the interface expected by django-roa, relying
+    on the decoding plan of models to build instances.
+    """
+    def __init__(self, model, instance=None, data=None):
+        self.model = model
+        self.instance = instance
+        self.initial_data = data
+
+    def is_valid(self):
+        return True
+
+    @property
+    def data(self):
+        return dict((field.name, getattr(self.instance, field.attname))
+                    for field in self.model._meta.fields)
+
+    @property
+    def object(self):
+        if isinstance(self.initial_data, list):
+            return [self.model.from_remote_row(row) for row in self.initial_data]
+        return self.model.from_remote_row(self.initial_data)
+
+
+class BenchModel(Model):
+
+    class Meta:
+        abstract = True
+        # BenchSerializer builds instances through from_remote_row anyway.
+        fast_instantiation = True
+
+    @classmethod
+    def get_parser(cls):
+        return JSONParser()
+
+    @classmethod
+    def get_renderer(cls):
+        return JSONRenderer()
+
+    @classmethod
+    def get_serializer(cls, instance=None, data=None):
+        return BenchSerializer(cls, instance=instance, data=data)
+
+
+class BenchPage(BenchModel):
+    title = models.CharField(max_length=50)
+    text = models.TextField(blank=True)
+    published = models.BooleanField()
+
+    def __unicode__(self):
+        return u'%s (%s)' % (self.title, self.pk)
+
+    @staticmethod
+    def get_resource_url_list():
+        return u'%sbenchpage/' % BASE_URL
+
+
+class BenchPageWithRelation(BenchModel):
+    title = models.CharField(max_length=50)
+    page = models.ForeignKey(BenchPage, blank=True, null=True)
+
+    def __unicode__(self):
+        return u'%s (%s)' % (self.title, self.pk)
+
+    @staticmethod
+    def get_resource_url_list():
+        return u'%sbenchpagewithrelation/' % BASE_URL
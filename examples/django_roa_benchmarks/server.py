@@ -0,0 +1,110 @@
+"""
+Stand-in for ``examples/django_roa_server`` serving the list, detail, count
+and write endpoints of the benchmark resources from memory, with a
+configurable latency and payload size.
+"""
+import re
+import json
+import time
+import threading
+from cgi import parse_qs
+from SocketServer import ThreadingMixIn
+from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
+
+URL_RE = re.compile(r'^/(?P<resource>\w+)/(?:(?P<count>count)/|(?P<pk>\d+)/)?$')
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class StandInServer(object):
+    """
+    In-memory REST service: ``/<resource>/`` (GET with offsets or an
+    ``after`` key, POST), ``/<resource>/count/`` (GET) and
+    ``/<resource>/<pk>/`` (GET, PUT, DELETE).
+    """
+    def __init__(self, host='127.0.0.1', port=8082, latency=0.0, payload_size=100):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.payload_size = payload_size
+        self.lock = threading.Lock()
+        self.resources = {}
+        self.httpd = None
+
+    def populate(self, size):
+        """
+        Resets resources with ``size`` pages and as many related pages.
+        """
+        text = u'x' * self.payload_size
+        with self.lock:
+            self.resources = {
+                'benchpage': dict((pk, {'id': pk, 'title': u'Page %s' % pk,
+                                        'text': text, 'published': pk % 2 == 0})
+                                  for pk in xrange(1, size + 1)),
+                'benchpagewithrelation': dict((pk, {'id': pk, 'title': u'Relation %s' % pk,
+                                                    'page': pk})
+                                              for pk in xrange(1, size + 1)),
+            }
+
+    def start(self):
+        self.httpd = make_server(self.host, self.port, self.application,
+                                 server_class=ThreadingWSGIServer,
+                                 handler_class=QuietHandler)
+        thread = threading.Thread(target=self.httpd.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def application(self, environ, start_response):
+        if self.latency:
+            time.sleep(self.latency)
+        match = URL_RE.match(environ['PATH_INFO'])
+        if match is None or match.group('resource') not in self.resources:
+            return self.respond(start_response, '404 NOT FOUND', '')
+        rows = self.resources[match.group('resource')]
+        method = environ['REQUEST_METHOD']
+        pk = match.group('pk') and int(match.group('pk'))
+
+        if match.group('count'):
+            return self.respond(start_response, '200 OK', str(len(rows)))
+        if pk is None and method == 'GET':
+            params = parse_qs(environ.get('QUERY_STRING', ''))
+            start = int(params.get('limit_start', [0])[0])
+            stop = params.get('limit_stop', [None])[0]
+            after = params.get('after', [None])[0]
+            ordered = [rows[key] for key in sorted(rows)
+                       if after is None or key > int(after)]
+            ordered = ordered[start:stop and int(stop) or None]
+            return self.respond(start_response, '200 OK', json.dumps(ordered))
+        if method in ('POST', 'PUT'):
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+            row = json.loads(environ['wsgi.input'].read(length) or '{}')
+            with self.lock:
+                if pk is None:
+                    pk = max(rows or [0]) + 1
+                row['id'] = pk
+                rows[pk] = row
+            return self.respond(start_response, '200 OK', json.dumps(row))
+        if pk not in rows:
+            return self.respond(start_response, '404 NOT FOUND', '')
+        if method == 'DELETE':
+            with self.lock:
+                rows.pop(pk, None)
+            return self.respond(start_response, '204 NO CONTENT', '')
+        return self.respond(start_response, '200 OK', json.dumps(rows[pk]))
+
+    def respond(self, start_response, status, body):
+        start_response(status, [('Content-Type', 'application/json'),
+                                 ('Content-Length', str(len(body)))])
+        return [body]
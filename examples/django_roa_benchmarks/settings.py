@@ -0,0 +1,40 @@
+import os
+ROOT_PATH = os.path.dirname(__file__)
+
+DEBUG = TEMPLATE_DEBUG = False
+MANAGERS = ADMINS = ()
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+TIME_ZONE = 'America/Chicago'
+LANGUAGE_CODE = 'en-us'
+SITE_ID = 1
+USE_I18N = False
+SECRET_KEY = 'u1#z3v!b@d8l$0k8n#&t2x6q^3r)p9w+e5y_s4m7j-c@h2g%fa'
+ROOT_URLCONF = 'django_roa_benchmarks.urls'
+TEMPLATE_DIRS = (os.path.join(ROOT_PATH, '../../templates'),)
+INSTALLED_APPS = (
+    'django_roa',
+    'django_roa_benchmarks',
+    'django.contrib.auth',
+    'django.contrib.admin',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+)
+
+## Stand-in server settings, overridden by bench.py command line options
+BENCHMARK_HOST = os.environ.get('ROA_BENCHMARK_HOST', '127.0.0.1')
+BENCHMARK_PORT = int(os.environ.get('ROA_BENCHMARK_PORT', 8082))
+
+## ROA custom settings
+ROA_MODELS = True
+ROA_FORMAT = 'json'
+ROA_HEADERS = {
+    'Content-Type': 'application/json',
+}
@@ -38,6 +38,10 @@ class RemotePageWithManyFields(Model):
     file_field = models.FileField(upload_to="files", blank=True, null=True)
     image_field = models.ImageField(upload_to="images", blank=True, null=True)
 
+    class Meta:
+        # Left out of lists by services supporting it, loaded on access
+        deferred_fields = ('text_field', 'file_field', 'image_field')
+
     def __unicode__(self):
         return u'%s (%s)' % (self.__class__.__name__, self.pk)
 
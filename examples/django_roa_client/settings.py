@@ -35,6 +35,8 @@ MIDDLEWARE_CLASSES = (
     'django.middleware.common.CommonMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # log remote calls of each request and warn about duplicates and N+1
+    #'django_roa.middleware.RemoteQueryLogMiddleware',
 )
 ROOT_URLCONF = 'urls'
 TEMPLATE_DIRS = (os.path.join(ROOT_PATH, '../../templates'),)
@@ -62,19 +64,55 @@ ROA_FORMAT = 'django'  # json or xml
 ROA_HEADERS = {
     'Content-Type': 'application/x-www-form-urlencoded',
 }
+# compressed responses accepted from the ws (br is left out unless the brotli
+# module is installed)
+ROA_ACCEPT_ENCODING = 'gzip, deflate, br'
+# gzip request bodies larger than this size in bytes, None to disable
+ROA_COMPRESS_REQUESTS_ABOVE = None
+# multiplex remote calls over one HTTP/2 connection per host (requires the
+# hyper module and a ws speaking HTTP/2, the test server does not), calls
+# bounded by timeouts still use HTTP/1.1
+ROA_HTTP2 = False
 ROA_DJANGO_ERRORS = True  # useful to ease debugging if you use test server
+# build rows straight from responses for models without a serializer of their
+# own, others opt in with the fast_instantiation Meta option
+ROA_FAST_INSTANTIATION = True
 
 ROA_URL_OVERRIDES_LIST = {
     'django_roa_client.remotepagewithoverriddenurls': u'http://127.0.0.1:8081/django_roa_server/remotepagewithoverriddenurls/',
 }
+# also available: ROA_URL_OVERRIDES_COUNT, ROA_URL_OVERRIDES_AGGREGATE and
+# ROA_URL_OVERRIDES_UNIQUE
 ROA_URL_OVERRIDES_DETAIL = {
     'django_roa_client.remotepagewithoverriddenurls': lambda o: u"%s%s-%s/" % (o.get_resource_url_list(), o.id, o.slug),
 }
+# cache list URLs returned by get_resource_url_list, disable if they vary
+ROA_CACHE_RESOURCE_URLS = True
+# lookup types supported by resources, others are evaluated on fetched rows
+ROA_SUPPORTED_LOOKUPS = {
+    #'django_roa_client.remotepage': ('exact', 'in', 'gt', 'lt', 'where'),
+}
+# header holding the number of rows requested by RemoteQuerySet.with_count(),
+# when the service does not return it in a {"results": [...], "count": n} body
+ROA_COUNT_HEADER = 'X-Total-Count'
+# primary keys per request loading deferred fields (deferred_fields Meta option)
+ROA_DEFERRED_BATCH_SIZE = 100
+# blobs of django_roa.db.storage.RemoteStorage, which may be made the
+# DEFAULT_FILE_STORAGE, ROA_STORAGE_BASE_URL being the base of public URLs
+ROA_STORAGE_URL = u'http://127.0.0.1:8081/files/'
+# rows requested per page by RemoteQuerySet.keyset()
+ROA_KEYSET_PAGE_SIZE = 100
+# seconds remote users and permissions are cached by the remoteauth backend,
+# disabled here since the test server is flushed behind the client's back
+ROA_AUTH_CACHE_TIMEOUT = 0
+# check credentials remotely instead of fetching users on login
+#ROA_AUTH_CHECK_URL = u'http://127.0.0.1:8081/auth/user/check/'
 ROA_MODEL_NAME_MAPPING = (
     # local name: remote name
     ('django_roa_client.', 'django_roa_server.'),
     ('remoteauth.', 'auth.'),
 )
+# see django_roa.db.filters for the encoding of filters (FILTER_, EXCLUDE_, WHERE)
 ROA_ARGS_NAMES_MAPPING = {
     'ORDER_BY': 'order',
 }
@@ -90,6 +128,50 @@ ROA_FILTERS = [ BasicAuth('django-roa', 'roa'), ]
 # Disable authentication through django-piston
 #ROA_FILTERS = []
 
+## Record and replay settings
+# 'record' remote calls into ROA_CASSETTE_PATH or 'replay' them, None to disable
+ROA_CASSETTE_MODE = None
+ROA_CASSETTE_PATH = os.path.join(ROOT_PATH, 'roa_cassette.jsonl.gz')
+# replayed latency: None, 'recorded' or a number of seconds
+ROA_CASSETTE_LATENCY = None
+
+## Timeouts settings
+# seconds before giving up connecting to the ws or reading from it, None
+# for no limit, models may override them with a timeouts Meta option
+ROA_CONNECT_TIMEOUT = None
+ROA_READ_TIMEOUT = None
+# seconds remote calls of each request may take (RemoteDeadlineMiddleware)
+ROA_REQUEST_BUDGET = None
+# header sending the remaining budget in milliseconds to the ws
+ROA_DEADLINE_HEADER = None
+# send a second GET if the first one is slower than the 95th percentile
+ROA_HEDGE_READS = False
+ROA_HEDGE_DELAY = None  # fixed delay in seconds instead of the percentile
+ROA_HEDGE_PERCENTILE = 95
+
+## Circuit breaker settings
+# fail fast while a host (or resource) of the ws is unhealthy
+ROA_CIRCUIT_BREAKER = False
+ROA_CIRCUIT_SCOPE = 'host'  # or 'resource'
+ROA_CIRCUIT_WINDOW = 20
+ROA_CIRCUIT_MIN_CALLS = 10
+ROA_CIRCUIT_ERROR_RATE = 0.5
+ROA_CIRCUIT_SLOW_CALL = None  # seconds, slower calls count as failures
+ROA_CIRCUIT_OPEN_SECONDS = 30
+ROA_CIRCUIT_HALF_OPEN_CALLS = 1
+# 'raise' ROACircuitOpen or serve the last response of GETs ('stale')
+ROA_CIRCUIT_FALLBACK = 'raise'
+
+## Metrics settings
+# aggregate roa_request_finished signals in django_roa.db.metrics.collector
+ROA_COLLECT_METRICS = False
+# used by django_roa.middleware and django_roa.panels.RemoteQueriesPanel
+ROA_QUERY_LOG_STACK_DEPTH = 3
+ROA_N_PLUS_ONE_THRESHOLD = 3
+
 ## Logging settings
+# dump payloads, truncated, to the "django_roa.payloads" logger
+ROA_LOG_PAYLOADS = False
+ROA_LOG_PAYLOADS_MAX_SIZE = 1024
 import logging
 logging.basicConfig(level=logging.DEBUG, format="%(name)s - %(message)s")
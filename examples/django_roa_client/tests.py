@@ -27,24 +27,56 @@ Note: do not try to launch tests' projects if you put ``django_roa``
 application into your own project, otherwise it will fail. Django do not
 handle very well projects inside projects.
 """
+import os
+import json
+import zlib
+import shutil
+import tempfile
+import time as time_module
 from datetime import time, date, datetime
 
 from django.test import TestCase
 from django.conf import settings
-from django.test.client import Client
+from django.test.client import Client, RequestFactory
+from django.utils.importlib import import_module
+from django.db.models import Q, Sum, Count
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.core.files.base import ContentFile
 from django.core.serializers import register_serializer
+from django.contrib.admin import site
+from django.contrib.auth import login
 from django.contrib.contenttypes.models import ContentType
 
-from restkit import Resource
-from django_roa.remoteauth.models import User, Message, Group, Permission
+from restkit import Resource, ResourceNotFound, RequestFailed, RequestError
+from restkit.wrappers import Request
+from django_roa.remoteauth import cache as auth_cache
+from django_roa.remoteauth import backends
+from django_roa.remoteauth.models import User, Message, Group, Permission, \
+    UserGroupThrough, GroupPermissionThrough
 from django_roa_client.models import RemotePage, RemotePageWithManyFields, \
     RemotePageWithBooleanFields, RemotePageWithRelations, \
     RemotePageWithCustomSlug, RemotePageWithOverriddenUrls, \
     RemotePageWithNamedRelations, RemotePageWithProxy, \
     RemotePageWithRelationsThrough, RemotePageWithCustomPrimaryKey, \
     RemotePageWithCustomPrimaryKeyCountOverridden
+from django_roa_client.admin import RemotePageAdmin
 from django_roa_client.forms import TestForm, RemotePageForm
-from django_roa.db.exceptions import ROAException
+from django_roa.db.admin import ROAChangeList
+from django_roa.db import breaker, filters, hedging, http2, timeouts, transport
+from django_roa.db.breaker import Circuit
+from django_roa.db.cassettes import Cassette, CassetteResponse, CassetteMiss, \
+    request_key, use_cassette
+from django_roa.db.exceptions import ROAException, ROADeadlineExceeded
+from django_roa.db.metrics import RemoteCall, MetricsCollector, ConnectionTiming
+from django_roa.db.querylog import query_log, analyze
+from django_roa.db.filters import encode_condition, decode_condition, \
+    split_condition, compile_condition
+from django_roa.db.aggregates import encode_aggregates, aggregate_locally
+from django_roa.db.query import PARAMETER_NAMES, static_parameters
+from django_roa.db.storage import RemoteStorage
+from django_roa.db.transport import ROAResource, response_body
+from django_roa.db.unique import unique_constraints, encode_constraints, \
+    decode_constraints, conflicting_errors
 
 ROA_FILTERS = getattr(settings, 'ROA_FILTERS', {})
 
@@ -113,6 +145,26 @@ class ROABaseTests(ROATestCase):
         self.assertEqual(repr(RemotePage.objects.all()), '[]')
         self.assertEqual(RemotePage.objects.count(), 0)
 
+    def test_instantiation_round_trip(self):
+        RemotePage.objects.create(title=u'A round trip')
+        pages = list(RemotePage.objects.all())
+        self.assertEqual([page.title for page in pages], [u'A round trip'])
+        self.assertTrue(pages[0].pk)
+        page = RemotePage.objects.get(id=pages[0].pk)
+        self.assertEqual((page.pk, page.title), (pages[0].pk, u'A round trip'))
+
+    def test_validate_unique(self):
+        page = RemotePage.objects.create(title=u'A unique page')
+        self.assertFalse(page._state.adding)
+        # The primary key of a saved page conflicts with nothing
+        page.title = u'An edited page'
+        page.validate_unique()
+        page.save()
+        page = RemotePage.objects.get(id=page.pk)
+        self.assertFalse(page._state.adding)
+        page.validate_unique()
+        self.assertRaises(ValidationError, RemotePage(id=page.pk, title=u'Taken').validate_unique)
+
 
 class ROAUnicodeTests(ROATestCase):
 
@@ -182,6 +234,20 @@ class ROAFieldsTests(ROATestCase):
         self.assertEqual(repr(default_page.image_field), repr(retrieved_default_page.image_field))
         default_page.delete()
 
+    def test_remote_storage(self):
+        storage = RemoteStorage()
+        content = 'x' * (3 * 64 * 1024 + 1)
+        name = storage.save('files/remote.txt', ContentFile(content))
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(storage.size(name), len(content))
+        self.assertEqual(storage.url(name), settings.ROA_STORAGE_URL + name)
+        remote_file = storage.open(name)
+        self.assertEqual(''.join(remote_file.chunks()), content)
+        remote_file.close()
+        storage.delete(name)
+        self.assertFalse(storage.exists(name))
+        self.assertRaises(IOError, storage.open, name)
+
     def test_empty_boolean_values(self):
         boolean_page = RemotePageWithBooleanFields.objects.create(boolean_field=True)
         self.assertEqual(boolean_page.id, 1)
@@ -474,6 +540,25 @@ class ROAQuerysetTests(ROATestCase):
         self.assertEqual(repr(RemotePage.objects.all()[1:3]), '[<RemotePage: Another remote page (2)>, <RemotePage: Yet another remote page (3)>]')
         self.assertEqual(repr(RemotePage.objects.all()[0]), '<RemotePage: A remote page (1)>')
 
+    def test_keyset_slicing(self):
+        entries = query_log.start()
+        try:
+            pages = list(RemotePage.objects.keyset(page_size=2)[1:4])
+        finally:
+            query_log.stop()
+        self.assertEqual(repr(pages), '[<RemotePage: Another remote page (2)>, <RemotePage: Yet another remote page (3)>, <RemotePage: Still another remote page (4)>]')
+        self.assertEqual([(entry['parameters'].get('limit_start'),
+                           entry['parameters'].get('limit_stop'))
+                          for entry in entries], [(1, 3), (None, 1)])
+        # A slice ending on a page boundary does not fetch the next page.
+        entries = query_log.start()
+        try:
+            pages = list(RemotePage.objects.keyset(page_size=2)[2:4])
+        finally:
+            query_log.stop()
+        self.assertEqual(repr(pages), '[<RemotePage: Yet another remote page (3)>, <RemotePage: Still another remote page (4)>]')
+        self.assertEqual(len(entries), 1)
+
     def test_extra(self):
         self.assertEqual(bool(RemotePage.objects.all().extra(select={'a': 1}).values('a').order_by()), True)
         RemotePage.objects.all().delete()
@@ -596,11 +681,11 @@ class ROARemoteAuthTests(ROAUserTestCase):
                                                      content_type=ct_group,
                                                      codename=u"custom_group_permission")
         group = Group.objects.create(name=u"Custom group")
-        #group.permissions.add(group_permission)
-        #bob.groups.add(group)
-        #self.assertEqual(repr(bob.groups.all()), '[<Group: Custom group>]')
-        #self.assertEqual(repr(bob.groups.all()[0].permissions.all()), '[<Permission: remoteauth | group | Custom permission to group model>]')
-        self.assertEqual(repr(bob.groups.all()), '[]')
+        # Relations with an intermediary model can't be add()ed to
+        GroupPermissionThrough.objects.create(group=group, permission=group_permission)
+        UserGroupThrough.objects.create(user=bob, group=group)
+        self.assertEqual([row['group'] for row in UserGroupThrough.objects.filter(user=bob.pk).values('group')], [group.pk])
+        self.assertEqual([row['permission'] for row in GroupPermissionThrough.objects.filter(group=group.pk).values('permission')], [group_permission.pk])
 
     def test_permissions(self):
         bob = User.objects.create_superuser(username=u'bob', password=u'secret', email=u'bob@example.com')
@@ -617,12 +702,75 @@ class ROARemoteAuthTests(ROAUserTestCase):
                                                      content_type=ct_group,
                                                      codename=u"custom_group_permission")
         group = Group.objects.create(name=u"Custom group")
-        #group.permissions.add(group_permission)
-        #bob.groups.add(group)
-        #self.assertEqual(bob.get_group_permissions(), set([u'remoteauth.custom_group_permission']))
-        #self.assertEqual(bob.get_all_permissions(), set([u'remoteauth.custom_group_permission', u'remoteauth.custom_user_permission']))
         self.assertEqual(bob.get_group_permissions(), set([]))
-        self.assertEqual(bob.get_all_permissions(), set([]))
+        bob = User.objects.get(pk=bob.pk)
+        GroupPermissionThrough.objects.create(group=group, permission=group_permission)
+        UserGroupThrough.objects.create(user=bob, group=group)
+        entries = query_log.start()
+        try:
+            self.assertEqual(bob.get_group_permissions(), set([u'remoteauth.custom_group_permission']))
+        finally:
+            query_log.stop()
+        # Groups of the user, permissions of these groups, then these permissions
+        self.assertEqual([entry['url'] for entry in entries], [
+            u'http://127.0.0.1:8081/auth/usergroupthrough/',
+            u'http://127.0.0.1:8081/auth/grouppermissionthrough/',
+            u'http://127.0.0.1:8081/auth/permission/'])
+        self.assertEqual(bob.get_all_permissions(), set([u'remoteauth.custom_group_permission']))
+
+    def test_shared_cache(self):
+        bob = User.objects.create_user(username=u'bob', password=u'secret', email=u'bob@example.com')
+        timeout, auth_cache.ROA_AUTH_CACHE_TIMEOUT = auth_cache.ROA_AUTH_CACHE_TIMEOUT, 60
+        try:
+            backend = backends.RemoteUserModelBackend()
+            self.assertEqual(backend.get_user(bob.pk).username, u'bob')
+            cached = auth_cache.auth_cache().get(auth_cache.user_key(bob.pk))
+            self.assertEqual(cached.username, u'bob')
+            # The password hash is not cached but loaded when needed
+            self.assertFalse('password' in cached.__dict__)
+            self.assertTrue(cached.check_password(u'secret'))
+            bob.username = u'robert'
+            bob.save()
+            self.assertEqual(backend.get_user(bob.pk).username, u'robert')
+            self.assertEqual(auth_cache.get_permissions(bob.pk, 'group', lambda: set([u'a.b'])), set([u'a.b']))
+            self.assertEqual(auth_cache.get_permissions(bob.pk, 'group', lambda: set()), set([u'a.b']))
+            Group.objects.create(name=u"Custom group")
+            self.assertEqual(auth_cache.get_permissions(bob.pk, 'group', lambda: set()), set())
+        finally:
+            auth_cache.invalidate_user(bob.pk)
+            auth_cache.ROA_AUTH_CACHE_TIMEOUT = timeout
+
+    def test_check_credentials(self):
+        bob = User.objects.create_user(username=u'bob', password=u'secret', email=u'bob@example.com')
+        url, backends.ROA_AUTH_CHECK_URL = backends.ROA_AUTH_CHECK_URL, u'http://127.0.0.1:8081/auth/user/check/'
+        try:
+            backend = backends.RemoteUserModelBackend()
+            self.assertEqual(backend.authenticate(u'nobody', u'secret'), None)
+            entries = query_log.start()
+            try:
+                # Unknown usernames are remembered whatever the password
+                self.assertEqual(backend.authenticate(u'nobody', u'other'), None)
+            finally:
+                query_log.stop()
+            self.assertEqual(entries, [])
+            self.assertEqual(backend.authenticate(u'bob', u'wrong'), None)
+            user = backend.authenticate(u'bob', u'secret')
+            self.assertEqual(user.pk, bob.pk)
+            self.assertTrue(user.token)
+            user.backend = 'django_roa.remoteauth.backends.RemoteUserModelBackend'
+            request = RequestFactory().get('/')
+            request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+            entries = query_log.start()
+            try:
+                login(request, user)
+            finally:
+                query_log.stop()
+            # Neither loaded nor saved, the check endpoint records logins
+            self.assertEqual(entries, [])
+            self.assertEqual(user.username, u'bob')
+        finally:
+            backends.ROA_AUTH_CHECK_URL = url
+            auth_cache.auth_cache().delete(auth_cache.credentials_key(u'nobody'))
 
 
 class ROAExceptionsTests(ROAUserTestCase):
@@ -685,3 +833,638 @@ class ROASettingsTests(ROATestCase):
         page = RemotePage.objects.get(id=page.id)
         self.assertEqual(repr(page), '<RemotePage: A custom serialized page (1)>')
         settings.ROA_FORMAT = initial_roa_format_setting
+
+
+class ROAResourceURLsTests(TestCase):
+
+    def test_overridden_urls(self):
+        url = u'http://127.0.0.1:8081/django_roa_server/remotepagewithoverriddenurls/'
+        # ROA_URL_OVERRIDES_LIST and ROA_URL_OVERRIDES_DETAIL settings
+        self.assertEqual(RemotePageWithOverriddenUrls.get_resource_url_list(), url)
+        page = RemotePageWithOverriddenUrls.from_remote_row({'id': 4, 'title': u'A', 'slug': u'a'})
+        self.assertEqual(page.get_resource_url_detail(), u'%s4-a/' % url)
+        self.assertEqual(page.get_resource_url_count(), u'%scount/' % url)
+        self.assertEqual(RemotePageWithOverriddenUrls._roa_urls.count(), u'%scount/' % url)
+        self.assertEqual(RemotePageWithOverriddenUrls.objects.all()._as_url()[0], url)
+
+    def test_overridden_methods(self):
+        url = u'http://127.0.0.1:8081/django_roa_server/remotepagewithcustomprimarykey/'
+        model = RemotePageWithCustomPrimaryKeyCountOverridden
+        page = model.from_remote_row({'auto_field': 3, 'title': u'A'})
+        self.assertEqual(model.get_resource_url_list(), url)
+        self.assertEqual(model._roa_urls.count(), u'%scount2/' % url)
+        self.assertEqual(page.get_resource_url_count(), u'%scount2/' % url)
+        self.assertEqual(page.get_resource_url_aggregate(), u'%saggregate/' % url)
+        self.assertEqual(page.get_resource_url_unique(), u'%sunique/' % url)
+        self.assertEqual(page.get_resource_url_detail(), u'%s3/' % url)
+        self.assertEqual(model._roa_urls.detail(pk=3), u'%s3/' % url)
+        # The parent model keeps the default count URL.
+        self.assertEqual(RemotePageWithCustomPrimaryKey._roa_urls.count(), u'%scount/' % url)
+        page = RemotePageWithCustomSlug.from_remote_row({'id': 3, 'title': u'A', 'slug': u'a'})
+        self.assertEqual(page.get_resource_url_detail(),
+                         u'http://127.0.0.1:8081/django_roa_server/remotepagewithcustomslug/3-a/')
+
+
+class ROADecodingTests(TestCase):
+
+    def test_decoder_plan(self):
+        values = RemotePageWithBooleanFields._roa_decoder.decode({'id': u'1', 'boolean_field': u'true'})
+        self.assertEqual(values, {'id': 1, 'boolean_field': True, 'null_boolean_field': None})
+        values = RemotePageWithRelations._roa_decoder.decode({'id': 2, 'title': u'Relations', 'remote_page': {'id': u'1'}})
+        self.assertEqual(values, {'id': 2, 'title': u'Relations', 'remote_page_id': 1})
+        values = RemotePageWithRelations._roa_decoder.decode({'id': 2, 'remote_page_id': None})
+        self.assertEqual(values['remote_page_id'], None)
+
+    def test_from_remote_row(self):
+        page = RemotePageWithBooleanFields.from_remote_row({'id': 1, 'boolean_field': False})
+        self.assertEqual(page.pk, 1)
+        self.assertEqual(page.boolean_field, False)
+        self.assertEqual(page.null_boolean_field, None)
+        self.assertEqual(page._state.adding, False)
+
+    def test_serialization_envelope(self):
+        values = RemotePage._roa_decoder.decode({
+            'pk': 3, 'model': u'django_roa_server.remotepage', 'fields': {'title': u'A'}})
+        self.assertEqual(values, {'id': 3, 'title': u'A'})
+        self.assertTrue(RemotePage._roa_fast_instantiation)
+
+
+class ROATransportTests(TestCase):
+
+    def test_http2_headers(self):
+        headers = http2.http2_headers({'Connection': 'keep-alive', 'Host': 'example.com',
+                                       'Transfer-Encoding': 'chunked', 'Content-Length': 3,
+                                       'Authorization': 'Basic xyz'})
+        self.assertEqual(headers, {'Content-Length': '3', 'Authorization': 'Basic xyz'})
+        headers = http2.ResponseHeaders([('content-type', 'application/json'),
+                                         ('Vary', 'Accept'), ('vary', 'Accept-Encoding')])
+        self.assertEqual(headers.get('Content-Type'), 'application/json')
+        self.assertEqual(headers['VARY'], 'Accept, Accept-Encoding')
+        self.assertFalse('Content-Encoding' in headers)
+
+    def test_http2_fallback(self):
+        enabled, http2.ROA_HTTP2 = http2.ROA_HTTP2, True
+        try:
+            resource = ROAResource(u'http://127.0.0.1:8081/')
+            self.assertTrue(isinstance(resource.make_client(), http2.HTTP2Client))
+            # Shared connections can't time out per call
+            self.assertFalse(isinstance(resource.make_client(1, 5), http2.HTTP2Client))
+        finally:
+            http2.ROA_HTTP2 = enabled
+
+    def test_http2_redirects(self):
+        class Redirect(object):
+            def __init__(self, status_int):
+                self.status_int = status_int
+                self.headers = http2.ResponseHeaders([('Location', 'http://127.0.0.1:8081/moved/')])
+        client = http2.HTTP2Client(follow_redirect=True)
+        request = Request(u'http://127.0.0.1:8081/', method='GET')
+        self.assertTrue(client.redirects(request, Redirect(301)))
+        request = Request(u'http://127.0.0.1:8081/', method='POST', body='a=b')
+        self.assertFalse(client.redirects(request, Redirect(307)))
+        self.assertTrue(client.redirects(request, Redirect(303)))
+        self.assertEqual((request.method, request.body), ('GET', None))
+
+    def test_circuit_breaker(self):
+        circuit = Circuit('example.com', window=4, min_calls=4, error_rate=0.5,
+                          slow_call=1, open_seconds=0, half_open_calls=1)
+        for failed, duration in ((False, 0.1), (True, 0.1), (False, 0.1)):
+            circuit.record(failed, duration)
+            self.assertTrue(circuit.allow())
+        circuit.record(False, 2)
+        self.assertEqual(circuit.state, 'open')
+        self.assertTrue(circuit.allow())
+        self.assertEqual(circuit.state, 'half-open')
+        self.assertFalse(circuit.allow())
+        circuit.record(True, 0.1)
+        self.assertEqual(circuit.state, 'open')
+        self.assertTrue(circuit.allow())
+        circuit.record(False, 0.1)
+        self.assertEqual(circuit.as_dict(), {'state': 'closed', 'calls': 0, 'failure_rate': 0.0,
+                                             'rejected': 1, 'opened': 2})
+        self.assertFalse(breaker.failed(ResourceNotFound()))
+        self.assertTrue(breaker.failed(RequestFailed(http_code=503)))
+        self.assertTrue(breaker.failed(RequestError()))
+
+    def test_deadline_and_half_open_circuit(self):
+        enabled, breaker.ROA_CIRCUIT_BREAKER = breaker.ROA_CIRCUIT_BREAKER, True
+        breaker.reset()
+        try:
+            resource = ROAResource(u'http://127.0.0.1:8081/')
+            circuit = breaker.get_circuit(resource)
+            circuit.transition(breaker.HALF_OPEN)
+            with timeouts.deadline(0):
+                self.assertRaises(ROADeadlineExceeded, resource.get)
+            # The probe of the half-open circuit was not taken
+            self.assertEqual((circuit.state, circuit.probes), (breaker.HALF_OPEN, 0))
+            self.assertTrue(circuit.allow())
+        finally:
+            breaker.ROA_CIRCUIT_BREAKER = enabled
+            breaker.reset()
+
+    def test_timeouts(self):
+        self.assertEqual(timeouts.normalize(2), (2, 2))
+        self.assertEqual(timeouts.resolve(RemotePage, (1, None)),
+                         (1, timeouts.ROA_READ_TIMEOUT))
+        self.assertEqual(RemotePage.objects.timeout(read=3).query.timeouts, (None, 3))
+        self.assertEqual(timeouts.bounded((1, None)), ((1, None), None))
+        with timeouts.deadline(10):
+            with timeouts.deadline(60):
+                (connect, read), budget = timeouts.bounded((1, None))
+                self.assertEqual(connect, 1)
+                self.assertTrue(5 < read <= 10 and read == budget)
+        self.assertEqual(timeouts.remaining(), None)
+        with timeouts.deadline(0):
+            self.assertRaises(ROADeadlineExceeded, timeouts.bounded, (1, 1))
+            self.assertRaises(ROADeadlineExceeded, RemotePage.objects.count)
+
+    def test_hedged_reads(self):
+        window = hedging.LatencyWindow(size=10)
+        for duration in range(20):
+            window.observe(duration)
+        self.assertEqual(window.percentile(50, min_samples=10), 15)
+        self.assertEqual(window.percentile(50, min_samples=11), None)
+
+        def slow():
+            time_module.sleep(0.5)
+            return 'slow'
+        self.assertEqual(hedging.hedged(slow, lambda: 'fast', 0.01), ('fast', True))
+        self.assertEqual(hedging.hedged(lambda: 'fast', slow, 0.2), ('fast', False))
+        aborted = []
+        self.assertEqual(hedging.hedged(slow, lambda: 'fast', 0.01, lambda: aborted.append(True)),
+                         ('fast', True))
+        self.assertEqual(aborted, [True])
+        # The first call is made on the calling thread, within its deadline
+        with timeouts.deadline(5):
+            remaining, is_hedged = hedging.hedged(timeouts.remaining, slow, 0.2)
+        self.assertTrue(4 < remaining <= 5 and not is_hedged)
+
+        def failing():
+            raise ROAException('failed')
+        self.assertRaises(ROAException, hedging.hedged, failing, slow, 0.2)
+        self.assertEqual(hedging.hedged(lambda: slow() and failing(), slow, 0.01),
+                         ('slow', True))
+
+
+class ROACompressionTests(TestCase):
+
+    url = u'http://127.0.0.1:8081/echo/'
+
+    def test_gzip_response(self):
+        resource = ROAResource(self.url)
+        response = resource.post(payload='a' * 1000)
+        # Decompressed by restkit's parser, which drops Content-Encoding.
+        self.assertTrue(int(response.headers['Content-Length']) < 100)
+        with resource.call as call:
+            self.assertEqual(response_body(response, call), 'a' * 1000)
+
+    def test_gzip_request_body(self):
+        threshold, transport.ROA_COMPRESS_REQUESTS_ABOVE = transport.ROA_COMPRESS_REQUESTS_ABOVE, 100
+        try:
+            headers = {}
+            self.assertEqual(transport.compress_payload('b' * 10, headers), 'b' * 10)
+            self.assertEqual(headers, {})
+            payload = transport.compress_payload('b' * 1000, headers)
+            self.assertEqual(headers, {'Content-Encoding': 'gzip'})
+            self.assertEqual(zlib.decompress(payload.read(), 16 + zlib.MAX_WBITS), 'b' * 1000)
+            resource = ROAResource(self.url)
+            response = resource.post(payload='b' * 1000)
+            self.assertEqual(response.headers.get('X-Request-Content-Encoding'), 'gzip')
+            with resource.call as call:
+                self.assertEqual(response_body(response, call), 'b' * 1000)
+        finally:
+            transport.ROA_COMPRESS_REQUESTS_ABOVE = threshold
+
+    def test_brotli_fallback(self):
+        brotli, transport.brotli = transport.brotli, None
+        try:
+            self.assertEqual(transport.accept_encoding('gzip, deflate, br'), 'gzip, deflate')
+            self.assertEqual(transport.accept_encoding('br;q=1.0, gzip;q=0.5'), 'gzip;q=0.5')
+            response = CassetteResponse(200, 'compressed')
+            response.headers['Content-Encoding'] = 'br'
+            self.assertRaises(ValueError, transport.response_stream, response)
+        finally:
+            transport.brotli = brotli
+
+
+class JSONParser(object):
+
+    def parse(self, stream):
+        return json.load(stream)
+
+
+class ROAReplayTestCase(TestCase):
+    """
+    Replays remote calls written by ``record`` instead of requesting the
+    test server, ``models`` being given a JSON parser meanwhile.
+    """
+    models = ()
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cassette.jsonl.gz')
+        for model in self.models:
+            model.get_parser = classmethod(lambda cls: JSONParser())
+
+    def tearDown(self):
+        for model in self.models:
+            del model.get_parser
+        shutil.rmtree(self.directory)
+
+    def record(self, url, parameters, body, status=200, headers=(),
+               method='GET', payload=None):
+        Cassette(self.path, 'record').record(
+            request_key(method, url, parameters, payload), status,
+            json.dumps(body), list(headers), 0)
+
+    def replay(self):
+        return use_cassette(self.path, 'replay')
+
+
+class ROACassetteTests(ROAReplayTestCase):
+
+    url = u'http://127.0.0.1:8081/echo/'
+    models = (RemotePage,)
+
+    def test_record_and_replay(self):
+        with use_cassette(self.path, 'record'):
+            resource = ROAResource(self.url)
+            response = resource.post(payload='recorded')
+            with resource.call as call:
+                self.assertEqual(response_body(response, call), 'recorded')
+            self.assertEqual(response.headers.get('X-Request-Content-Encoding'), '')
+
+        def unreachable(resource, method, **kwargs):
+            raise RequestError('socket.error: [Errno 111] Connection refused')
+        send, Resource.request = Resource.request, unreachable
+        try:
+            with use_cassette(self.path, 'replay'):
+                resource = ROAResource(self.url)
+                response = resource.post(payload='recorded')
+                with resource.call as call:
+                    self.assertEqual(response_body(response, call), 'recorded')
+                self.assertEqual(response.headers.get('Content-Type'), 'application/octet-stream')
+                self.assertEqual(response.headers.get('X-Request-Content-Encoding'), '')
+                # Requests are told apart by their body too.
+                self.assertRaises(CassetteMiss, ROAResource(self.url).post,
+                                  payload='not recorded')
+            self.assertRaises(RequestError, ROAResource(self.url).post,
+                              payload='recorded')
+        finally:
+            Resource.request = send
+
+    def test_replayed_headers(self):
+        queryset = RemotePage.objects.with_count()
+        self.record(RemotePage.get_resource_url_list(), queryset.query.parameters,
+                    [{'id': 1, 'title': u'A remote page'}],
+                    headers=[('Content-Type', 'application/json'), ('X-Total-Count', '42')])
+        with self.replay():
+            self.assertEqual([page.title for page in queryset], [u'A remote page'])
+        self.assertEqual(queryset.remote_count, 42)
+
+
+class ROAValidateUniqueTests(ROAReplayTestCase):
+
+    def record_unique(self, group, body, status=200):
+        constraints = unique_constraints(group, *group._get_unique_checks())
+        parameters = encode_constraints(constraints, group.pk, PARAMETER_NAMES)
+        parameters.update(static_parameters())
+        self.record(group.get_resource_url_unique(), parameters, body, status)
+
+    def test_edited_instance(self):
+        group = Group.from_remote_row({'id': 3, 'name': u'Editors'})
+        group.name = u'Authors'
+        self.record_unique(group, [])
+        entries = query_log.start()
+        try:
+            with self.replay():
+                group.validate_unique()
+        finally:
+            query_log.stop()
+        # Its own primary key is excluded
+        self.assertEqual(entries[0]['parameters']['exclude_pk'], 3)
+
+    def test_conflict(self):
+        group = Group.from_remote_row({'id': 3, 'name': u'Editors'})
+        self.record_unique(group, ['unique_0'])
+        with self.replay():
+            self.assertRaises(ValidationError, group.validate_unique)
+
+    def test_without_unique_url(self):
+        group = Group.from_remote_row({'id': 3, 'name': u'Editors'})
+        self.record_unique(group, 'Not found', status=404)
+        with self.replay():
+            group.validate_unique()
+
+    def test_remote_errors(self):
+        group = Group(name=u'Editors')
+        with timeouts.deadline(0):
+            self.assertRaises(ROADeadlineExceeded, group.validate_unique)
+
+
+class ROAChangeListTests(ROAReplayTestCase):
+
+    models = (RemotePage,)
+
+    def changelist(self, **parameters):
+        model_admin = RemotePageAdmin(RemotePage, site)
+        model_admin.list_max_show_all = 3
+        request = RequestFactory().get('/admin/django_roa_client/remotepage/', parameters)
+        get_results, ROAChangeList.get_results = ROAChangeList.get_results, lambda self, request: None
+        try:
+            changelist = ROAChangeList(request, RemotePage, model_admin.list_display,
+                model_admin.list_display_links, model_admin.list_filter,
+                model_admin.date_hierarchy, model_admin.search_fields,
+                model_admin.list_select_related, model_admin.list_per_page,
+                model_admin.list_max_show_all, model_admin.list_editable, model_admin)
+        finally:
+            ROAChangeList.get_results = get_results
+        return changelist, request
+
+    def record_rows(self, queryset, pks, count=None):
+        headers = count is not None and [('X-Total-Count', str(count))] or []
+        self.record(RemotePage.get_resource_url_list(), queryset.query.parameters,
+                    [{'id': pk, 'title': u'Page %s' % pk} for pk in pks], headers=headers)
+
+    def get_results(self, changelist, request):
+        entries = query_log.start()
+        try:
+            with self.replay():
+                changelist.get_results(request)
+        finally:
+            query_log.stop()
+        return entries
+
+    def test_page_with_count(self):
+        changelist, request = self.changelist(p=1)
+        self.record_rows(changelist.query_set.with_count()[2:4], [3, 4], count=5)
+        entries = self.get_results(changelist, request)
+        self.assertEqual(len(entries), 1)
+        self.assertEqual([page.pk for page in changelist.result_list], [3, 4])
+        self.assertEqual(changelist.result_count, 5)
+        self.assertTrue(changelist.multi_page)
+
+    def test_count_fallback(self):
+        changelist, request = self.changelist()
+        self.record_rows(changelist.query_set.with_count()[0:2], [1, 2])
+        self.record(RemotePage._roa_urls.count(),
+                    changelist.query_set.query.parameters, 5)
+        entries = self.get_results(changelist, request)
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(changelist.result_count, 5)
+
+    def test_show_all(self):
+        changelist, request = self.changelist(all='')
+        self.record_rows(changelist.query_set.with_count()[:4], [1, 2, 3], count=3)
+        entries = self.get_results(changelist, request)
+        self.assertEqual(len(entries), 1)
+        self.assertEqual([page.pk for page in changelist.result_list], [1, 2, 3])
+        self.assertEqual(changelist.result_count, 3)
+
+    def test_show_all_too_many_rows(self):
+        changelist, request = self.changelist(all='', p=1)
+        self.record_rows(changelist.query_set.with_count()[:4], [1, 2, 3, 4], count=5)
+        entries = self.get_results(changelist, request)
+        # The page is taken from the rows fetched to show them all.
+        self.assertEqual(len(entries), 1)
+        self.assertEqual([page.pk for page in changelist.result_list], [3, 4])
+        self.assertEqual(changelist.result_count, 5)
+        self.assertFalse(changelist.can_show_all)
+
+
+class ROARemoteStorageTests(ROAReplayTestCase):
+
+    def test_errors(self):
+        storage = RemoteStorage()
+        url = settings.ROA_STORAGE_URL + 'files/'
+        self.record(url + 'missing.txt', {}, 'Not found', status=404)
+        self.record(url + 'forbidden.txt', {}, 'Forbidden', status=403)
+        self.record(url + 'gone.txt', {}, 'Gone', status=410)
+        with self.replay():
+            self.assertRaises(IOError, storage.open, 'files/missing.txt')
+            self.assertRaises(ROAException, storage.open, 'files/forbidden.txt')
+            self.assertRaises(ROAException, storage.open, 'files/gone.txt')
+        self.assertRaises(IOError, storage.open, 'files/remote.txt', 'wb')
+
+
+class ROAGroupPermissionsTests(ROAReplayTestCase):
+
+    models = (UserGroupThrough, GroupPermissionThrough, Permission)
+
+    def test_load_group_permissions(self):
+        content_type = ContentType.objects.get_for_model(RemotePage)
+        self.record(UserGroupThrough.get_resource_url_list(),
+                    UserGroupThrough.objects.filter(user=5).values('group').query.parameters,
+                    [{'id': 1, 'user': 5, 'group': 2}, {'id': 2, 'user': 5, 'group': 3}])
+        self.record(GroupPermissionThrough.get_resource_url_list(),
+                    GroupPermissionThrough.objects.filter(group__in=[2, 3]) \
+                        .values('permission').query.parameters,
+                    [{'id': 1, 'group': 2, 'permission': 7},
+                     {'id': 2, 'group': 3, 'permission': 7},
+                     {'id': 3, 'group': 3, 'permission': 8}])
+        self.record(Permission.get_resource_url_list(),
+                    Permission.objects.filter(pk__in=[7, 8]).query.parameters,
+                    [{'id': 7, 'name': u'Can add', 'codename': u'add_remotepage',
+                      'content_type': content_type.pk},
+                     {'id': 8, 'name': u'Can change', 'codename': u'change_remotepage',
+                      'content_type': content_type.pk}])
+        user = User.from_remote_row({'id': 5, 'username': u'bob'})
+        entries = query_log.start()
+        try:
+            with self.replay():
+                permissions = backends.RemoteUserModelBackend().load_group_permissions(user)
+        finally:
+            query_log.stop()
+        self.assertEqual(permissions, set([u'django_roa_client.add_remotepage',
+                                           u'django_roa_client.change_remotepage']))
+        self.assertEqual(len(entries), 3)
+
+
+class ROADeferredTests(ROAReplayTestCase):
+
+    models = (RemotePageWithManyFields,)
+
+    def record_load(self, queryset, rows):
+        self.record(RemotePageWithManyFields.get_resource_url_list(),
+                    queryset.query.parameters, rows)
+
+    def test_missing_rows(self):
+        pages = RemotePageWithManyFields.objects.all()
+        self.record_load(pages, [{'id': 1, 'char_field': u'a'},
+                                 {'id': 2, 'char_field': u'b'}])
+        manager = RemotePageWithManyFields.objects.defer(None)
+        self.record_load(manager.filter(pk__in=[1, 2]),
+                         [{'id': 1, 'char_field': u'a', 'text_field': u'loaded'}])
+        self.record_load(manager.filter(pk__in=[2]), [])
+        with self.replay():
+            first, second = list(pages)
+            self.assertEqual(first.text_field, u'loaded')
+            self.assertRaises(RemotePageWithManyFields.DoesNotExist,
+                              getattr, second, 'text_field')
+            # Left unloaded rather than set to a default a save would send.
+            self.assertFalse('text_field' in second.__dict__)
+
+    def test_without_in_lookup(self):
+        pages = RemotePageWithManyFields.objects.all()
+        self.record_load(pages, [{'id': 1}, {'id': 2}])
+        manager = RemotePageWithManyFields.objects.defer(None)
+        filters._supported_lookups[RemotePageWithManyFields] = frozenset(['exact'])
+        try:
+            for pk in (1, 2):
+                self.record_load(manager.filter(pk=pk), [{'id': pk, 'text_field': u'%s' % pk}])
+            entries = query_log.start()
+            try:
+                with self.replay():
+                    first, second = list(pages)
+                    self.assertEqual(first.text_field, u'1')
+                    self.assertEqual(second.text_field, u'2')
+            finally:
+                query_log.stop()
+        finally:
+            del filters._supported_lookups[RemotePageWithManyFields]
+        self.assertEqual(len(entries), 3)
+
+
+class ROAMetricsTests(TestCase):
+
+    def test_collector(self):
+        collector = MetricsCollector(buckets=(10, 100))
+        collector.connect()
+        try:
+            with RemoteCall(RemotePage, 'GET', u'http://127.0.0.1:8081/') as call:
+                call.status = 200
+                call.bytes = 42
+            RemoteCall(RemotePage, 'GET', u'http://127.0.0.1:8081/').finish(status=500, error=Exception())
+        finally:
+            collector.disconnect()
+        stats = collector.snapshot()['RemotePage.GET']
+        self.assertEqual(stats['requests'], 2)
+        self.assertEqual(stats['errors'], 1)
+        self.assertEqual(stats['bytes'], 42)
+        self.assertEqual(stats['histograms']['total']['count'], 2)
+
+    def test_connect_phase(self):
+        class SlowPool(object):
+            def get_connection(self, request):
+                time_module.sleep(0.05)
+
+        class SlowClient(ConnectionTiming, SlowPool):
+            pass
+
+        client = SlowClient()
+        with RemoteCall(RemotePage, 'GET', u'http://127.0.0.1:8081/') as call:
+            client.call = call
+            with call.measure('wait'):
+                client.get_connection(None)
+                time_module.sleep(0.01)
+        # Getting the connection isn't accounted to waiting for the response.
+        self.assertTrue(call.timings['connect'] >= 0.05)
+        self.assertTrue(0.01 <= call.timings['wait'] < 0.05)
+
+
+class ROAQueryLogTests(TestCase):
+
+    def test_query_log(self):
+        entries = query_log.start()
+        try:
+            for pk in (1, 2, 3, 3):
+                RemoteCall(RemotePage, 'GET', u'http://127.0.0.1:8081/%s/' % pk).finish(status=200)
+        finally:
+            query_log.stop()
+        self.assertEqual(len(entries), 4)
+        self.assertEqual(analyze(entries), (1, 4))
+        self.assertEqual([entry['duplicate'] for entry in entries], [False, False, False, True])
+
+
+class ROAQueryParametersTests(TestCase):
+
+    def test_parameters(self):
+        queryset = RemotePage.objects.filter(title=u'a')
+        sliced = queryset.order_by('title')[2:5]
+        self.assertEqual(queryset.query.parameters, {'filter_title': u'a', 'format': 'django'})
+        self.assertEqual(sliced.query.parameters, {'filter_title': u'a', 'order': 'title',
+                                                   'limit_start': 2, 'limit_stop': 5,
+                                                   'format': 'django'})
+        self.assertEqual(sliced.query.query_string,
+                         'filter_title=a&format=django&limit_start=2&limit_stop=5&order=title')
+
+    def test_condition_encoding(self):
+        conditions = [Q(id__in=[1, 2]) | Q(title__icontains=u'a'), ~Q(title=u'b'), Q(id__isnull=False)]
+        parameters = encode_condition(conditions, PARAMETER_NAMES)
+        self.assertEqual(parameters, {
+            'where': '{"or":[["id__in",[1,2]],["title__icontains","a"]]}',
+            'exclude_title': u'b',
+            'filter_id__isnull': 'false',
+        })
+        condition = decode_condition(parameters, PARAMETER_NAMES)
+        self.assertEqual(encode_condition([condition], PARAMETER_NAMES), parameters)
+
+    def test_local_filter(self):
+        conditions = [Q(title__iregex=u'^t'), Q(id__in=[1, 2])]
+        parameters, local = split_condition(conditions, PARAMETER_NAMES, frozenset(['exact', 'in']))
+        self.assertEqual(parameters, {'filter_id__in': u'1,2'})
+        self.assertEqual(local, [('title__iregex', u'^t')])
+        matches = compile_condition(RemotePage, local)
+        self.assertTrue(matches(RemotePage.from_remote_row({'id': 1, 'title': u'Test'})))
+        self.assertFalse(matches(RemotePage.from_remote_row({'id': 2, 'title': u'Page'})))
+
+    def test_aggregates(self):
+        aggregates = {'total': Sum('id'), 'titles': Count('title', distinct=True)}
+        self.assertEqual(RemotePage.objects.filter(title=u'a').query.aggregate_parameters(aggregates), {
+            'aggregate_total': u'sum:id',
+            'aggregate_titles': u'count_distinct:title',
+            'filter_title': u'a',
+            'format': 'django',
+        })
+        self.assertEqual(encode_aggregates(aggregates, ['title'], PARAMETER_NAMES)['group_by'], u'title')
+        pages = [RemotePage.from_remote_row({'id': pk, 'title': u'a'}) for pk in (1, 2)]
+        self.assertEqual(aggregate_locally(RemotePage, pages, aggregates), {'total': 3, 'titles': 1})
+
+    def test_keyset_parameters(self):
+        queryset = RemotePage.objects.filter(title=u'a').keyset(page_size=50, after=10)[100:220]
+        # The start of the slice is the offset of the first page only.
+        self.assertEqual(queryset.query.keyset_parameters(), {
+            'filter_title': u'a', 'order': 'id', 'limit_start': 100, 'limit_stop': 150,
+            'after': 10, 'format': 'django',
+        })
+        self.assertEqual(queryset.query.keyset_parameters(after=60, index=200), {
+            'filter_title': u'a', 'order': 'id', 'limit_stop': 20, 'after': 60,
+            'format': 'django',
+        })
+        self.assertRaises(ROAException, RemotePage.objects.keyset, 'title')
+
+    def test_count_and_expand_parameters(self):
+        queryset = RemotePageWithRelations.objects.select_related('remote_page').with_count()[10:20]
+        self.assertEqual(queryset.query.parameters, {
+            'expand': 'remote_page', 'count': 'exact', 'limit_start': 10,
+            'limit_stop': 20, 'format': 'django',
+        })
+        self.assertEqual(queryset.remote_count, None)
+        self.assertEqual(RemotePage.objects.with_count(estimate=True).query.parameters['count'], 'estimate')
+        page = RemotePageWithRelations.from_remote_row({
+            'id': 1, 'title': u'A', 'remote_page': {'id': 2, 'title': u'B'}})
+        self.assertEqual(page.remote_page_id, 2)
+        self.assertEqual(page._remote_page_cache.title, u'B')
+
+    def test_unique_constraints(self):
+        page = RemotePage.from_remote_row({'id': 3, 'title': u'A'})
+        # The primary key of an edited instance is not checked.
+        self.assertEqual(unique_constraints(page, [(RemotePage, ('id',))], []), [])
+        constraints = [({'title': u'A', 'id': 4}, NON_FIELD_ERRORS, u'Taken.')]
+        parameters = encode_constraints(constraints, 3, PARAMETER_NAMES)
+        self.assertEqual(parameters, {'unique_0': '{"and":[["id",4],["title","A"]]}', 'exclude_pk': 3})
+        decoded, pk = decode_constraints(parameters, PARAMETER_NAMES)
+        self.assertEqual((decoded.keys(), pk), (['unique_0'], 3))
+        self.assertEqual(conflicting_errors(constraints, ['unique_0'], PARAMETER_NAMES),
+                         {NON_FIELD_ERRORS: [u'Taken.']})
+
+    def test_deferred_fields(self):
+        self.assertEqual(RemotePageWithManyFields.objects.all().query.parameters['defer'],
+                         'text_field,file_field,image_field')
+        self.assertFalse('defer' in RemotePageWithManyFields.objects.defer(None).query.parameters)
+        self.assertRaises(ROAException, RemotePageWithManyFields.objects.defer, 'char_field')
+        page = RemotePageWithManyFields.from_remote_row({'id': 1, 'char_field': u'a'})
+        self.assertFalse('text_field' in page.__dict__)
+        self.assertEqual(page.char_field, u'a')
+        page.text_field = u'Text'
+        self.assertEqual(page.text_field, u'Text')
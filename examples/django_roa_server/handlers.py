@@ -1,6 +1,8 @@
+import json
 import logging
 
 from django.contrib.auth.models import User, Group, Permission
+from django.contrib.auth.tokens import default_token_generator
 try:
     from django.contrib.auth.models import Message
 except ImportError:
@@ -8,6 +10,13 @@ except ImportError:
 from django.db import models
 from django.http import Http404
 from django.shortcuts import get_object_or_404, _get_queryset
+from django.utils import timezone
+from django.core.serializers.json import DjangoJSONEncoder
+
+from django_roa.db.aggregates import decode_aggregates
+from django_roa.db.filters import decode_condition
+from django_roa.db.query import PARAMETER_NAMES
+from django_roa.db.unique import decode_constraints
 
 from piston.handler import BaseHandler, AnonymousBaseHandler
 from piston.utils import rc
@@ -50,23 +59,24 @@ class ROAHandler(BaseHandler):
         logger.debug('Before filters: %s' % str(queryset))
 
         # Filtering
-        filters, excludes = {}, {}
-        for k, v in request.GET.iteritems():
-            if k.startswith('filter_'):
-                filters[k[7:]] = v
-            if k.startswith('exclude_'):
-                excludes[k[8:]] = v
-        queryset = queryset.filter(*filters.items()).exclude(*excludes.items())
-
-        logger.debug('Filters: %s' % str(filters))
-        logger.debug('Excludes: %s' % str(excludes))
+        condition = decode_condition(request.GET, PARAMETER_NAMES)
+        queryset = queryset.filter(condition)
+
+        logger.debug('Condition: %s' % str(condition))
         logger.debug('After filters: %s' % str(queryset))
 
         # Ordering (test custom parameters' name)
+        order_bys = []
         if 'order' in request.GET:
             order_bys = request.GET['order'].split(',')
             queryset = queryset.order_by(*order_bys)
 
+        # Keyset pagination, after the given value of the ordering key
+        if 'after' in request.GET and len(order_bys) == 1:
+            key = order_bys[0]
+            lookup = key.startswith('-') and '%s__lt' % key[1:] or '%s__gt' % key
+            queryset = queryset.filter(**{lookup: request.GET['after']})
+
         # Slicing
         limit_start = int(request.GET.get('limit_start', 0))
         limit_stop = request.GET.get('limit_stop', False) and int(request.GET['limit_stop']) or None
@@ -198,13 +208,7 @@ class ROACountHandler(BaseHandler):
         queryset = _get_queryset(self.model)
 
         # Filtering
-        filters, excludes = {}, {}
-        for k, v in request.GET.iteritems():
-            if k.startswith('filter_'):
-                filters[k[7:]] = v
-            if k.startswith('exclude_'):
-                excludes[k[8:]] = v
-        queryset = queryset.filter(*filters.items()).exclude(*excludes.items())
+        queryset = queryset.filter(decode_condition(request.GET, PARAMETER_NAMES))
 
         # Ordering
         if 'order_by' in request.GET:
@@ -217,6 +221,59 @@ class ROACountHandler(BaseHandler):
         return counter
 
 
+class ROAAggregateHandler(BaseHandler):
+    allowed_methods = ('GET', )
+
+    def read(self, request, *args, **kwargs):
+        """
+        Retrieves aggregates of objects as JSON, grouped if requested.
+        """
+        if not self.has_model():
+            return rc.NOT_IMPLEMENTED
+
+        # Initialization
+        queryset = _get_queryset(self.model)
+
+        # Filtering
+        queryset = queryset.filter(decode_condition(request.GET, PARAMETER_NAMES))
+
+        # Aggregating
+        aggregates, group_by = decode_aggregates(request.GET, PARAMETER_NAMES)
+        if group_by:
+            queryset = queryset.values(*group_by).annotate(**aggregates)
+            if 'order' in request.GET:
+                queryset = queryset.order_by(*request.GET['order'].split(','))
+            limit_start = int(request.GET.get('limit_start', 0))
+            limit_stop = request.GET.get('limit_stop', False) and int(request.GET['limit_stop']) or None
+            result = list(queryset[limit_start:limit_stop])
+        else:
+            result = queryset.aggregate(**aggregates)
+        logger.debug(u'Aggregates: %s' % result)
+        return json.dumps(result, cls=DjangoJSONEncoder)
+
+
+class ROAUniqueHandler(BaseHandler):
+    allowed_methods = ('GET', )
+
+    def read(self, request, *args, **kwargs):
+        """
+        Retrieves names of uniqueness constraints matching existing objects.
+        """
+        if not self.has_model():
+            return rc.NOT_IMPLEMENTED
+
+        constraints, pk = decode_constraints(request.GET, PARAMETER_NAMES)
+        conflicts = []
+        for name, condition in constraints.items():
+            queryset = _get_queryset(self.model).filter(condition)
+            if pk is not None:
+                queryset = queryset.exclude(pk=pk)
+            if queryset.exists():
+                conflicts.append(name)
+        logger.debug(u'Conflicts: %s' % conflicts)
+        return json.dumps(conflicts)
+
+
 class ROAWithSlugHandler(ROAHandler):
 
     @staticmethod
@@ -236,6 +293,12 @@ class RemotePageHandler(ROAHandler):
 class RemotePageCountHandler(ROACountHandler):
     model = RemotePage
 
+class RemotePageUniqueHandler(ROAUniqueHandler):
+    model = RemotePage
+
+class RemotePageAggregateHandler(ROAAggregateHandler):
+    model = RemotePage
+
 
 class RemotePageWithManyFieldsHandler(ROAHandler):
     model = RemotePageWithManyFields
@@ -301,6 +364,29 @@ class RemotePageWithNamedRelationsCountHandler(ROACountHandler):
 class UserHandler(ROAHandler):
     model = User
 
+class UserUniqueHandler(ROAUniqueHandler):
+    model = User
+
+class UserCheckHandler(BaseHandler):
+    allowed_methods = ('POST', )
+
+    def create(self, request, *args, **kwargs):
+        """
+        Checks credentials, responding with the pk of the user and a token.
+        The login is recorded, clients don't save the user.
+        """
+        try:
+            user = User.objects.get(username=request.POST.get('username'))
+        except User.DoesNotExist:
+            return rc.NOT_FOUND
+        if not user.check_password(request.POST.get('password')):
+            return rc.FORBIDDEN
+        user.last_login = timezone.now()
+        user.save(update_fields=['last_login'])
+        logger.debug(u'Credentials of %s checked' % user)
+        return json.dumps({'pk': user.pk,
+                           'token': default_token_generator.make_token(user)})
+
 MessageHandler = None
 if Message:
     class MessageHandler(ROAHandler):
@@ -311,3 +397,9 @@ class PermissionHandler(ROAHandler):
 
 class GroupHandler(ROAHandler):
     model = Group
+
+class UserGroupThroughHandler(ROAHandler):
+    model = User.groups.through
+
+class GroupPermissionThroughHandler(ROAHandler):
+    model = Group.permissions.through
@@ -7,13 +7,15 @@ from django_roa_server.handlers import RemotePageHandler, \
     RemotePageWithManyFieldsHandler, RemotePageWithBooleanFieldsHandler, \
     RemotePageWithCustomSlugHandler, RemotePageWithOverriddenUrlsHandler, \
     RemotePageWithRelationsHandler, UserHandler, MessageHandler, \
-    PermissionHandler, GroupHandler, RemotePageCountHandler, \
+    PermissionHandler, GroupHandler, UserCheckHandler, RemotePageCountHandler, \
     RemotePageWithManyFieldsCountHandler, RemotePageWithBooleanFieldsCountHandler, \
     RemotePageWithCustomSlugCountHandler, RemotePageWithOverriddenUrlsCountHandler, \
     RemotePageWithRelationsHandler, RemotePageWithNamedRelationsHandler, \
     RemotePageWithNamedRelationsCountHandler, RemotePageWithRelationsThroughHandler, \
     RemotePageWithCustomPrimaryKeyHandler, RemotePageWithCustomPrimaryKeyCountHandler, \
-    RemotePageWithCustomPrimaryKeyCount2Handler
+    RemotePageWithCustomPrimaryKeyCount2Handler, RemotePageAggregateHandler, \
+    RemotePageUniqueHandler, UserUniqueHandler, UserGroupThroughHandler, \
+    GroupPermissionThroughHandler
 
 # Enable HTTP authentication through django-piston
 ad = { 'authentication': HttpBasicAuthentication(
@@ -25,6 +27,8 @@ ad = { 'authentication': HttpBasicAuthentication(
 
 remote_pages = Resource(handler=RemotePageHandler, **ad)
 remote_pages_count = Resource(handler=RemotePageCountHandler, **ad)
+remote_pages_aggregate = Resource(handler=RemotePageAggregateHandler, **ad)
+remote_pages_unique = Resource(handler=RemotePageUniqueHandler, **ad)
 
 remote_pages_with_many_fields = Resource(handler=RemotePageWithManyFieldsHandler, **ad)
 remote_pages_with_many_fields_count = Resource(handler=RemotePageWithManyFieldsCountHandler, **ad)
@@ -52,11 +56,15 @@ remote_pages_with_named_relations = Resource(handler=RemotePageWithNamedRelation
 remote_pages_with_named_relations_count = Resource(handler=RemotePageWithNamedRelationsCountHandler, **ad)
 
 users = Resource(handler=UserHandler, **ad)
+users_check = Resource(handler=UserCheckHandler, **ad)
+users_unique = Resource(handler=UserUniqueHandler, **ad)
 messages = None
 if MessageHandler:
     messages = Resource(handler=MessageHandler, **ad)
 permissions = Resource(handler=PermissionHandler, **ad)
 groups = Resource(handler=GroupHandler, **ad)
+users_groups = Resource(handler=UserGroupThroughHandler, **ad)
+groups_permissions = Resource(handler=GroupPermissionThroughHandler, **ad)
 
 urlpatterns = patterns('',
     # Remote pages counts
@@ -72,6 +80,12 @@ urlpatterns = patterns('',
     url(r'^django_roa_server/remotepagewithnamedrelations/count/$', remote_pages_with_named_relations_count),
     url(r'^django_roa_server/remotepagewithproxy/count/$', remote_pages_count),
 
+    # Remote pages aggregates
+    url(r'^django_roa_server/remotepage/aggregate/$', remote_pages_aggregate),
+
+    # Remote pages uniqueness checks
+    url(r'^django_roa_server/remotepage/unique/$', remote_pages_unique),
+
     # Remote pages
     url(r'^django_roa_server/remotepage/?(?P<pk>\d+)?/?$', remote_pages),
     url(r'^django_roa_server/remotepagewithmanyfields/?(?P<pk>\d+)?/?$', remote_pages_with_many_fields),
@@ -85,8 +99,18 @@ urlpatterns = patterns('',
     url(r'^django_roa_server/remotepagewithproxy/?(?P<pk>\d+)?/?$', remote_pages),
 
     # Auth application
+    url(r'^auth/user/check/$', users_check),
+    url(r'^auth/user/unique/$', users_unique),
     url(r'^auth/user/?(?P<pk>\d+)?/?$', users),
     url(r'^auth/message/?(?P<pk>\d+)?/?$', messages),
     url(r'^auth/permission/?(?P<pk>\d+)?/?$', permissions),
     url(r'^auth/group/?(?P<pk>\d+)?/?$', groups),
+    url(r'^auth/usergroupthrough/?(?P<pk>\d+)?/?$', users_groups),
+    url(r'^auth/grouppermissionthrough/?(?P<pk>\d+)?/?$', groups_permissions),
+
+    # Files of RemoteStorage
+    url(r'^files/(?P<name>.+)$', 'django_roa_server.views.blob'),
+
+    # Compression of requests and responses
+    url(r'^echo/$', 'django_roa_server.views.echo'),
 )
@@ -0,0 +1,55 @@
+import json
+import mimetypes
+import zlib
+
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.core.servers.basehttp import FileWrapper
+from django.http import HttpResponse, HttpResponseNotAllowed, Http404
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
+
+
+@csrf_exempt
+def blob(request, name):
+    """
+    Files of RemoteStorage, streamed from and to the default storage.
+    """
+    if request.method == 'PUT':
+        content = File(request, name)
+        content.size = int(request.META.get('CONTENT_LENGTH') or 0)
+        name = default_storage.save(name, content)
+        return HttpResponse(json.dumps({'name': name}), status=201,
+                            content_type='application/json')
+    if request.method == 'DELETE':
+        default_storage.delete(name)
+        return HttpResponse(status=204)
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD', 'PUT', 'DELETE'])
+    if not default_storage.exists(name):
+        raise Http404
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+    else:
+        response = HttpResponse(FileWrapper(default_storage.open(name)),
+                                content_type=content_type)
+    response['Content-Length'] = default_storage.size(name)
+    return response
+
+
+@csrf_exempt
+@gzip_page
+def echo(request):
+    """
+    Returns the body of a request, gunzipped if it was, and gzips it if
+    the client accepts it. The encoding of the request is returned in the
+    ``X-Request-Content-Encoding`` header.
+    """
+    body = request.body
+    encoding = request.META.get('HTTP_CONTENT_ENCODING', '')
+    if encoding == 'gzip':
+        body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    response = HttpResponse(body, content_type='application/octet-stream')
+    response['X-Request-Content-Encoding'] = encoding
+    return response
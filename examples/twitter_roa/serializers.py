@@ -32,32 +32,13 @@ def Deserializer(stream_or_string, **options):
             Model = _get_model('twitter_roa.user')
         else:
             Model = _get_model("twitter_roa.tweet")
-        data = {}
         m2m_data = {}
 
-        # Handle each field
+        # Fields are handled by the precompiled decoding plan of the model
         for (field_name, field_value) in obj.iteritems():
             if isinstance(field_value, str):
-                field_value = smart_unicode(
+                obj[field_name] = smart_unicode(
                                 field_value,
                                 options.get("encoding", DEFAULT_CHARSET),
                                 strings_only=True)
-
-            try:
-                field = Model._meta.get_field(field_name)
-            except models.FieldDoesNotExist:
-                continue
-
-            # Handle FK fields
-            if field.rel and isinstance(field.rel, models.ManyToOneRel):
-                if field_value is not None:
-                    data[field.attname] = field.rel.to._meta.\
-                        get_field(field.rel.field_name).\
-                        to_python(field_value['id'])
-                else:
-                    data[field.attname] = None
-
-            # Handle all other fields
-            else:
-                data[field.name] = field.to_python(field_value)
-        yield base.DeserializedObject(Model(**data), m2m_data)
+        yield base.DeserializedObject(Model.from_remote_row(obj), m2m_data)